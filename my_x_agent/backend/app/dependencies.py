@@ -0,0 +1,17 @@
+from fastapi import Request
+
+from app.services.auth_service import AuthService
+from app.services.payment_service import PaymentService
+from app.services.twitter_service import TwitterService
+
+
+def get_twitter_service(request: Request) -> TwitterService:
+    return request.app.state.services.twitter_service
+
+
+def get_auth_service(request: Request) -> AuthService:
+    return request.app.state.services.auth_service
+
+
+def get_payment_service(request: Request) -> PaymentService:
+    return request.app.state.services.payment_service
@@ -1,6 +1,6 @@
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
-import psycopg
 from dotenv import load_dotenv
 import os
 
@@ -9,13 +9,29 @@ from app.routes.auth import router as auth_router, get_current_user
 from app.routes.twitter_analysis import router as twitter_analysis_router
 from app.routes.payment import router as payment_router
 from app.models.user import User
+from app.services.registry import ServiceRegistry
+from app.utils.encoding import FastJSONResponse
+from app.utils.metrics import MetricsMiddleware, render_metrics
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Build the shared services once per worker and warm their connections
+    """
+    services = ServiceRegistry()
+    await services.start()
+    app.state.services = services
+    yield
+    await services.stop()
+
 app = FastAPI(
     title="My X Agent API",
     description="API for My X Agent - an AI bot to mimic oneself for X",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # Disable CORS. Do not remove this for full-stack development.
@@ -25,8 +41,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Next-Cursor"],  # Pagination cursor for /api/payment/history
 )
 
+# Added last so it wraps CORS too and times every request
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(twitter_router)
 app.include_router(auth_router)
 app.include_router(twitter_analysis_router)
@@ -36,6 +56,14 @@ app.include_router(payment_router)
 async def healthz():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus scrape endpoint, counters are per worker process
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/")
 async def root():
     return {
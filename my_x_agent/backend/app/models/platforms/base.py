@@ -24,3 +24,10 @@ class PlatformUser(BaseModel):
     platform: str
     display_name: Optional[str] = None
     profile_url: Optional[str] = None
+
+class PlatformFetchResult(BaseModel):
+    platform: str
+    status: str  # ok, timeout, error
+    messages: List[PlatformMessage] = []
+    error: Optional[str] = None
+    elapsed_ms: float = 0.0
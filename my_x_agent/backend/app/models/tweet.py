@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 class UserProfile(BaseModel):
@@ -25,6 +25,9 @@ class TweetSuggestion(BaseModel):
     text: str
     topics: List[str] = []
     confidence: float = 0.0
+    # Model tokens spent rewriting the template, 0 when the template was used as is
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
     created_at: datetime = Field(default_factory=datetime.now)
 
 class TweetAnalysis(BaseModel):
@@ -35,6 +38,25 @@ class TweetAnalysis(BaseModel):
     risk_level: str = "low"  # low, medium, high
     risk_reason: str = ""
 
+class StyleProfile(BaseModel):
+    username: str
+    tweet_count: int = 0
+    average_length: int = 0
+    hashtags_per_tweet: float = 0.0
+    top_hashtags: List[str] = []
+    top_topics: List[str] = []
+    vocabulary: List[str] = []
+    latest_tweet_id: Optional[str] = None
+    updated_at: datetime = Field(default_factory=datetime.now)
+    # Running totals, newer tweets are merged into these on refresh
+    total_length: int = 0
+    hashtag_counts: Dict[str, int] = {}
+    topic_counts: Dict[str, int] = {}
+    word_counts: Dict[str, int] = {}
+
+class BatchAnalysisRequest(BaseModel):
+    texts: List[str]
+
 class ReplyOption(BaseModel):
     id: str = Field(default_factory=lambda: f"reply_{int(datetime.now().timestamp())}")
     text: str
@@ -42,6 +64,8 @@ class ReplyOption(BaseModel):
     confidence: float = 0.0
     is_for_mention: bool = False
     is_for_trending: bool = False
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
 
 class TrendingTopic(BaseModel):
     name: str
@@ -0,0 +1,94 @@
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Union
+
+from app.models.tweet import Tweet, UserProfile
+
+
+class TweetBatch:
+    """
+    Column-oriented list of tweets with a shared author table
+
+    One list or int array per Tweet field, and each author stored once and
+    referenced by id, instead of a pydantic object (and an embedded
+    UserProfile) per tweet. Converts to List[Tweet] for the regular API and
+    straight to the compact JSON shape without building models.
+    """
+
+    __slots__ = ("ids", "texts", "created_at", "likes", "retweets", "replies", "author_ids", "authors")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.created_at: List[datetime] = []
+        self.likes = array("q")
+        self.retweets = array("q")
+        self.replies = array("q")
+        self.author_ids: List[str] = []
+        self.authors: Dict[str, UserProfile] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self,
+               tweet_id: str,
+               text: str,
+               created_at: Union[datetime, str],
+               likes: int,
+               retweets: int,
+               replies: int,
+               author: UserProfile):
+        self.ids.append(tweet_id)
+        self.texts.append(text)
+        self.created_at.append(datetime.fromisoformat(created_at) if isinstance(created_at, str) else created_at)
+        self.likes.append(likes)
+        self.retweets.append(retweets)
+        self.replies.append(replies)
+        self.author_ids.append(author.id)
+        self.authors.setdefault(author.id, author)
+
+    @classmethod
+    def from_tweets(cls, tweets: Iterable[Tweet]) -> "TweetBatch":
+        batch = cls()
+        for tweet in tweets:
+            batch.append(
+                tweet.id, tweet.text, tweet.created_at,
+                tweet.likes_count, tweet.retweets_count, tweet.replies_count, tweet.author
+            )
+        return batch
+
+    def to_tweets(self) -> List[Tweet]:
+        return [
+            Tweet(
+                id=self.ids[i],
+                text=self.texts[i],
+                created_at=self.created_at[i],
+                likes_count=self.likes[i],
+                retweets_count=self.retweets[i],
+                replies_count=self.replies[i],
+                author=self.authors[self.author_ids[i]]
+            )
+            for i in range(len(self.ids))
+        ]
+
+    def to_compact(self) -> Dict[str, Any]:
+        """
+        {"authors": {id: UserProfile}, "tweets": [{..., "author_id": id}]}, ready for json.dumps
+        """
+        return {
+            "authors": {author_id: author.model_dump() for author_id, author in self.authors.items()},
+            "tweets": [
+                {
+                    "id": tweet_id,
+                    "text": text,
+                    "created_at": created_at.isoformat(),
+                    "likes_count": likes,
+                    "retweets_count": retweets,
+                    "replies_count": replies,
+                    "author_id": author_id,
+                }
+                for tweet_id, text, created_at, likes, retweets, replies, author_id in zip(
+                    self.ids, self.texts, self.created_at, self.likes, self.retweets, self.replies, self.author_ids
+                )
+            ],
+        }
@@ -2,6 +2,7 @@ from pydantic import BaseModel, EmailStr, Field
 from typing import Optional
 from datetime import datetime
 from enum import Enum
+import uuid
 
 class SubscriptionTier(str, Enum):
     FREE = "free"
@@ -17,7 +18,7 @@ class UserLogin(BaseModel):
     password: str
 
 class UserInDB(BaseModel):
-    id: str = Field(default_factory=lambda: f"user_{int(datetime.now().timestamp())}")
+    id: str = Field(default_factory=lambda: f"user_{uuid.uuid4().hex[:16]}")
     email: EmailStr
     username: str
     hashed_password: str
@@ -3,19 +3,32 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from datetime import timedelta
 from typing import Optional
 
+from app.dependencies import get_auth_service, get_twitter_service
 from app.models.user import User, UserCreate, Token
 from app.services.auth_service import AuthService, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.services.twitter_service import TwitterService
+from app.utils.password_hasher import PasswordHasherBusy
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
-auth_service = AuthService()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token", auto_error=False)
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+def password_hasher_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    auth_service: AuthService = Depends(get_auth_service)
+) -> User:
     """
     Get the current user from the token
     """
-    user = auth_service.get_current_user(token)
+    user = await auth_service.get_current_user(token)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -24,13 +37,27 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         )
     return user
 
+async def get_optional_user(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    auth_service: AuthService = Depends(get_auth_service)
+) -> Optional[User]:
+    """
+    Get the current user if the request carries a valid token, None otherwise
+    """
+    if not token:
+        return None
+    return await auth_service.get_current_user(token)
+
 @router.post("/register", response_model=User)
-async def register_user(user_data: UserCreate):
+async def register_user(
+    user_data: UserCreate,
+    auth_service: AuthService = Depends(get_auth_service)
+):
     """
     Register a new user
     """
     try:
-        user = auth_service.create_user(
+        user = await auth_service.create_user(
             email=user_data.email,
             username=user_data.username,
             password=user_data.password
@@ -50,13 +77,21 @@ async def register_user(user_data: UserCreate):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    except PasswordHasherBusy:
+        raise password_hasher_busy()
 
 @router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    auth_service: AuthService = Depends(get_auth_service)
+):
     """
     Get an access token for a user
     """
-    user = auth_service.authenticate_user(form_data.username, form_data.password)
+    try:
+        user = await auth_service.authenticate_user(form_data.username, form_data.password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -84,12 +119,14 @@ async def connect_x_account(
     x_username: str,
     access_token: str,
     access_token_secret: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    auth_service: AuthService = Depends(get_auth_service),
+    twitter_service: TwitterService = Depends(get_twitter_service)
 ):
     """
     Connect a user's X account
     """
-    updated_user = auth_service.connect_x_account(
+    updated_user = await auth_service.connect_x_account(
         email=current_user.email,
         x_username=x_username,
         access_token=access_token,
@@ -102,12 +139,15 @@ async def connect_x_account(
             detail="User not found"
         )
     
+    # The next X call builds a client from the new tokens
+    twitter_service.forget_connected_account(updated_user.id)
     return updated_user
 
 @router.post("/subscription", response_model=User)
 async def update_subscription(
     tier: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    auth_service: AuthService = Depends(get_auth_service)
 ):
     """
     Update a user's subscription tier
@@ -118,7 +158,7 @@ async def update_subscription(
             detail="Invalid subscription tier"
         )
     
-    updated_user = auth_service.update_user_subscription(
+    updated_user = await auth_service.update_user_subscription(
         email=current_user.email,
         tier=tier
     )
@@ -1,30 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Response
 from typing import Dict, List, Optional
+from app.dependencies import get_payment_service
 from app.models.user import User
 from app.routes.auth import get_current_user
-from app.services.payment_service import PaymentService
-from app.services.auth_service import AuthService
+from app.services.payment_service import PaymentService, HISTORY_PAGE_SIZE
+from app.utils.encoding import NegotiatedResponse, NegotiatedRoute
 
 router = APIRouter(
     prefix="/api/payment",
     tags=["payment"],
+    route_class=NegotiatedRoute,
 )
 
 @router.post("/request")
 async def create_payment_request(
     item_type: str = Body(...),
     quantity: int = Body(1),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    payment_service: PaymentService = Depends(get_payment_service)
 ) -> Dict:
     """创建BNB支付请求"""
-    payment_service = PaymentService()
     
     if item_type == "tweet_suggestion":
         amount = payment_service.calculate_price(item_type, quantity)
     else:
         raise HTTPException(status_code=400, detail="不支持的商品类型")
     
-    payment_request = payment_service.generate_payment_request(
+    payment_request = await payment_service.generate_payment_request(
         current_user.id,
         amount,
         item_type
@@ -36,37 +38,35 @@ async def create_payment_request(
 async def verify_payment(
     tx_id: str = Body(...),
     tx_hash: str = Body(...),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    payment_service: PaymentService = Depends(get_payment_service)
 ) -> Dict:
-    """验证BNB支付"""
-    payment_service = PaymentService()
-    auth_service = AuthService()
-    
-    verification = payment_service.verify_payment(tx_id, tx_hash)
-    
-    if verification["status"] == "completed":
-        payment_data = payment_service.get_payment_status(tx_id)
-        
-        if payment_data["item_type"] == "tweet_suggestion":
-            quantity = int(payment_data["amount"] / 0.015)  # 每条0.015 BNB
-            auth_service.add_suggestions_to_user(current_user.email, quantity)
-            auth_service.update_user_wallet(current_user.email, tx_hash)
-    
-    return verification
+    """提交BNB支付，链上确认后由后台任务增加建议次数"""
+    return await payment_service.verify_payment(tx_id, tx_hash, current_user.id)
 
 @router.get("/status/{tx_id}")
 async def get_payment_status(
     tx_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    payment_service: PaymentService = Depends(get_payment_service)
 ) -> Dict:
     """获取支付状态"""
-    payment_service = PaymentService()
-    return payment_service.get_payment_status(tx_id)
+    return await payment_service.get_payment_status(tx_id)
 
-@router.get("/history")
+@router.get("/history", response_class=NegotiatedResponse)
 async def get_payment_history(
-    current_user: User = Depends(get_current_user)
+    response: Response,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    current_user: User = Depends(get_current_user),
+    payment_service: PaymentService = Depends(get_payment_service)
 ) -> List[Dict]:
-    """获取支付历史"""
-    payment_service = PaymentService()
-    return payment_service.get_user_transactions(current_user.id)
+    """获取支付历史，下一页游标通过X-Next-Cursor响应头返回，Accept为application/msgpack时返回msgpack"""
+    try:
+        transactions, next_cursor = await payment_service.get_user_transactions(current_user.id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return transactions
@@ -1,13 +1,60 @@
+import json
+import os
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
-from typing import List, Optional
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional, Tuple
+from pydantic import BaseModel
+from app.dependencies import get_auth_service, get_twitter_service
+from app.models.user import User
+from app.routes.auth import get_optional_user
+from app.services.auth_service import AuthService
 from app.services.twitter_service import TwitterService
 from app.models.tweet import Tweet, UserProfile, TweetSuggestion, TweetAnalysis, TrendingTopic, ReplyOption
+from app.utils.encoding import NegotiatedResponse, NegotiatedRoute
 
-router = APIRouter(prefix="/api/twitter", tags=["twitter"])
-twitter_service = TwitterService()
+async def use_connected_x_account(
+    current_user: Optional[User] = Depends(get_optional_user),
+    auth_service: AuthService = Depends(get_auth_service),
+    twitter_service: TwitterService = Depends(get_twitter_service)
+):
+    """
+    Make X calls for a signed-in user with their connected X account, on its own rate limits
+    """
+    if current_user is not None:
+        await twitter_service.use_connected_account(current_user.id, auth_service.get_user_by_id)
+
+router = APIRouter(prefix="/api/twitter", tags=["twitter"], route_class=NegotiatedRoute)
+
+# X serves at most the 3200 most recent tweets of a timeline
+TIMELINE_EXPORT_MAX_TWEETS = int(os.getenv("TIMELINE_EXPORT_MAX_TWEETS", "3200"))
+
+# Keep proxies from buffering the stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def event_stream(event: str, items: AsyncIterator[Tuple[int, BaseModel]]) -> StreamingResponse:
+    """
+    Server-Sent Events response: one `event` per item with its position as the
+    event id, then a `done` event
+
+    When the client disconnects the response stops iterating and `items` is
+    closed, which cancels whatever is still being generated.
+    """
+    async def events():
+        try:
+            async for position, item in items:
+                yield f"id: {position}\nevent: {event}\ndata: {item.model_dump_json()}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        finally:
+            await items.aclose()
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
 
 @router.get("/auth/callback")
-async def twitter_auth_callback(oauth_token: str, oauth_verifier: str):
+async def twitter_auth_callback(
+    oauth_token: str,
+    oauth_verifier: str,
+    twitter_service: TwitterService = Depends(get_twitter_service)
+):
     """
     Handle Twitter OAuth callback
     """
@@ -17,45 +64,114 @@ async def twitter_auth_callback(oauth_token: str, oauth_verifier: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Authentication failed: {str(e)}")
 
-@router.get("/user/{username}", response_model=UserProfile)
-async def get_user_profile(username: str):
+@router.get("/user/{username}", response_model=UserProfile, dependencies=[Depends(use_connected_x_account)])
+async def get_user_profile(
+    username: str,
+    twitter_service: TwitterService = Depends(get_twitter_service)
+):
     """
     Get a user's profile information
     """
-    profile = twitter_service.get_user_profile(username)
+    profile = await twitter_service.get_user_profile(username)
     if not profile:
         raise HTTPException(status_code=404, detail=f"User {username} not found")
     return profile
 
-@router.get("/user/{username}/tweets", response_model=List[Tweet])
-async def get_user_tweets(username: str, count: int = Query(10, ge=1, le=100)):
+@router.get("/user/{username}/tweets", response_model=List[Tweet], response_class=NegotiatedResponse, dependencies=[Depends(use_connected_x_account)])
+async def get_user_tweets(
+    username: str,
+    count: int = Query(10, ge=1, le=100),
+    compact: bool = False,
+    twitter_service: TwitterService = Depends(get_twitter_service)
+):
     """
     Get a user's recent tweets
+    
+    With compact=true the response is {"authors": {id: UserProfile}, "tweets": [...]}
+    where each tweet carries an author_id instead of an embedded author.
+    Sent as msgpack when the request prefers application/msgpack.
     """
-    tweets = twitter_service.get_user_tweets(username, count)
+    if compact:
+        timeline = await twitter_service.get_user_timeline(username, count)
+        return NegotiatedResponse(timeline.to_compact())
+    tweets = await twitter_service.get_user_tweets(username, count)
     return tweets
 
-@router.get("/trending", response_model=List[TrendingTopic])
-async def get_trending_topics(location_id: str = "1"):
+@router.get("/user/{username}/tweets/export", dependencies=[Depends(use_connected_x_account)])
+async def export_user_tweets(
+    username: str,
+    limit: int = Query(1000, ge=1, le=TIMELINE_EXPORT_MAX_TWEETS),
+    twitter_service: TwitterService = Depends(get_twitter_service)
+):
+    """
+    Export up to `limit` of a user's tweets as NDJSON, one Tweet per line, newest first
+    
+    Lines are written as timeline pages arrive from X. If X fails part way the
+    stream ends with an {"error": ...} line.
+    """
+    tweets = twitter_service.iter_user_tweets(username, limit)
+    
+    async def ndjson_lines():
+        try:
+            async for tweet in tweets:
+                yield tweet.model_dump_json() + "\n"
+        except Exception as e:
+            print(f"Error exporting tweets for {username}: {e}")
+            yield json.dumps({"error": str(e)}) + "\n"
+        finally:
+            await tweets.aclose()
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+@router.get("/trending", response_model=List[TrendingTopic], response_class=NegotiatedResponse)
+async def get_trending_topics(
+    location_id: str = "1",
+    twitter_service: TwitterService = Depends(get_twitter_service)
+):
     """
-    Get trending topics, default to worldwide (woeid=1)
+    Get trending topics, default to worldwide (woeid=1), as msgpack when the request prefers it
     """
-    trends = twitter_service.get_trending_topics(location_id)
+    trends = await twitter_service.get_trending_topics(location_id)
     return trends
 
-@router.post("/suggest", response_model=List[TweetSuggestion])
+@router.get("/cache/stats")
+async def get_cache_stats(
+    twitter_service: TwitterService = Depends(get_twitter_service)
+):
+    """
+    Hit/miss counters of the X response caches, X rate-limit queues and LLM token usage
+    """
+    return twitter_service.cache_stats()
+
+@router.post("/suggest", response_model=List[TweetSuggestion], dependencies=[Depends(use_connected_x_account)])
 async def generate_tweet_suggestions(
     username: str, 
     count: int = Query(3, ge=1, le=10),
-    topics: Optional[List[str]] = None
+    topics: Optional[List[str]] = None,
+    twitter_service: TwitterService = Depends(get_twitter_service)
 ):
     """
     Generate tweet suggestions based on user's previous tweets and optionally specific topics
     """
-    return twitter_service.generate_tweet_suggestions(username, count, topics)
+    return await twitter_service.generate_tweet_suggestions(username, count, topics)
+
+@router.post("/suggest/stream", dependencies=[Depends(use_connected_x_account)])
+async def stream_tweet_suggestions(
+    username: str, 
+    count: int = Query(3, ge=1, le=10),
+    topics: Optional[List[str]] = None,
+    twitter_service: TwitterService = Depends(get_twitter_service)
+):
+    """
+    Server-Sent Events variant of /suggest, each TweetSuggestion is sent as soon as it is ready
+    """
+    return event_stream("suggestion", twitter_service.stream_tweet_suggestions(username, count, topics))
 
 @router.post("/analyze", response_model=TweetAnalysis)
-async def analyze_tweet(tweet_text: str = Body(..., embed=True)):
+async def analyze_tweet(
+    tweet_text: str = Body(..., embed=True),
+    twitter_service: TwitterService = Depends(get_twitter_service)
+):
     """
     Analyze a tweet for sentiment, topics, and engagement potential
     """
@@ -65,9 +181,24 @@ async def analyze_tweet(tweet_text: str = Body(..., embed=True)):
 async def generate_reply_options(
     tweet_id: str,
     tweet_text: str,
-    count: int = Query(3, ge=1, le=5)
+    count: int = Query(3, ge=1, le=5),
+    twitter_service: TwitterService = Depends(get_twitter_service)
 ):
     """
     Generate reply options for a given tweet
     """
-    return twitter_service.generate_reply_options(tweet_text, count)
+    return await twitter_service.generate_reply_options(tweet_text, count)
+
+@router.post("/reply-options/stream")
+async def stream_reply_options(
+    tweet_id: str,
+    tweet_text: str,
+    count: int = Query(3, ge=1, le=5),
+    is_mention: bool = False,
+    trending_score: float = 0.0,
+    twitter_service: TwitterService = Depends(get_twitter_service)
+):
+    """
+    Server-Sent Events variant of /reply-options, each ReplyOption is sent as soon as it is ready
+    """
+    return event_stream("reply_option", twitter_service.stream_reply_options(tweet_text, count, is_mention, trending_score))
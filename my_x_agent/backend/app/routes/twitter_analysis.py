@@ -1,9 +1,14 @@
+import json
+import os
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from datetime import datetime
-from app.models.tweet import Tweet, TweetSuggestion, TweetAnalysis, ReplyOption
-from app.services.twitter_service import TwitterService
+from app.models.tweet import Tweet, TweetSuggestion, TweetAnalysis, ReplyOption, BatchAnalysisRequest
 from app.routes.auth import get_current_user
+from app.routes.twitter import use_connected_x_account
+from app.dependencies import get_twitter_service
+from app.services.twitter_service import TwitterService
 from app.models.user import User
 
 router = APIRouter(
@@ -11,25 +16,52 @@ router = APIRouter(
     tags=["twitter"],
 )
 
+ANALYZE_BATCH_MAX_TEXTS = int(os.getenv("ANALYZE_BATCH_MAX_TEXTS", "10000"))
+
 @router.post("/analyze", response_model=TweetAnalysis)
 async def analyze_tweet(
     text: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    twitter_service: TwitterService = Depends(get_twitter_service)
 ):
     """
     Analyze a tweet for sentiment, topics, engagement potential, and risk level
     """
-    twitter_service = TwitterService()
     analysis = twitter_service.analyze_tweet(text)
     return analysis
 
+@router.post("/analyze/batch")
+async def analyze_tweets_batch(
+    batch: BatchAnalysisRequest,
+    current_user: User = Depends(get_current_user),
+    twitter_service: TwitterService = Depends(get_twitter_service)
+):
+    """
+    Analyze many tweets in one request
+    
+    Results are streamed as NDJSON, one TweetAnalysis per line in input order,
+    while the batch is still being processed.
+    """
+    if len(batch.texts) > ANALYZE_BATCH_MAX_TEXTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch may contain at most {ANALYZE_BATCH_MAX_TEXTS} texts"
+        )
+    
+    async def ndjson_lines():
+        async for analysis in twitter_service.analyze_tweets_stream(batch.texts):
+            yield json.dumps(analysis, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
 @router.post("/reply-options", response_model=List[ReplyOption])
 async def generate_reply_options(
     text: str,
     count: int = 3,
     is_mention: bool = False,
     trending_score: float = 0.0,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    twitter_service: TwitterService = Depends(get_twitter_service)
 ):
     """
     Generate reply options for a given tweet
@@ -40,8 +72,7 @@ async def generate_reply_options(
     - is_mention: Whether this tweet is mentioning the user's account
     - trending_score: If not a mention, the trending score of the tweet (0.0-1.0)
     """
-    twitter_service = TwitterService()
-    reply_options = twitter_service.generate_reply_options(
+    reply_options = await twitter_service.generate_reply_options(
         text, 
         count, 
         is_mention, 
@@ -49,29 +80,29 @@ async def generate_reply_options(
     )
     return reply_options
 
-@router.get("/trending", response_model=List[Tweet])
+@router.get("/trending", response_model=List[Tweet], dependencies=[Depends(use_connected_x_account)])
 async def get_trending_tweets(
     count: int = 10,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    twitter_service: TwitterService = Depends(get_twitter_service)
 ):
     """
     Get trending tweets
     """
-    twitter_service = TwitterService()
-    tweets = twitter_service.get_user_tweets("example_user", count)
+    tweets = await twitter_service.get_user_tweets("example_user", count)
     return tweets
 
-@router.post("/retweet", response_model=Tweet)
+@router.post("/retweet", response_model=Tweet, dependencies=[Depends(use_connected_x_account)])
 async def retweet_with_comment(
     tweet_id: str,
     text: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    twitter_service: TwitterService = Depends(get_twitter_service)
 ):
     """
     Retweet with a comment
     """
-    twitter_service = TwitterService()
-    user_profile = twitter_service.get_user_profile(current_user.username)
+    user_profile = await twitter_service.get_user_profile(current_user.username)
     
     mock_tweet = Tweet(
         id=f"retweet_{tweet_id}",
@@ -85,17 +116,17 @@ async def retweet_with_comment(
     
     return mock_tweet
 
-@router.post("/reply", response_model=Tweet)
+@router.post("/reply", response_model=Tweet, dependencies=[Depends(use_connected_x_account)])
 async def reply_to_tweet(
     tweet_id: str,
     text: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    twitter_service: TwitterService = Depends(get_twitter_service)
 ):
     """
     Reply to a tweet
     """
-    twitter_service = TwitterService()
-    user_profile = twitter_service.get_user_profile(current_user.username)
+    user_profile = await twitter_service.get_user_profile(current_user.username)
     
     mock_tweet = Tweet(
         id=f"reply_{tweet_id}",
@@ -2,10 +2,12 @@ import os
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from dotenv import load_dotenv
 
 from app.models.user import UserInDB, User, TokenData
+from app.services.user_repository import UserRepository, create_user_repository
+from app.utils.cache import TTLCache
+from app.utils.password_hasher import PasswordHasher
 
 load_dotenv()
 
@@ -13,40 +15,78 @@ SECRET_KEY = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+# Other workers' updates reach this worker's snapshots after at most this long
+USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "30"))
 
 class AuthService:
-    def __init__(self):
-        self.users_db = {}
+    def __init__(self, repository: Optional[UserRepository] = None, hasher: Optional[PasswordHasher] = None):
+        self.users = repository or create_user_repository()
+        self.hasher = hasher or PasswordHasher()
+        # token -> email, dropped when the token's exp passes
+        self.token_cache = TTLCache("auth_token", maxsize=TOKEN_CACHE_SIZE)
+        # email -> User snapshot, refreshed by every update method below
+        self.user_cache = TTLCache("auth_user", maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
     
-    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+    async def start(self):
+        """
+        Open the user store
+        """
+        await self.users.connect()
+    
+    async def close(self):
+        """
+        Close the user store and the hashing pool
+        """
+        await self.users.close()
+        self.hasher.close()
+    
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """
         Verify a password against a hash
         """
-        return pwd_context.verify(plain_password, hashed_password)
+        return await self.hasher.verify(plain_password, hashed_password)
     
-    def get_password_hash(self, password: str) -> str:
+    async def get_password_hash(self, password: str) -> str:
         """
         Hash a password
         """
-        return pwd_context.hash(password)
+        return await self.hasher.hash(password)
+    
+    def _to_user(self, user: UserInDB) -> User:
+        return User(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            created_at=user.created_at,
+            updated_at=user.updated_at,
+            subscription_tier=user.subscription_tier,
+            suggestions_remaining=user.suggestions_remaining,
+            x_username=user.x_username,
+            wallet_address=user.wallet_address
+        )
     
-    def get_user(self, email: str) -> Optional[UserInDB]:
+    async def get_user(self, email: str) -> Optional[UserInDB]:
         """
         Get a user by email
         """
-        if email in self.users_db:
-            return UserInDB(**self.users_db[email])
-        return None
+        return await self.users.get_by_email(email)
     
-    def create_user(self, email: str, username: str, password: str) -> UserInDB:
+    async def get_user_by_id(self, user_id: str) -> Optional[UserInDB]:
+        """
+        Get a user by id
+        """
+        return await self.users.get_by_id(user_id)
+    
+    async def create_user(self, email: str, username: str, password: str) -> UserInDB:
         """
         Create a new user
         """
-        if email in self.users_db:
+        if await self.users.get_by_email(email):
             raise ValueError("Email already registered")
         
-        hashed_password = self.get_password_hash(password)
+        hashed_password = await self.get_password_hash(password)
         user_data = {
             "email": email,
             "username": username,
@@ -58,18 +98,21 @@ class AuthService:
         }
         
         user = UserInDB(**user_data)
-        self.users_db[email] = user.dict()
-        return user
+        return await self.users.create(user)
     
-    def authenticate_user(self, email: str, password: str) -> Optional[UserInDB]:
+    async def authenticate_user(self, email: str, password: str) -> Optional[UserInDB]:
         """
         Authenticate a user
         """
-        user = self.get_user(email)
+        user = await self.get_user(email)
         if not user:
             return None
-        if not self.verify_password(password, user.hashed_password):
+        verified, new_hash = await self.hasher.verify_and_update(password, user.hashed_password)
+        if not verified:
             return None
+        if new_hash:
+            # Stored with an outdated bcrypt cost, upgrade it now that we know the password
+            user = await self.users.update(email, {"hashed_password": new_hash}) or user
         return user
     
     def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -86,170 +129,96 @@ class AuthService:
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
     
-    def get_current_user(self, token: str) -> Optional[User]:
+    async def get_current_user(self, token: str) -> Optional[User]:
         """
         Get the current user from a JWT token
+        
+        Verified tokens and user snapshots are cached, so a repeat call is
+        two dict lookups instead of a signature check and a database read.
         """
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            email: str = payload.get("sub")
-            user_id: str = payload.get("user_id")
-            
-            if email is None:
-                return None
+        email = self.token_cache.get(token)
+        if email is None:
+            try:
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+                email: str = payload.get("sub")
+                user_id: str = payload.get("user_id")
                 
-            token_data = TokenData(email=email, user_id=user_id)
-        except JWTError:
-            return None
+                if email is None:
+                    return None
+                    
+                token_data = TokenData(email=email, user_id=user_id)
+            except JWTError:
+                return None
+            self.token_cache.set(token, token_data.email, expires_at=payload.get("exp"))
             
-        user = self.get_user(token_data.email)
-        if user is None:
+        user = self.user_cache.get(email)
+        if user is not None:
+            return user
+            
+        user_in_db = await self.get_user(email)
+        if user_in_db is None:
             return None
             
-        return User(
-            id=user.id,
-            email=user.email,
-            username=user.username,
-            created_at=user.created_at,
-            updated_at=user.updated_at,
-            subscription_tier=user.subscription_tier,
-            suggestions_remaining=user.suggestions_remaining,
-            x_username=user.x_username
-        )
+        user = self._to_user(user_in_db)
+        self.user_cache.set(email, user)
+        return user
     
-    def update_user_subscription(self, email: str, tier: str) -> Optional[User]:
+    def _refresh_cached_user(self, email: str, updated_user: Optional[UserInDB]) -> Optional[User]:
         """
-        Update a user's subscription tier
+        Drop the stale snapshot after a write and cache the row the write returned
         """
-        user = self.get_user(email)
-        if not user:
+        self.user_cache.invalidate(email)
+        if not updated_user:
             return None
-            
-        user_dict = self.users_db[email]
-        user_dict["subscription_tier"] = tier
-        user_dict["updated_at"] = datetime.now()
-        
+        user = self._to_user(updated_user)
+        self.user_cache.set(email, user)
+        return user
+    
+    async def _update_user(self, email: str, fields: dict) -> Optional[User]:
+        fields["updated_at"] = datetime.now()
+        return self._refresh_cached_user(email, await self.users.update(email, fields))
+    
+    async def update_user_subscription(self, email: str, tier: str) -> Optional[User]:
+        """
+        Update a user's subscription tier
+        """
+        fields = {"subscription_tier": tier}
         if tier == "pro":
-            user_dict["suggestions_remaining"] = 999999
-        
-        self.users_db[email] = user_dict
-        updated_user = UserInDB(**user_dict)
+            fields["suggestions_remaining"] = 999999
         
-        return User(
-            id=updated_user.id,
-            email=updated_user.email,
-            username=updated_user.username,
-            created_at=updated_user.created_at,
-            updated_at=updated_user.updated_at,
-            subscription_tier=updated_user.subscription_tier,
-            suggestions_remaining=updated_user.suggestions_remaining,
-            x_username=updated_user.x_username
-        )
+        return await self._update_user(email, fields)
     
-    def update_suggestions_remaining(self, email: str, count: int) -> Optional[User]:
+    async def update_suggestions_remaining(self, email: str, count: int) -> Optional[User]:
         """
         Update a user's remaining suggestions count
         """
-        user = self.get_user(email)
-        if not user:
-            return None
-            
-        user_dict = self.users_db[email]
-        user_dict["suggestions_remaining"] = count
-        user_dict["updated_at"] = datetime.now()
-        
-        self.users_db[email] = user_dict
-        updated_user = UserInDB(**user_dict)
-        
-        return User(
-            id=updated_user.id,
-            email=updated_user.email,
-            username=updated_user.username,
-            created_at=updated_user.created_at,
-            updated_at=updated_user.updated_at,
-            subscription_tier=updated_user.subscription_tier,
-            suggestions_remaining=updated_user.suggestions_remaining,
-            x_username=updated_user.x_username
-        )
+        return await self._update_user(email, {"suggestions_remaining": count})
     
-    def connect_x_account(self, email: str, x_username: str, access_token: str, access_token_secret: str) -> Optional[User]:
+    async def connect_x_account(self, email: str, x_username: str, access_token: str, access_token_secret: str) -> Optional[User]:
         """
         Connect a user's X account
         """
-        user = self.get_user(email)
-        if not user:
-            return None
-            
-        user_dict = self.users_db[email]
-        user_dict["x_username"] = x_username
-        user_dict["x_access_token"] = access_token
-        user_dict["x_access_token_secret"] = access_token_secret
-        user_dict["updated_at"] = datetime.now()
+        return await self._update_user(email, {
+            "x_username": x_username,
+            "x_access_token": access_token,
+            "x_access_token_secret": access_token_secret
+        })
         
-        self.users_db[email] = user_dict
-        updated_user = UserInDB(**user_dict)
-        
-        return User(
-            id=updated_user.id,
-            email=updated_user.email,
-            username=updated_user.username,
-            created_at=updated_user.created_at,
-            updated_at=updated_user.updated_at,
-            subscription_tier=updated_user.subscription_tier,
-            suggestions_remaining=updated_user.suggestions_remaining,
-            x_username=updated_user.x_username
-        )
-        
-    def add_suggestions_to_user(self, email: str, quantity: int) -> Optional[User]:
+    async def add_suggestions_to_user(self, email: str, quantity: int) -> Optional[User]:
         """
         增加用户可用的推文建议数量
         """
-        user = self.get_user(email)
-        if not user:
-            return None
-            
-        user_dict = self.users_db[email]
-        current_suggestions = user_dict.get("suggestions_remaining", 0)
-        user_dict["suggestions_remaining"] = current_suggestions + quantity
-        user_dict["updated_at"] = datetime.now()
-        
-        self.users_db[email] = user_dict
-        updated_user = UserInDB(**user_dict)
+        # 在数据库中原子递增，避免并发支付互相覆盖
+        return self._refresh_cached_user(email, await self.users.increment(email, "suggestions_remaining", quantity))
         
-        return User(
-            id=updated_user.id,
-            email=updated_user.email,
-            username=updated_user.username,
-            created_at=updated_user.created_at,
-            updated_at=updated_user.updated_at,
-            subscription_tier=updated_user.subscription_tier,
-            suggestions_remaining=updated_user.suggestions_remaining,
-            x_username=updated_user.x_username
-        )
+    async def credit_payment(self, email: str, payment_id: str, quantity: int, tx_hash: str) -> Optional[User]:
+        """
+        为一笔已确认的支付增加建议数量并记录交易哈希，同一笔支付只会入账一次
+        """
+        return self._refresh_cached_user(email, await self.users.credit_payment(email, payment_id, quantity, tx_hash))
         
-    def update_user_wallet(self, email: str, tx_hash: str) -> Optional[User]:
+    async def update_user_wallet(self, email: str, tx_hash: str) -> Optional[User]:
         """
         更新用户钱包信息
         """
-        user = self.get_user(email)
-        if not user:
-            return None
-            
-        user_dict = self.users_db[email]
-        user_dict["last_payment_txid"] = tx_hash
-        user_dict["updated_at"] = datetime.now()
-        
-        self.users_db[email] = user_dict
-        updated_user = UserInDB(**user_dict)
-        
-        return User(
-            id=updated_user.id,
-            email=updated_user.email,
-            username=updated_user.username,
-            created_at=updated_user.created_at,
-            updated_at=updated_user.updated_at,
-            subscription_tier=updated_user.subscription_tier,
-            suggestions_remaining=updated_user.suggestions_remaining,
-            x_username=updated_user.x_username,
-            wallet_address=updated_user.wallet_address
-        )
+        return await self._update_user(email, {"last_payment_txid": tx_hash})
@@ -1,25 +1,74 @@
-from typing import List, Dict, Optional
+import asyncio
+import os
+import time
+from typing import AsyncIterator, List, Dict, Optional
+from dotenv import load_dotenv
 from app.services.platforms.telegram_service import TelegramService
 from app.services.platforms.whatsapp_service import WhatsAppService
 from app.services.platforms.signal_service import SignalService
 from app.services.platforms.reachme_service import ReachmeService
-from app.models.platforms.base import PlatformMessage, PlatformReply
+from app.models.platforms.base import PlatformMessage, PlatformReply, PlatformFetchResult
+
+load_dotenv()
+
+DEFAULT_PLATFORM_TIMEOUT = float(os.getenv("MESSAGING_TIMEOUT_SECONDS", "3"))
 
 class MessagingService:
-    def __init__(self):
+    def __init__(self, timeouts: Optional[Dict[str, float]] = None):
         self.services = {
             "telegram": TelegramService(),
             "whatsapp": WhatsAppService(),
             "signal": SignalService(),
             "reachme": ReachmeService()
         }
+        # 每个平台单独的超时，例如 MESSAGING_TIMEOUT_TELEGRAM=1.5
+        self.timeouts = {
+            platform: float(os.getenv(f"MESSAGING_TIMEOUT_{platform.upper()}", DEFAULT_PLATFORM_TIMEOUT))
+            for platform in self.services
+        }
+        self.timeouts.update(timeouts or {})
+        
+    async def _fetch_platform(self, platform: str, user_id: str, count: int) -> PlatformFetchResult:
+        """在超时限制内获取单个平台的消息，失败时返回对应状态而不是抛出异常"""
+        start = time.perf_counter()
+        try:
+            messages = await asyncio.wait_for(
+                self.services[platform].get_messages(user_id, count),
+                timeout=self.timeouts[platform]
+            )
+            status, error = "ok", None
+        except asyncio.TimeoutError:
+            messages, status, error = [], "timeout", f"No response within {self.timeouts[platform]}s"
+        except Exception as e:
+            messages, status, error = [], "error", str(e)
+        return PlatformFetchResult(
+            platform=platform,
+            status=status,
+            messages=messages,
+            error=error,
+            elapsed_ms=(time.perf_counter() - start) * 1000
+        )
+        
+    async def get_messages_from_all_platforms(self, user_id: str, count_per_platform: int = 5) -> Dict[str, PlatformFetchResult]:
+        """并发获取所有平台的消息，总耗时取决于最慢（或超时）的平台"""
+        results = await asyncio.gather(*(
+            self._fetch_platform(platform, user_id, count_per_platform)
+            for platform in self.services
+        ))
+        return {result.platform: result for result in results}
         
-    async def get_messages_from_all_platforms(self, user_id: str, count_per_platform: int = 5) -> Dict[str, List[PlatformMessage]]:
-        """获取所有平台的消息"""
-        result = {}
-        for platform, service in self.services.items():
-            result[platform] = await service.get_messages(user_id, count_per_platform)
-        return result
+    async def stream_messages_from_all_platforms(self, user_id: str, count_per_platform: int = 5) -> AsyncIterator[PlatformFetchResult]:
+        """并发获取所有平台的消息，每个平台一返回就立即产出"""
+        tasks = [
+            asyncio.ensure_future(self._fetch_platform(platform, user_id, count_per_platform))
+            for platform in self.services
+        ]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            for task in tasks:
+                task.cancel()
         
     async def send_reply(self, platform: str, message_id: str, text: str) -> Optional[PlatformReply]:
         """发送特定平台的回复"""
@@ -0,0 +1,261 @@
+import asyncio
+import os
+from datetime import datetime
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from app.services.auth_service import AuthService
+from app.services.payment_repository import DuplicateTransactionError, Position
+from app.services.payment_service import PaymentService
+from app.utils.metrics import upstream
+
+if TYPE_CHECKING:
+    import aiohttp
+
+load_dotenv()
+
+CONFIRMATION_INTERVAL = float(os.getenv("PAYMENT_CONFIRMATION_INTERVAL", "5"))
+CONFIRMATION_BATCH_SIZE = int(os.getenv("PAYMENT_CONFIRMATION_BATCH_SIZE", "100"))
+REQUIRED_CONFIRMATIONS = int(os.getenv("PAYMENT_REQUIRED_CONFIRMATIONS", "15"))
+# A submitted transaction still not mined, or still unknown to the node, after this long is marked failed
+CONFIRMATION_TIMEOUT_SECONDS = float(os.getenv("PAYMENT_CONFIRMATION_TIMEOUT_SECONDS", "3600"))
+RPC_TIMEOUT_SECONDS = float(os.getenv("BNB_RPC_TIMEOUT_SECONDS", "10"))
+# A payment left in "crediting" this long by a worker that died mid-credit is queued again
+CREDIT_LEASE_SECONDS = float(os.getenv("PAYMENT_CREDIT_LEASE_SECONDS", "300"))
+
+WEI_PER_BNB = 10 ** 18
+
+# Placeholder for a call the node answered with an error, retried next round
+UNKNOWN = object()
+
+
+class PaymentConfirmer:
+    """
+    Background task that settles submitted payments against the chain
+
+    Every `interval` seconds it walks the submitted payments on the ledger's
+    status index, `batch_size` at a time, and looks up the chain head plus
+    each receipt and transaction of a batch in a single JSON-RPC request.
+    Outcomes are written back with conditional UPDATEs, failures in one
+    statement and confirmations row by row, as a transaction can only pay
+    for one request and a row that loses that race fails alone. Only the
+    rows an UPDATE actually moved are credited, so several workers can run
+    side by side without crediting a payment twice.
+
+    Paid transactions go submitted -> confirmed -> crediting -> completed.
+    "confirmed" is the queue of payments still owed to their users: a
+    worker claims one by moving it to "crediting", and it only becomes
+    "completed" once the user has been credited. A failed credit goes back
+    to "confirmed" and every pass retries it. The credit itself is one
+    transaction keyed on the payment id, so a retry of a payment whose
+    credit went through but whose "completed" update did not is a no-op.
+    """
+
+    def __init__(self,
+                 payment_service: PaymentService,
+                 auth_service: AuthService,
+                 rpc_url: Optional[str] = None,
+                 interval: float = CONFIRMATION_INTERVAL,
+                 batch_size: int = CONFIRMATION_BATCH_SIZE,
+                 confirmations: int = REQUIRED_CONFIRMATIONS,
+                 timeout: float = CONFIRMATION_TIMEOUT_SECONDS):
+        self.payment_service = payment_service
+        self.auth_service = auth_service
+        self.rpc_url = rpc_url or payment_service.bnb_rpc_url
+        self.interval = interval
+        self.batch_size = batch_size
+        self.confirmations = confirmations
+        self.timeout = timeout
+        self.session: Optional["aiohttp.ClientSession"] = None
+        self.stats = {"batches": 0, "rpc_calls": 0, "rpc_errors": 0, "completed": 0, "failed": 0}
+        self._task: Optional[asyncio.Task] = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self.session is None or self.session.closed:
+            import aiohttp
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=RPC_TIMEOUT_SECONDS))
+        return self.session
+
+    async def rpc_batch(self, calls: List[tuple]) -> List[Any]:
+        """
+        Send (method, params) calls as one JSON-RPC batch, results come back in call order
+
+        Calls the node answered with an error yield UNKNOWN.
+        """
+        payload = [
+            {"jsonrpc": "2.0", "id": index, "method": method, "params": params}
+            for index, (method, params) in enumerate(calls)
+        ]
+        with upstream("bnb_rpc", "rpc_batch"):
+            async with self._get_session().post(self.rpc_url, json=payload) as response:
+                response.raise_for_status()
+                replies = await response.json(content_type=None)
+        if not isinstance(replies, list):
+            raise RuntimeError(f"JSON-RPC batch rejected: {replies}")
+
+        self.stats["rpc_calls"] += len(calls)
+        by_id = {reply.get("id"): reply for reply in replies}
+        results = []
+        for index in range(len(calls)):
+            reply = by_id.get(index)
+            if reply is None or "error" in reply:
+                self.stats["rpc_errors"] += 1
+                results.append(UNKNOWN)
+            else:
+                results.append(reply.get("result"))
+        return results
+
+    async def warm_up(self):
+        """
+        Open the connection to the node that the confirmation batches reuse
+        """
+        try:
+            await self.rpc_batch([("web3_clientVersion", [])])
+        except Exception as e:
+            print(f"Error warming up RPC connection: {e}")
+
+    def _outcome(self, payment: Dict, receipt: Any, transaction: Any, head: int, now: datetime) -> Optional[str]:
+        """
+        Decide whether a payment is confirmed on chain, failed, or still waiting (None)
+        """
+        waited = (now - payment["updated_at"]).total_seconds()
+        # Not mined, or a hash the node keeps rejecting, gives up after the timeout
+        if receipt is UNKNOWN or transaction is UNKNOWN or receipt is None:
+            return "failed" if waited > self.timeout else None
+        if int(receipt["status"], 16) != 1 or transaction is None:
+            return "failed"
+        if (transaction.get("to") or "").lower() != (payment["payment_address"] or "").lower():
+            return "failed"
+        # Every payment goes to the same address, the memo ties the transaction to this one request
+        if (transaction.get("input") or "").lower() != self.payment_service.payment_memo(payment["id"]):
+            return "failed"
+        if int(transaction["value"], 16) < int(Decimal(str(payment["amount"])) * WEI_PER_BNB):
+            return "failed"
+        if head - int(receipt["blockNumber"], 16) + 1 < self.confirmations:
+            return None
+        return "confirmed"
+
+    async def confirm_batch(self, after: Optional[Position] = None) -> List[Dict]:
+        """
+        Check the next batch of submitted payments after `after`, returns the batch examined
+        """
+        ledger = self.payment_service.ledger
+        payments = await ledger.list_by_status("submitted", self.batch_size, after)
+        if not payments:
+            return payments
+
+        # Several payments may name the same transaction, look each one up once
+        tx_hashes = list(dict.fromkeys(payment["tx_hash"] for payment in payments))
+        calls = [("eth_blockNumber", [])]
+        for tx_hash in tx_hashes:
+            calls.append(("eth_getTransactionReceipt", [tx_hash]))
+            calls.append(("eth_getTransactionByHash", [tx_hash]))
+        results = await self.rpc_batch(calls)
+        self.stats["batches"] += 1
+        if results[0] is UNKNOWN:
+            return payments
+
+        head = int(results[0], 16)
+        now = datetime.now()
+        lookups = {tx_hash: (results[1 + 2 * index], results[2 + 2 * index]) for index, tx_hash in enumerate(tx_hashes)}
+        outcomes: Dict[str, List[str]] = {"confirmed": [], "failed": []}
+        for payment in payments:
+            receipt, transaction = lookups[payment["tx_hash"]]
+            outcome = self._outcome(payment, receipt, transaction, head, now)
+            if outcome is not None:
+                outcomes[outcome].append(payment["id"])
+
+        failed = await ledger.transition(outcomes["failed"], "submitted", {"status": "failed", "updated_at": now})
+        # One by one, so a transaction already paid for elsewhere only fails its own row
+        confirmed = []
+        for tx_id in outcomes["confirmed"]:
+            try:
+                confirmed += await ledger.transition([tx_id], "submitted", {"status": "confirmed", "updated_at": now})
+            except DuplicateTransactionError:
+                failed += await ledger.transition([tx_id], "submitted", {"status": "failed", "updated_at": now})
+        self.stats["failed"] += len(failed)
+        await asyncio.gather(*(self._credit(payment) for payment in confirmed))
+        return payments
+
+    async def confirm_all(self):
+        """
+        One pass over every submitted payment, batch by batch in ledger order,
+        then over the confirmed payments whose credit has not gone through
+
+        Paging by position means payments still waiting for confirmations
+        never hold back the ones submitted after them.
+        """
+        after: Optional[Position] = None
+        while True:
+            payments = await self.confirm_batch(after)
+            if len(payments) < self.batch_size:
+                break
+            after = (payments[-1]["created_at"], payments[-1]["id"])
+        await self.credit_confirmed()
+
+    async def credit_confirmed(self):
+        """
+        Retry crediting every payment that is confirmed on chain but not credited yet
+        """
+        ledger = self.payment_service.ledger
+        now = datetime.now()
+        after: Optional[Position] = None
+        while True:
+            crediting = await ledger.list_by_status("crediting", self.batch_size, after)
+            expired = [
+                payment["id"] for payment in crediting
+                if (now - payment["updated_at"]).total_seconds() > CREDIT_LEASE_SECONDS
+            ]
+            await ledger.transition(expired, "crediting", {"status": "confirmed", "updated_at": now})
+            if len(crediting) < self.batch_size:
+                break
+            after = (crediting[-1]["created_at"], crediting[-1]["id"])
+
+        after = None
+        while True:
+            confirmed = await ledger.list_by_status("confirmed", self.batch_size, after)
+            await asyncio.gather(*(self._credit(payment) for payment in confirmed))
+            if len(confirmed) < self.batch_size:
+                return
+            after = (confirmed[-1]["created_at"], confirmed[-1]["id"])
+
+    async def _credit(self, payment: Dict):
+        ledger = self.payment_service.ledger
+        # Only the worker whose UPDATE moves the row gets to credit it
+        claimed = await ledger.transition([payment["id"]], "confirmed", {"status": "crediting", "updated_at": datetime.now()})
+        if not claimed:
+            return
+        try:
+            user = await self.auth_service.get_user_by_id(payment["user_id"])
+            if user is not None:
+                quantity = self.payment_service.calculate_quantity(payment["item_type"], payment["amount"])
+                # Keyed on the payment id, a retry after a later step failed does not credit again
+                await self.auth_service.credit_payment(user.email, payment["id"], quantity, payment["tx_hash"])
+            completed = await ledger.transition([payment["id"]], "crediting", {"status": "completed", "updated_at": datetime.now()})
+        except Exception as e:
+            print(f"Error crediting payment {payment['id']}: {e}")
+            await ledger.transition([payment["id"]], "crediting", {"status": "confirmed", "updated_at": datetime.now()})
+            return
+        self.stats["completed"] += len(completed)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.confirm_all()
+            except Exception as e:
+                print(f"Error confirming payments: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.session is not None:
+            await self.session.close()
@@ -0,0 +1,297 @@
+import asyncio
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.user_repository import DATABASE_URL, DATABASE_POOL_MIN_SIZE, DATABASE_POOL_MAX_SIZE
+
+PAYMENT_COLUMNS = [
+    "id", "user_id", "amount", "item_type", "status",
+    "created_at", "updated_at", "payment_address", "tx_hash",
+]
+
+# Keyset position of a row in a user's history: (created_at, id)
+Position = Tuple[datetime, str]
+
+
+def _schema_sql(timestamp_type: str, float_type: str) -> List[str]:
+    return [
+        f"""CREATE TABLE IF NOT EXISTS payments (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            amount {float_type} NOT NULL,
+            item_type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at {timestamp_type} NOT NULL,
+            updated_at {timestamp_type} NOT NULL,
+            payment_address TEXT,
+            tx_hash TEXT
+        )""",
+        # One user's history, newest first, is a range scan on this index
+        "CREATE INDEX IF NOT EXISTS payments_user_created_idx ON payments (user_id, created_at DESC, id DESC)",
+        # Only open rows are indexed, settled rows never reach the confirmation queries
+        "CREATE INDEX IF NOT EXISTS payments_open_idx ON payments (status, created_at, id) "
+        "WHERE status IN ('pending', 'submitted', 'confirmed', 'crediting')",
+        # A transaction hash can pay for one request only. Submitted and failed
+        # rows may share a hash, so nobody can block a hash by submitting it first.
+        "DROP INDEX IF EXISTS payments_tx_hash_idx",
+        "CREATE UNIQUE INDEX IF NOT EXISTS payments_paid_tx_hash_idx ON payments (tx_hash) "
+        "WHERE status IN ('confirmed', 'crediting', 'completed')",
+    ]
+
+
+class DuplicateTransactionError(ValueError):
+    pass
+
+
+class PaymentRepository(ABC):
+    """
+    Durable payment ledger, shared by every worker process
+
+    Rows are plain dicts with PAYMENT_COLUMNS as keys and datetimes for the
+    timestamp columns.
+    """
+
+    @abstractmethod
+    async def connect(self):
+        """Open connections and create the schema"""
+
+    @abstractmethod
+    async def close(self):
+        """Release connections"""
+
+    @abstractmethod
+    async def create(self, payment: Dict[str, Any]) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    async def get(self, tx_id: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    async def update(self, tx_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Set columns on a payment and return the updated row"""
+
+    @abstractmethod
+    async def list_by_user(self, user_id: str, limit: int, before: Optional[Position] = None) -> List[Dict[str, Any]]:
+        """Return up to `limit` of a user's payments older than `before`, newest first"""
+
+    @abstractmethod
+    async def list_by_status(self, status: str, limit: int, after: Optional[Position] = None) -> List[Dict[str, Any]]:
+        """Return up to `limit` payments in an open status newer than `after`, oldest first"""
+
+    @abstractmethod
+    async def transition(self, tx_ids: List[str], from_status: str, fields: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Update every listed payment still in `from_status` in one statement
+
+        Returns only the rows that were changed, so concurrent workers never
+        settle the same payment twice. Raises DuplicateTransactionError when
+        the update would give a second paid payment the same tx_hash.
+        """
+
+
+class PostgresPaymentRepository(PaymentRepository):
+    """
+    Payments table in Postgres behind an async connection pool
+    """
+
+    def __init__(self, dsn: str, min_size: int = DATABASE_POOL_MIN_SIZE, max_size: int = DATABASE_POOL_MAX_SIZE):
+        from psycopg.rows import dict_row
+        from psycopg_pool import AsyncConnectionPool
+
+        self.pool = AsyncConnectionPool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            open=False,
+            kwargs={"autocommit": True, "row_factory": dict_row}
+        )
+
+    async def connect(self):
+        await self.pool.open(wait=True)
+        async with self.pool.connection() as conn:
+            for statement in _schema_sql("TIMESTAMP", "DOUBLE PRECISION"):
+                await conn.execute(statement)
+
+    async def close(self):
+        await self.pool.close()
+
+    async def _fetch(self, query: str, params: tuple) -> List[Dict[str, Any]]:
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(query, params, prepare=True)
+            return await cursor.fetchall()
+
+    async def create(self, payment: Dict[str, Any]) -> Dict[str, Any]:
+        placeholders = ", ".join(["%s"] * len(PAYMENT_COLUMNS))
+        rows = await self._fetch(
+            f"INSERT INTO payments ({', '.join(PAYMENT_COLUMNS)}) VALUES ({placeholders}) RETURNING *",
+            tuple(payment.get(column) for column in PAYMENT_COLUMNS)
+        )
+        return rows[0]
+
+    async def get(self, tx_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self._fetch("SELECT * FROM payments WHERE id = %s", (tx_id,))
+        return rows[0] if rows else None
+
+    async def update(self, tx_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        columns = [column for column in fields if column in PAYMENT_COLUMNS]
+        assignments = ", ".join(f"{column} = %s" for column in columns)
+        rows = await self._fetch(
+            f"UPDATE payments SET {assignments} WHERE id = %s RETURNING *",
+            tuple(fields[column] for column in columns) + (tx_id,)
+        )
+        return rows[0] if rows else None
+
+    async def list_by_user(self, user_id: str, limit: int, before: Optional[Position] = None) -> List[Dict[str, Any]]:
+        if before is None:
+            return await self._fetch(
+                "SELECT * FROM payments WHERE user_id = %s ORDER BY created_at DESC, id DESC LIMIT %s",
+                (user_id, limit)
+            )
+        return await self._fetch(
+            "SELECT * FROM payments WHERE user_id = %s AND (created_at, id) < (%s, %s) "
+            "ORDER BY created_at DESC, id DESC LIMIT %s",
+            (user_id, before[0], before[1], limit)
+        )
+
+    async def list_by_status(self, status: str, limit: int, after: Optional[Position] = None) -> List[Dict[str, Any]]:
+        if after is None:
+            return await self._fetch(
+                "SELECT * FROM payments WHERE status = %s ORDER BY created_at, id LIMIT %s",
+                (status, limit)
+            )
+        return await self._fetch(
+            "SELECT * FROM payments WHERE status = %s AND (created_at, id) > (%s, %s) ORDER BY created_at, id LIMIT %s",
+            (status, after[0], after[1], limit)
+        )
+
+    async def transition(self, tx_ids: List[str], from_status: str, fields: Dict[str, Any]) -> List[Dict[str, Any]]:
+        from psycopg.errors import UniqueViolation
+
+        if not tx_ids:
+            return []
+        columns = [column for column in fields if column in PAYMENT_COLUMNS]
+        assignments = ", ".join(f"{column} = %s" for column in columns)
+        try:
+            return await self._fetch(
+                f"UPDATE payments SET {assignments} WHERE id = ANY(%s) AND status = %s RETURNING *",
+                tuple(fields[column] for column in columns) + (list(tx_ids), from_status)
+            )
+        except UniqueViolation:
+            raise DuplicateTransactionError("Transaction already paid for another payment")
+
+
+class SQLitePaymentRepository(PaymentRepository):
+    """
+    SQLite fallback for local development and tests
+
+    Timestamps are stored as fixed-width ISO strings so they sort like the
+    datetimes they encode.
+    """
+
+    def __init__(self, path: str):
+        self.path = path or ":memory:"
+        self.conn: Optional[sqlite3.Connection] = None
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _schema_sql("TEXT", "REAL"):
+            self.conn.execute(statement)
+
+    async def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    @staticmethod
+    def _param(value: Any) -> Any:
+        return value.isoformat(timespec="microseconds") if isinstance(value, datetime) else value
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> Dict[str, Any]:
+        payment = dict(row)
+        for column in ("created_at", "updated_at"):
+            payment[column] = datetime.fromisoformat(payment[column])
+        return payment
+
+    async def _fetch(self, query: str, params: tuple) -> List[Dict[str, Any]]:
+        def execute():
+            return self.conn.execute(query, tuple(self._param(value) for value in params)).fetchall()
+
+        async with self.lock:
+            rows = await asyncio.to_thread(execute)
+        return [self._row(row) for row in rows]
+
+    async def create(self, payment: Dict[str, Any]) -> Dict[str, Any]:
+        placeholders = ", ".join(["?"] * len(PAYMENT_COLUMNS))
+        rows = await self._fetch(
+            f"INSERT INTO payments ({', '.join(PAYMENT_COLUMNS)}) VALUES ({placeholders}) RETURNING *",
+            tuple(payment.get(column) for column in PAYMENT_COLUMNS)
+        )
+        return rows[0]
+
+    async def get(self, tx_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self._fetch("SELECT * FROM payments WHERE id = ?", (tx_id,))
+        return rows[0] if rows else None
+
+    async def update(self, tx_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        columns = [column for column in fields if column in PAYMENT_COLUMNS]
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        rows = await self._fetch(
+            f"UPDATE payments SET {assignments} WHERE id = ? RETURNING *",
+            tuple(fields[column] for column in columns) + (tx_id,)
+        )
+        return rows[0] if rows else None
+
+    async def list_by_user(self, user_id: str, limit: int, before: Optional[Position] = None) -> List[Dict[str, Any]]:
+        if before is None:
+            return await self._fetch(
+                "SELECT * FROM payments WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+                (user_id, limit)
+            )
+        return await self._fetch(
+            "SELECT * FROM payments WHERE user_id = ? AND (created_at, id) < (?, ?) "
+            "ORDER BY created_at DESC, id DESC LIMIT ?",
+            (user_id, before[0], before[1], limit)
+        )
+
+    async def list_by_status(self, status: str, limit: int, after: Optional[Position] = None) -> List[Dict[str, Any]]:
+        if after is None:
+            return await self._fetch(
+                "SELECT * FROM payments WHERE status = ? ORDER BY created_at, id LIMIT ?",
+                (status, limit)
+            )
+        return await self._fetch(
+            "SELECT * FROM payments WHERE status = ? AND (created_at, id) > (?, ?) ORDER BY created_at, id LIMIT ?",
+            (status, after[0], after[1], limit)
+        )
+
+    async def transition(self, tx_ids: List[str], from_status: str, fields: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if not tx_ids:
+            return []
+        columns = [column for column in fields if column in PAYMENT_COLUMNS]
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        placeholders = ", ".join(["?"] * len(tx_ids))
+        try:
+            return await self._fetch(
+                f"UPDATE payments SET {assignments} WHERE id IN ({placeholders}) AND status = ? RETURNING *",
+                tuple(fields[column] for column in columns) + tuple(tx_ids) + (from_status,)
+            )
+        except sqlite3.IntegrityError:
+            raise DuplicateTransactionError("Transaction already paid for another payment")
+
+
+def create_payment_repository(database_url: str = DATABASE_URL) -> PaymentRepository:
+    """
+    Pick the repository implementation from the DATABASE_URL scheme
+    """
+    if database_url.startswith(("postgres://", "postgresql://")):
+        return PostgresPaymentRepository(database_url)
+    if database_url.startswith("sqlite://"):
+        return SQLitePaymentRepository(database_url[len("sqlite:///"):] if database_url.startswith("sqlite:///") else "")
+    raise ValueError(f"Unsupported DATABASE_URL: {database_url}")
@@ -1,22 +1,62 @@
+import base64
+import binascii
+import hashlib
 import os
-from typing import Dict, List, Optional
+import re
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from web3 import Web3
 from dotenv import load_dotenv
 import uuid
 
+from app.services.payment_repository import PaymentRepository, create_payment_repository
+
 load_dotenv()
 
+SUGGESTION_PRICE_BNB = 0.015  # 0.015 BNB per suggestion
+HISTORY_PAGE_SIZE = int(os.getenv("PAYMENT_HISTORY_PAGE_SIZE", "20"))
+TX_HASH_PATTERN = re.compile(r"0x[0-9a-fA-F]{64}")
+
 class PaymentService:
-    def __init__(self):
+    def __init__(self, ledger: Optional[PaymentRepository] = None):
         self.bnb_rpc_url = os.getenv("BNB_RPC_URL", "https://bsc-dataseed.binance.org/")
         self.contract_address = os.getenv("CONTRACT_ADDRESS", "0x0000000000000000000000000000000000000000")
-        self.web3 = Web3(Web3.HTTPProvider(self.bnb_rpc_url))
-        self.transactions = {}  # 模拟存储
+        self.ledger = ledger or create_payment_repository()
+        
+    async def start(self):
+        """打开交易账本"""
+        await self.ledger.connect()
+        
+    @staticmethod
+    def payment_memo(tx_id: str) -> str:
+        """支付备注：付款交易的input数据必须包含它，证明这笔转账是为该支付请求付的"""
+        return "0x" + hashlib.sha256(tx_id.encode()).hexdigest()
+        
+    @classmethod
+    def _serialize(cls, payment: Dict) -> Dict:
+        data = dict(payment)
+        data["created_at"] = payment["created_at"].isoformat()
+        data["updated_at"] = payment["updated_at"].isoformat()
+        data["memo"] = cls.payment_memo(payment["id"])
+        return data
+        
+    @staticmethod
+    def encode_cursor(payment: Dict) -> str:
+        raw = f"{payment['created_at'].isoformat(timespec='microseconds')}|{payment['id']}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+        
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+        """解析分页游标，格式错误时抛出ValueError"""
+        try:
+            created_at, tx_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+            return datetime.fromisoformat(created_at), tx_id
+        except (binascii.Error, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid cursor: {e}")
         
-    def generate_payment_request(self, user_id: str, amount: float, item_type: str) -> Dict:
+    async def generate_payment_request(self, user_id: str, amount: float, item_type: str) -> Dict:
         """生成支付请求"""
-        tx_id = f"tx_{user_id}_{int(datetime.now().timestamp())}"
+        now = datetime.now()
+        tx_id = f"tx_{user_id}_{int(now.timestamp())}_{uuid.uuid4().hex[:8]}"
         
         payment_data = {
             "id": tx_id,
@@ -24,56 +64,85 @@ class PaymentService:
             "amount": amount,
             "item_type": item_type,
             "status": "pending",
-            "created_at": datetime.now().isoformat(),
+            "created_at": now,
+            "updated_at": now,
             "payment_address": self.contract_address,
         }
         
-        self.transactions[tx_id] = payment_data
-        return payment_data
+        return self._serialize(await self.ledger.create(payment_data))
     
-    def verify_payment(self, tx_id: str, tx_hash: str) -> Dict:
-        """验证支付"""
-        if tx_id not in self.transactions:
+    async def verify_payment(self, tx_id: str, tx_hash: str, user_id: Optional[str] = None) -> Dict:
+        """提交支付交易哈希（待支付或已失败的支付），等待确认任务在链上核实"""
+        if not TX_HASH_PATTERN.fullmatch(tx_hash):
+            return {"status": "failed", "message": "Invalid transaction hash"}
+        tx_hash = tx_hash.lower()
+        
+        payment = await self.ledger.get(tx_id)
+        if payment is None or (user_id is not None and payment["user_id"] != user_id):
             return {"status": "failed", "message": "Transaction not found"}
+        # 失败的支付可以用更正后的哈希重新提交（哈希填错、节点超时等）
+        if payment["status"] not in ("pending", "failed"):
+            return {"status": payment["status"], "tx_id": tx_id, "tx_hash": payment["tx_hash"]}
         
         try:
-            
-            self.transactions[tx_id]["status"] = "completed"
-            self.transactions[tx_id]["tx_hash"] = tx_hash
+            submitted = await self.ledger.transition([tx_id], payment["status"], {
+                "status": "submitted",
+                "tx_hash": tx_hash,
+                "updated_at": datetime.now()
+            })
+            if not submitted:
+                return await self.get_payment_status(tx_id)
             
             return {
-                "status": "completed",
+                "status": "submitted",
                 "tx_id": tx_id,
                 "tx_hash": tx_hash
             }
         except Exception as e:
-            return {"status": "failed", "message": str(e)}
+            # 不把数据库错误原文返回给客户端
+            print(f"Error submitting payment {tx_id}: {e}")
+            return {"status": "failed", "message": "Could not submit transaction"}
     
-    def get_payment_status(self, tx_id: str) -> Dict:
+    async def get_payment_status(self, tx_id: str) -> Dict:
         """获取支付状态"""
-        if tx_id not in self.transactions:
+        payment = await self.ledger.get(tx_id)
+        if payment is None:
             return {"status": "failed", "message": "Transaction not found"}
         
         return {
-            "status": self.transactions[tx_id]["status"],
+            "status": payment["status"],
             "tx_id": tx_id,
-            "created_at": self.transactions[tx_id]["created_at"],
-            "amount": self.transactions[tx_id]["amount"],
-            "item_type": self.transactions[tx_id]["item_type"]
+            "created_at": payment["created_at"].isoformat(),
+            "amount": payment["amount"],
+            "item_type": payment["item_type"]
         }
     
-    def get_user_transactions(self, user_id: str) -> List[Dict]:
-        """获取用户交易历史"""
-        user_txs = []
-        for tx_id, tx_data in self.transactions.items():
-            if tx_data["user_id"] == user_id:
-                user_txs.append(tx_data)
-        
-        return user_txs
+    async def get_user_transactions(self, user_id: str, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """获取用户交易历史（按创建时间倒序），返回本页交易和下一页游标"""
+        before = self.decode_cursor(cursor) if cursor else None
+        # 多取一条用来判断是否还有下一页
+        payments = await self.ledger.list_by_user(user_id, limit + 1, before)
+        next_cursor = self.encode_cursor(payments[limit - 1]) if len(payments) > limit else None
+        return [self._serialize(payment) for payment in payments[:limit]], next_cursor
+    
+    async def get_pending_transactions(self, limit: int = 100) -> List[Dict]:
+        """获取尚未提交交易哈希的支付请求（走状态索引）"""
+        return [self._serialize(payment) for payment in await self.ledger.list_by_status("pending", limit)]
     
     def calculate_price(self, item_type: str, quantity: int = 1) -> float:
         """计算价格"""
         if item_type == "tweet_suggestion":
-            return 0.015 * quantity  # 0.015 BNB per suggestion
+            return SUGGESTION_PRICE_BNB * quantity
         else:
             return 0.0
+    
+    def calculate_quantity(self, item_type: str, amount: float) -> int:
+        """根据支付金额计算购买数量"""
+        if item_type == "tweet_suggestion":
+            return round(amount / SUGGESTION_PRICE_BNB)
+        else:
+            return 0
+
+    async def close(self):
+        """关闭交易账本"""
+        await self.ledger.close()
@@ -0,0 +1,98 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+
+from app.services.auth_service import AuthService
+from app.services.payment_confirmer import PaymentConfirmer
+from app.services.payment_service import PaymentService
+from app.services.twitter_service import TwitterService
+from app.utils.ai_service import AIService
+from app.utils.llm import create_llm_client
+from app.utils.loop_watchdog import LOOP_WATCHDOG_ENABLED, LoopWatchdog
+from app.utils.metrics import CacheCollector, LoopLagMonitor, XSchedulerCollector, register_collector, unregister_collector
+
+load_dotenv()
+
+WARM_UP_TIMEOUT_SECONDS = float(os.getenv("WARM_UP_TIMEOUT_SECONDS", "5"))
+
+
+class ServiceRegistry:
+    """
+    Owns the long-lived services of one worker process
+
+    Services are built once when the app starts and shared by every request,
+    so their HTTP/RPC connection pools and in-memory state survive between
+    requests instead of being rebuilt on the hot path.
+    """
+
+    def __init__(self):
+        self.ai_service = AIService(llm=create_llm_client())
+        self.twitter_service = TwitterService(ai_service=self.ai_service)
+        self.auth_service = AuthService()
+        self.payment_service = PaymentService()
+        self.payment_confirmer = PaymentConfirmer(self.payment_service, self.auth_service)
+        self.loop_lag_monitor = LoopLagMonitor()
+        self.loop_watchdog = LoopWatchdog() if LOOP_WATCHDOG_ENABLED else None
+        self._collectors = []
+
+    def caches(self) -> list:
+        """
+        Every in-memory cache of this worker, for the /metrics hit ratios
+        """
+        twitter_service = self.twitter_service
+        caches = [
+            twitter_service.profile_cache,
+            twitter_service.timeline_cache,
+            twitter_service.style_cache,
+            self.auth_service.token_cache,
+            self.auth_service.user_cache,
+        ]
+        if twitter_service.client_pool is not None:
+            caches.append(twitter_service.client_pool.clients)
+        if self.ai_service.llm is not None:
+            caches.append(self.ai_service.llm.cache)
+        return caches
+
+    async def start(self):
+        """
+        Open upstream connections before the first request arrives
+        """
+        self._collectors = [
+            register_collector(CacheCollector(self.caches)),
+            register_collector(XSchedulerCollector(self.twitter_service.x_scheduler.queue_depths)),
+        ]
+        self.loop_lag_monitor.start()
+        if self.loop_watchdog is not None:
+            self.loop_watchdog.start()
+        await self.auth_service.start()
+        await self.payment_service.start()
+        self.twitter_service.start()
+        self.payment_confirmer.start()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    self.twitter_service.warm_up(),
+                    self.payment_confirmer.warm_up(),
+                    return_exceptions=True
+                ),
+                timeout=WARM_UP_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            print("Warm-up did not finish in time, continuing startup")
+
+    async def stop(self):
+        """
+        Stop background tasks and release pooled connections
+        """
+        await self.loop_lag_monitor.stop()
+        if self.loop_watchdog is not None:
+            await self.loop_watchdog.stop()
+        for collector in self._collectors:
+            unregister_collector(collector)
+        self._collectors = []
+        await self.payment_confirmer.stop()
+        await self.twitter_service.close()
+        await self.auth_service.close()
+        await self.payment_service.close()
+        await self.ai_service.close()
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from app.models.tweet import TrendingTopic
+
+
+class TrendingTopicsCache:
+    """
+    Per-location trending snapshots kept fresh by a background task
+
+    Readers only ever look up the last good snapshot, they never wait on X.
+    A failed refresh leaves the previous snapshot in place. Locations picked
+    up from requests must be numeric WOEIDs and are dropped again once nobody
+    has asked for them within `location_ttl` seconds, the configured ones stay.
+    """
+
+    def __init__(self,
+                 fetch: Callable[[str], Awaitable[List[TrendingTopic]]],
+                 refresh_interval: float = 300.0,
+                 locations: Iterable[str] = ("1",),
+                 max_locations: int = 50,
+                 location_ttl: float = 3600.0):
+        self.fetch = fetch
+        self.refresh_interval = refresh_interval
+        self.max_locations = max_locations
+        self.location_ttl = location_ttl
+        self.locations = list(dict.fromkeys(locations))
+        self.pinned = set(self.locations)
+        self.requested_at: Dict[str, float] = {}
+        self.snapshots: Dict[str, List[TrendingTopic]] = {}
+        self.refreshed_at: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    def get(self, location_id: str) -> Optional[List[TrendingTopic]]:
+        """
+        Return the last good snapshot for a location
+
+        Unknown locations are registered for refreshing and return None
+        until their first snapshot lands. Ids that are not a WOEID return None.
+        """
+        location_id = self.normalize(location_id)
+        if location_id is None:
+            return None
+        self.requested_at[location_id] = time.monotonic()
+        snapshot = self.snapshots.get(location_id)
+        if snapshot is None:
+            self.track(location_id)
+        return snapshot
+
+    @staticmethod
+    def normalize(location_id: str) -> Optional[str]:
+        """
+        Canonical form of a WOEID ("01" -> "1"), None when it is not one
+        """
+        if not (location_id.isascii() and location_id.isdigit()) or len(location_id) > 12:
+            return None
+        woeid = int(location_id)
+        return str(woeid) if woeid > 0 else None
+
+    def track(self, location_id: str):
+        if location_id in self.locations:
+            return
+        self.expire()
+        if len(self.locations) >= self.max_locations:
+            return
+        self.locations.append(location_id)
+        # Fetch right away rather than waiting for the next cycle
+        if self._task is not None and location_id not in self._pending:
+            task = asyncio.ensure_future(self.refresh(location_id))
+            self._pending[location_id] = task
+            task.add_done_callback(lambda _: self._pending.pop(location_id, None))
+
+    async def refresh(self, location_id: str) -> bool:
+        try:
+            topics = await self.fetch(location_id)
+        except Exception as e:
+            print(f"Error refreshing trending topics for {location_id}, keeping last snapshot: {e}")
+            return False
+        if not topics or location_id not in self.locations:
+            return False
+        self.snapshots[location_id] = topics
+        self.refreshed_at[location_id] = time.time()
+        return True
+
+    def expire(self):
+        """
+        Drop requested locations nobody has asked for within location_ttl
+        """
+        cutoff = time.monotonic() - self.location_ttl
+        for location_id in [loc for loc in self.locations if loc not in self.pinned]:
+            if self.requested_at.get(location_id, 0.0) < cutoff:
+                self.locations.remove(location_id)
+                self.requested_at.pop(location_id, None)
+                self.snapshots.pop(location_id, None)
+                self.refreshed_at.pop(location_id, None)
+
+    async def refresh_all(self):
+        self.expire()
+        await asyncio.gather(*(self.refresh(location_id) for location_id in list(self.locations)))
+
+    async def _run(self):
+        while True:
+            await self.refresh_all()
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        tasks = [task for task in [self._task, *self._pending.values()] if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
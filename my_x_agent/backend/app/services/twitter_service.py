@@ -1,33 +1,128 @@
+import asyncio
 import os
-import tweepy
-from typing import List, Optional
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
 from datetime import datetime
 from dotenv import load_dotenv
 
-from app.models.tweet import Tweet, UserProfile, TweetSuggestion, TweetAnalysis, TrendingTopic, ReplyOption
+from app.models.tweet import Tweet, UserProfile, TweetSuggestion, TweetAnalysis, TrendingTopic, ReplyOption, StyleProfile
+from app.models.tweet_batch import TweetBatch
+from app.models.user import UserInDB
+from app.services.trending_cache import TrendingTopicsCache
+from app.services.x_client_pool import XClientPool
+from app.services.x_scheduler import BACKGROUND, XRequestScheduler, request_priority
 from app.utils.ai_service import AIService
+from app.utils.analysis_pool import AnalysisPool
+from app.utils.cache import AsyncTTLCache, in_background_refresh
+
+if TYPE_CHECKING:
+    from app.services.x_client import AsyncXClient
 
 load_dotenv()
 
+PROFILE_CACHE_TTL = float(os.getenv("TWITTER_PROFILE_CACHE_TTL", "300"))
+TIMELINE_CACHE_TTL = float(os.getenv("TWITTER_TIMELINE_CACHE_TTL", "60"))
+CACHE_STALE_TTL = float(os.getenv("TWITTER_CACHE_STALE_TTL", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("TWITTER_CACHE_MAX_ENTRIES", "10000"))
+TRENDING_REFRESH_INTERVAL = float(os.getenv("TWITTER_TRENDING_REFRESH_INTERVAL", "300"))
+# Locations only ever asked for by requests stop being refreshed after this long without one
+TRENDING_LOCATION_TTL = float(os.getenv("TWITTER_TRENDING_LOCATION_TTL", "3600"))
+# Style profiles are served from memory and refreshed with only the newer tweets
+STYLE_PROFILE_TWEETS = int(os.getenv("STYLE_PROFILE_TWEETS", "50"))
+STYLE_PROFILE_REFRESH_INTERVAL = float(os.getenv("STYLE_PROFILE_REFRESH_INTERVAL", "900"))
+STYLE_PROFILE_MAX_AGE = float(os.getenv("STYLE_PROFILE_MAX_AGE", "604800"))
+TRENDING_LOCATIONS = [loc.strip() for loc in os.getenv("TWITTER_TRENDING_LOCATIONS", "1").split(",") if loc.strip()]
+
+# The calling user's own X client, set per request by use_connected_account
+_account_client: ContextVar[Optional["AsyncXClient"]] = ContextVar("x_account_client", default=None)
+
+def mock_trending_topics() -> List[TrendingTopic]:
+    return [
+        TrendingTopic(name="#AI", tweet_volume=52000),
+        TrendingTopic(name="#MachineLearning", tweet_volume=35000),
+        TrendingTopic(name="#Python", tweet_volume=28000),
+        TrendingTopic(name="#Blockchain", tweet_volume=22000),
+        TrendingTopic(name="#Crypto", tweet_volume=18000),
+    ]
+
 class TwitterService:
-    def __init__(self):
+    def __init__(self, ai_service: Optional[AIService] = None):
         self.api_key = os.getenv("TWITTER_API_KEY", "")
         self.api_secret = os.getenv("TWITTER_API_SECRET", "")
         self.access_token = os.getenv("TWITTER_ACCESS_TOKEN", "")
         self.access_token_secret = os.getenv("TWITTER_ACCESS_TOKEN_SECRET", "")
         self.bearer_token = os.getenv("TWITTER_BEARER_TOKEN", "")
         
+        # Every X call waits for its endpoint's rate-limit window instead of failing
+        self.x_scheduler = XRequestScheduler()
         self.client = None
         if self.bearer_token:
-            self.client = tweepy.Client(
+            # Imported here so processes without X credentials never load aiohttp/oauthlib
+            from app.services.x_client import AsyncXClient
+            self.client = AsyncXClient(
                 bearer_token=self.bearer_token,
                 consumer_key=self.api_key,
                 consumer_secret=self.api_secret,
                 access_token=self.access_token,
-                access_token_secret=self.access_token_secret
+                access_token_secret=self.access_token_secret,
+                scheduler=self.x_scheduler
             )
+        # User-context signing needs the app's consumer key
+        self.client_pool = None
+        if self.client and self.api_key and self.api_secret:
+            self.client_pool = XClientPool(self.client)
             
-        self.ai_service = AIService()
+        self.ai_service = ai_service or AIService()
+        self.analysis_pool = AnalysisPool(self.ai_service)
+        
+        self.profile_cache = AsyncTTLCache(
+            "profile", maxsize=CACHE_MAX_ENTRIES, ttl=PROFILE_CACHE_TTL, stale_ttl=CACHE_STALE_TTL
+        )
+        self.timeline_cache = AsyncTTLCache(
+            "timeline", maxsize=CACHE_MAX_ENTRIES, ttl=TIMELINE_CACHE_TTL, stale_ttl=CACHE_STALE_TTL
+        )
+        self.style_cache = AsyncTTLCache(
+            "style_profile", maxsize=CACHE_MAX_ENTRIES, ttl=STYLE_PROFILE_REFRESH_INTERVAL, stale_ttl=STYLE_PROFILE_MAX_AGE
+        )
+        self.trending_cache = TrendingTopicsCache(
+            self._fetch_trending_topics,
+            refresh_interval=TRENDING_REFRESH_INTERVAL,
+            locations=TRENDING_LOCATIONS,
+            location_ttl=TRENDING_LOCATION_TTL
+        )
+    
+    async def use_connected_account(self, user_id: str, load_user: Callable[[str], Awaitable[Optional[UserInDB]]]):
+        """
+        Send the X calls of the current request with the user's connected X
+        account, on that account's rate limits. Users without one keep using
+        the app credentials.
+        """
+        if self.client_pool is not None:
+            _account_client.set(await self.client_pool.get(user_id, load_user))
+    
+    def forget_connected_account(self, user_id: str):
+        """
+        Drop the user's pooled client after their X tokens change
+        """
+        if self.client_pool is not None:
+            self.client_pool.invalidate(user_id)
+    
+    def _x(self) -> "AsyncXClient":
+        # Refreshes nobody is waiting on are not billed to whichever user happened to trigger them
+        if in_background_refresh.get():
+            return self.client
+        return _account_client.get() or self.client
+    
+    @staticmethod
+    def _cache_key(*parts) -> tuple:
+        """
+        Cache key scoped to the credential the X calls are signed with
+        
+        What X returns depends on who asks (protected accounts, blocks), so
+        results fetched with one user's account are never served to others.
+        """
+        client = _account_client.get()
+        return (client.user_credential if client is not None else "app",) + parts
     
     def authenticate_user(self, auth_token: str, auth_verifier: str) -> dict:
         """
@@ -40,7 +135,7 @@ class TwitterService:
             "screen_name": "example_user"
         }
     
-    def get_user_profile(self, username: str) -> Optional[UserProfile]:
+    async def get_user_profile(self, username: str) -> Optional[UserProfile]:
         """
         Get a user's profile information
         """
@@ -56,169 +151,276 @@ class TwitterService:
             )
             
         try:
-            user = self.client.get_user(
-                username=username,
-                user_fields=["profile_image_url", "description", "public_metrics"]
+            return await self.profile_cache.get_or_load(
+                self._cache_key(username.lower()), lambda: self._fetch_user_profile(username)
             )
-            
-            if user.data:
-                return UserProfile(
-                    id=user.data.id,
-                    username=user.data.username,
-                    display_name=user.data.name,
-                    profile_image_url=user.data.profile_image_url,
-                    description=user.data.description,
-                    followers_count=user.data.public_metrics["followers_count"],
-                    following_count=user.data.public_metrics["following_count"]
-                )
-            return None
         except Exception as e:
             print(f"Error getting user profile: {e}")
             return None
     
-    def get_user_tweets(self, username: str, count: int = 10) -> List[Tweet]:
+    async def _fetch_user_profile(self, username: str) -> Optional[UserProfile]:
+        user = await self._x().get_user(
+            username,
+            user_fields=["profile_image_url", "description", "public_metrics"]
+        )
+        
+        data = user.get("data")
+        if data:
+            return UserProfile(
+                id=data["id"],
+                username=data["username"],
+                display_name=data["name"],
+                profile_image_url=data.get("profile_image_url"),
+                description=data.get("description"),
+                followers_count=data["public_metrics"]["followers_count"],
+                following_count=data["public_metrics"]["following_count"]
+            )
+        return None
+    
+    async def get_user_tweets(self, username: str, count: int = 10) -> List[Tweet]:
         """
         Get a user's recent tweets
         """
+        return (await self.get_user_timeline(username, count)).to_tweets()
+    
+    async def get_user_timeline(self, username: str, count: int = 10) -> TweetBatch:
+        """
+        Get a user's recent tweets as a column-oriented batch, the form they are cached in
+        """
         if not self.client:
-            mock_tweets = []
-            for i in range(count):
-                mock_tweets.append(
-                    Tweet(
-                        id=f"tweet_{i}",
-                        text=f"This is a mock tweet #{i} for demonstration purposes. #AI #Tech",
-                        created_at=datetime.now(),
-                        likes_count=i * 10,
-                        retweets_count=i * 5,
-                        replies_count=i * 2,
-                        author=UserProfile(
-                            id="12345",
-                            username=username,
-                            display_name=f"{username.capitalize()} User"
-                        )
-                    )
-                )
-            return mock_tweets
+            return TweetBatch.from_tweets(self._mock_tweet(username, i) for i in range(count))
             
         try:
-            tweets = self.client.get_users_tweets(
-                username=username,
-                max_results=count,
-                tweet_fields=["created_at", "public_metrics"]
+            return await self.timeline_cache.get_or_load(
+                self._cache_key(username.lower(), count), lambda: self._fetch_user_tweets(username, count)
             )
-            
-            result = []
-            if tweets.data:
-                user_profile = self.get_user_profile(username)
-                for tweet in tweets.data:
-                    result.append(
-                        Tweet(
-                            id=tweet.id,
-                            text=tweet.text,
-                            created_at=tweet.created_at,
-                            likes_count=tweet.public_metrics["like_count"],
-                            retweets_count=tweet.public_metrics["retweet_count"],
-                            replies_count=tweet.public_metrics["reply_count"],
-                            author=user_profile
-                        )
-                    )
-            return result
         except Exception as e:
             print(f"Error getting user tweets: {e}")
-            return []
+            return TweetBatch()
     
-    def get_trending_topics(self, location_id: str = "1") -> List[TrendingTopic]:
+    async def _fetch_user_tweets(self, username: str, count: int) -> TweetBatch:
+        # The timeline endpoint is keyed by user id, so the (cached) profile comes first
+        user_profile = await self.profile_cache.get_or_load(
+            self._cache_key(username.lower()), lambda: self._fetch_user_profile(username)
+        )
+        batch = TweetBatch()
+        if not user_profile:
+            return batch
+            
+        tweets = await self._x().get_users_tweets(
+            user_profile.id,
+            max_results=count,
+            tweet_fields=["created_at", "public_metrics"]
+        )
+        
+        for tweet in tweets.get("data", [])[:count]:
+            metrics = tweet["public_metrics"]
+            batch.append(
+                tweet["id"], tweet["text"], tweet["created_at"],
+                metrics["like_count"], metrics["retweet_count"], metrics["reply_count"], user_profile
+            )
+        return batch
+    
+    @staticmethod
+    def _to_tweet(tweet: dict, author: UserProfile) -> Tweet:
+        return Tweet(
+            id=tweet["id"],
+            text=tweet["text"],
+            created_at=tweet["created_at"],
+            likes_count=tweet["public_metrics"]["like_count"],
+            retweets_count=tweet["public_metrics"]["retweet_count"],
+            replies_count=tweet["public_metrics"]["reply_count"],
+            author=author
+        )
+    
+    @staticmethod
+    def _mock_tweet(username: str, i: int) -> Tweet:
+        return Tweet(
+            id=f"tweet_{i}",
+            text=f"This is a mock tweet #{i} for demonstration purposes. #AI #Tech",
+            created_at=datetime.now(),
+            likes_count=i * 10,
+            retweets_count=i * 5,
+            replies_count=i * 2,
+            author=UserProfile(
+                id="12345",
+                username=username,
+                display_name=f"{username.capitalize()} User"
+            )
+        )
+    
+    async def iter_user_tweets(self, username: str, limit: int) -> AsyncIterator[Tweet]:
         """
-        Get trending topics, default to worldwide (woeid=1)
+        Yield up to `limit` of a user's tweets, newest first, as timeline pages arrive
+        
+        Nothing is cached or collected, so memory stays flat however many
+        tweets are exported.
         """
         if not self.client:
-            mock_trends = [
-                TrendingTopic(name="#AI", tweet_volume=52000),
-                TrendingTopic(name="#MachineLearning", tweet_volume=35000),
-                TrendingTopic(name="#Python", tweet_volume=28000),
-                TrendingTopic(name="#Blockchain", tweet_volume=22000),
-                TrendingTopic(name="#Crypto", tweet_volume=18000),
-            ]
-            return mock_trends
-            
+            for i in range(limit):
+                yield self._mock_tweet(username, i)
+            return
+        
+        user_profile = await self.profile_cache.get_or_load(
+            self._cache_key(username.lower()), lambda: self._fetch_user_profile(username)
+        )
+        if not user_profile:
+            return
+        
+        pages = self._x().iter_users_tweets(user_profile.id, limit, tweet_fields=["created_at", "public_metrics"])
         try:
-            auth = tweepy.OAuth1UserHandler(
-                self.api_key, self.api_secret,
-                self.access_token, self.access_token_secret
-            )
-            api = tweepy.API(auth)
-            trends = api.get_place_trends(location_id)
+            async for tweet in pages:
+                yield self._to_tweet(tweet, user_profile)
+        finally:
+            await pages.aclose()
+    
+    async def get_trending_topics(self, location_id: str = "1") -> List[TrendingTopic]:
+        """
+        Get trending topics, default to worldwide (woeid=1)
+        
+        Served from the background-refreshed snapshot, this never waits on X.
+        """
+        if not self.client:
+            return mock_trending_topics()
             
-            result = []
-            for trend in trends[0]["trends"]:
-                result.append(
-                    TrendingTopic(
-                        name=trend["name"],
-                        tweet_volume=trend["tweet_volume"]
-                    )
+        snapshot = self.trending_cache.get(location_id)
+        if snapshot is None:
+            return mock_trending_topics()
+        return snapshot
+    
+    async def _fetch_trending_topics(self, location_id: str) -> List[TrendingTopic]:
+        # Only ever called by the background refresh, users read the snapshot
+        with request_priority(BACKGROUND):
+            trends = await self.client.get_place_trends(location_id)
+        
+        result = []
+        for trend in trends[0]["trends"]:
+            result.append(
+                TrendingTopic(
+                    name=trend["name"],
+                    tweet_volume=trend["tweet_volume"]
                 )
-            return result
-        except Exception as e:
-            print(f"Error getting trending topics: {e}")
-            mock_trends = [
-                TrendingTopic(name="#AI", tweet_volume=52000),
-                TrendingTopic(name="#MachineLearning", tweet_volume=35000),
-                TrendingTopic(name="#Python", tweet_volume=28000),
-                TrendingTopic(name="#Blockchain", tweet_volume=22000),
-                TrendingTopic(name="#Crypto", tweet_volume=18000),
-            ]
-            return mock_trends
+            )
+        return result
             
     def analyze_tweet(self, tweet_text: str) -> TweetAnalysis:
         """
         Analyze a tweet for sentiment, topics, and engagement potential
         """
-        sentiment = self.ai_service.analyze_tweet_sentiment(tweet_text)
-        topics = self.ai_service.extract_topics(tweet_text)
-        engagement_score, engagement_reason = self.ai_service.estimate_engagement(tweet_text)
-        risk_level, risk_reason = self.ai_service.assess_risk(tweet_text)
-        
-        return TweetAnalysis(
-            sentiment=sentiment,
-            topics=topics,
-            engagement_estimate=engagement_score,
-            engagement_reason=engagement_reason,
-            risk_level=risk_level,
-            risk_reason=risk_reason
-        )
+        return TweetAnalysis(**self.ai_service.analyze(tweet_text))
     
-    def generate_tweet_suggestions(self, username: str, count: int = 3, topics: Optional[List[str]] = None) -> List[TweetSuggestion]:
+    def analyze_tweets_stream(self, tweet_texts: List[str]) -> AsyncIterator[dict]:
+        """
+        Analyze many tweets, yielding TweetAnalysis fields per tweet in input order
         """
-        Generate tweet suggestions based on user's previous tweets and optionally specific topics
+        return self.analysis_pool.analyze_stream(tweet_texts)
+    
+    async def get_style_profile(self, username: str) -> StyleProfile:
         """
-        user_tweets = self.get_user_tweets(username, count=10)
-        tweet_texts = [tweet.text for tweet in user_tweets]
+        Get a user's writing style profile
         
-        if not topics:
-            trending = self.get_trending_topics()
-            trending_topics = [topic.name.strip('#') for topic in trending]
-        else:
-            trending_topics = topics
+        Built from recent tweets on first use, then served from memory. Once it
+        is older than the refresh interval it is still served as is while a
+        background task merges in only the tweets posted since.
+        """
+        key = self._cache_key(username.lower())
+        try:
+            return await self.style_cache.get_or_load(
+                key, lambda: self._build_style_profile(username, self.style_cache.peek(key))
+            )
+        except Exception as e:
+            print(f"Error building style profile: {e}")
+            return StyleProfile(username=username)
+    
+    async def _build_style_profile(self, username: str, previous: Optional[StyleProfile]) -> StyleProfile:
+        if not self.client:
+            timeline = await self.get_user_timeline(username, STYLE_PROFILE_TWEETS)
+            return self.ai_service.update_style_profile(None, username, timeline.texts)
+        
+        if previous is None or previous.latest_tweet_id is None:
+            timeline = await self.timeline_cache.get_or_load(
+                self._cache_key(username.lower(), STYLE_PROFILE_TWEETS), lambda: self._fetch_user_tweets(username, STYLE_PROFILE_TWEETS)
+            )
+            latest = max(timeline.ids, key=int, default=None)
+            return self.ai_service.update_style_profile(None, username, timeline.texts, latest)
         
-        suggestions_data = self.ai_service.generate_tweet_suggestions(
-            user_tweets=tweet_texts,
+        user_profile = await self.profile_cache.get_or_load(
+            self._cache_key(username.lower()), lambda: self._fetch_user_profile(username)
+        )
+        if not user_profile:
+            return previous
+        response = await self._x().get_users_tweets(
+            user_profile.id,
+            max_results=100,
+            since_id=previous.latest_tweet_id
+        )
+        newer = response.get("data", [])
+        return self.ai_service.update_style_profile(
+            previous,
+            username,
+            [tweet["text"] for tweet in newer],
+            response.get("meta", {}).get("newest_id")
+        )
+    
+    async def _suggestion_inputs(self, username: str, topics: Optional[List[str]]) -> tuple:
+        if topics:
+            return await self.get_style_profile(username), topics
+        # Neither lookup depends on the other, a returning user hits memory for both
+        style_profile, trending = await asyncio.gather(
+            self.get_style_profile(username),
+            self.get_trending_topics()
+        )
+        return style_profile, [topic.name.strip('#') for topic in trending]
+    
+    @staticmethod
+    def _to_suggestion(suggestion: dict) -> TweetSuggestion:
+        return TweetSuggestion(
+            text=suggestion["text"],
+            topics=suggestion["topics"],
+            confidence=suggestion["confidence"],
+            prompt_tokens=suggestion.get("prompt_tokens", 0),
+            completion_tokens=suggestion.get("completion_tokens", 0)
+        )
+    
+    @staticmethod
+    def _to_reply_option(reply: dict) -> ReplyOption:
+        return ReplyOption(
+            text=reply["text"],
+            stance=reply["stance"],
+            confidence=reply["confidence"],
+            is_for_mention=reply.get("is_for_mention", False),
+            is_for_trending=reply.get("is_for_trending", False),
+            prompt_tokens=reply.get("prompt_tokens", 0),
+            completion_tokens=reply.get("completion_tokens", 0)
+        )
+    
+    async def generate_tweet_suggestions(self, username: str, count: int = 3, topics: Optional[List[str]] = None) -> List[TweetSuggestion]:
+        """
+        Generate tweet suggestions based on user's writing style and optionally specific topics
+        """
+        style_profile, trending_topics = await self._suggestion_inputs(username, topics)
+        suggestions_data = await self.ai_service.generate_tweet_suggestions(
+            style_profile=style_profile,
             trending_topics=trending_topics,
             count=count
         )
+        return [self._to_suggestion(suggestion) for suggestion in suggestions_data]
+    
+    async def stream_tweet_suggestions(self, username: str, count: int = 3, topics: Optional[List[str]] = None) -> AsyncIterator[Tuple[int, TweetSuggestion]]:
+        """
+        Yield (position, suggestion) pairs as soon as each suggestion is generated
         
-        suggestions = []
-        for suggestion in suggestions_data:
-            suggestions.append(
-                TweetSuggestion(
-                    text=suggestion["text"],
-                    topics=suggestion["topics"],
-                    confidence=suggestion["confidence"]
-                )
-            )
-        
-        return suggestions
+        Closing the generator cancels the suggestions still being generated.
+        """
+        style_profile, trending_topics = await self._suggestion_inputs(username, topics)
+        stream = self.ai_service.stream_tweet_suggestions(style_profile, trending_topics, count)
+        try:
+            async for position, suggestion in stream:
+                yield position, self._to_suggestion(suggestion)
+        finally:
+            await stream.aclose()
     
-    def generate_reply_options(self, tweet_text: str, count: int = 3, is_mention: bool = False, trending_score: float = 0.0) -> List[ReplyOption]:
+    async def generate_reply_options(self, tweet_text: str, count: int = 3, is_mention: bool = False, trending_score: float = 0.0) -> List[ReplyOption]:
         """
         Generate reply options for a given tweet
         
@@ -228,23 +430,62 @@ class TwitterService:
         - is_mention: Whether this tweet is mentioning the user's account
         - trending_score: If not a mention, the trending score of the tweet (0.0-1.0)
         """
-        replies_data = self.ai_service.generate_reply_options(
+        replies_data = await self.ai_service.generate_reply_options(
             tweet_text, 
             count, 
             is_mention, 
             trending_score
         )
+        return [self._to_reply_option(reply) for reply in replies_data]
+    
+    async def stream_reply_options(self, tweet_text: str, count: int = 3, is_mention: bool = False, trending_score: float = 0.0) -> AsyncIterator[Tuple[int, ReplyOption]]:
+        """
+        Yield (position, reply option) pairs as soon as each option is generated
         
-        replies = []
-        for reply in replies_data:
-            replies.append(
-                ReplyOption(
-                    text=reply["text"],
-                    stance=reply["stance"],
-                    confidence=reply["confidence"],
-                    is_for_mention=reply.get("is_for_mention", False),
-                    is_for_trending=reply.get("is_for_trending", False)
-                )
-            )
-        
-        return replies
+        Closing the generator cancels the options still being generated.
+        """
+        stream = self.ai_service.stream_reply_options(tweet_text, count, is_mention, trending_score)
+        try:
+            async for position, reply in stream:
+                yield position, self._to_reply_option(reply)
+        finally:
+            await stream.aclose()
+    
+    def cache_stats(self) -> dict:
+        """
+        Hit/miss counters and sizes of the X response caches, X rate-limit queues and LLM token usage
+        """
+        stats = {
+            cache.name: {**cache.stats.to_dict(), "size": len(cache), "max_size": cache.maxsize}
+            for cache in (self.profile_cache, self.timeline_cache, self.style_cache)
+        }
+        stats["x_scheduler"] = self.x_scheduler.stats()
+        if self.client_pool is not None:
+            stats["x_client_pool"] = self.client_pool.stats()
+        if self.ai_service.llm is not None:
+            stats["llm"] = self.ai_service.llm.stats()
+        return stats
+    
+    def start(self):
+        """
+        Start the background trending refresh
+        """
+        if self.client:
+            self.trending_cache.start()
+    
+    async def warm_up(self):
+        """
+        Open the X API connection pool ahead of the first request
+        """
+        if self.client:
+            await self.client.warm_up()
+    
+    async def close(self):
+        """
+        Release the pooled X API connections
+        """
+        await self.trending_cache.stop()
+        self.analysis_pool.close()
+        self.x_scheduler.close()
+        if self.client:
+            await self.client.close()
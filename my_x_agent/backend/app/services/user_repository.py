@@ -0,0 +1,303 @@
+import asyncio
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from app.models.user import UserInDB
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///my_x_agent.db")
+DATABASE_POOL_MIN_SIZE = int(os.getenv("DATABASE_POOL_MIN_SIZE", "1"))
+DATABASE_POOL_MAX_SIZE = int(os.getenv("DATABASE_POOL_MAX_SIZE", "10"))
+
+USER_COLUMNS = [
+    "id", "email", "username", "hashed_password", "created_at", "updated_at",
+    "subscription_tier", "suggestions_remaining",
+    "x_username", "x_access_token", "x_access_token_secret",
+    "telegram_username", "telegram_access_token",
+    "whatsapp_phone", "whatsapp_access_token",
+    "signal_phone", "signal_access_token",
+    "reachme_username", "reachme_access_token",
+    "wallet_address", "last_payment_txid",
+]
+TIMESTAMP_COLUMNS = {"created_at", "updated_at"}
+INTEGER_COLUMNS = {"suggestions_remaining"}
+
+
+def _create_table_sql(timestamp_type: str) -> str:
+    columns = []
+    for column in USER_COLUMNS:
+        if column == "id":
+            columns.append("id TEXT PRIMARY KEY")
+        elif column == "email":
+            columns.append("email TEXT NOT NULL UNIQUE")
+        elif column in TIMESTAMP_COLUMNS:
+            columns.append(f"{column} {timestamp_type} NOT NULL")
+        elif column in INTEGER_COLUMNS:
+            columns.append(f"{column} INTEGER NOT NULL DEFAULT 0")
+        else:
+            columns.append(f"{column} TEXT")
+    return f"CREATE TABLE IF NOT EXISTS users ({', '.join(columns)})"
+
+
+def _credited_payments_sql(timestamp_type: str) -> str:
+    # A payment id lands here in the same transaction that credits its user, so it is credited once
+    return (
+        "CREATE TABLE IF NOT EXISTS credited_payments ("
+        f"payment_id TEXT PRIMARY KEY, user_email TEXT NOT NULL, credited_at {timestamp_type} NOT NULL)"
+    )
+
+
+def _user_row(user: UserInDB) -> Dict[str, Any]:
+    row = user.model_dump()
+    row["subscription_tier"] = user.subscription_tier.value
+    return {column: row[column] for column in USER_COLUMNS}
+
+
+class DuplicateUserError(ValueError):
+    pass
+
+
+class UserRepository(ABC):
+    """
+    Storage for UserInDB records, shared by every worker process
+    """
+
+    @abstractmethod
+    async def connect(self):
+        """Open connections and create the schema"""
+
+    @abstractmethod
+    async def close(self):
+        """Release connections"""
+
+    @abstractmethod
+    async def get_by_email(self, email: str) -> Optional[UserInDB]:
+        pass
+
+    @abstractmethod
+    async def get_by_id(self, user_id: str) -> Optional[UserInDB]:
+        pass
+
+    @abstractmethod
+    async def create(self, user: UserInDB) -> UserInDB:
+        """Insert a user, raises DuplicateUserError if the email is taken"""
+
+    @abstractmethod
+    async def update(self, email: str, fields: Dict[str, Any]) -> Optional[UserInDB]:
+        """Set columns on a user and return the updated record"""
+
+    @abstractmethod
+    async def increment(self, email: str, column: str, amount: int) -> Optional[UserInDB]:
+        """Atomically add `amount` to an integer column"""
+
+    @abstractmethod
+    async def credit_payment(self, email: str, payment_id: str, quantity: int, tx_hash: str) -> Optional[UserInDB]:
+        """
+        Add a payment's suggestions and record its tx hash in one transaction
+
+        Returns None without changing anything when the payment was already
+        credited, so retrying after a failure never credits it twice.
+        """
+
+
+class PostgresUserRepository(UserRepository):
+    """
+    Users table in Postgres behind an async connection pool
+
+    Lookups go through the primary key and the unique email index, and every
+    statement is sent with prepare=True so the server plans it once per
+    pooled connection.
+    """
+
+    def __init__(self, dsn: str, min_size: int = DATABASE_POOL_MIN_SIZE, max_size: int = DATABASE_POOL_MAX_SIZE):
+        from psycopg.rows import dict_row
+        from psycopg_pool import AsyncConnectionPool
+
+        self.pool = AsyncConnectionPool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            open=False,
+            kwargs={"autocommit": True, "row_factory": dict_row}
+        )
+
+    async def connect(self):
+        await self.pool.open(wait=True)
+        async with self.pool.connection() as conn:
+            await conn.execute(_create_table_sql("TIMESTAMP"))
+            await conn.execute(_credited_payments_sql("TIMESTAMP"))
+
+    async def close(self):
+        await self.pool.close()
+
+    async def _fetch_one(self, query: str, params: tuple) -> Optional[UserInDB]:
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(query, params, prepare=True)
+            row = await cursor.fetchone()
+        return UserInDB(**row) if row else None
+
+    async def get_by_email(self, email: str) -> Optional[UserInDB]:
+        return await self._fetch_one("SELECT * FROM users WHERE email = %s", (email,))
+
+    async def get_by_id(self, user_id: str) -> Optional[UserInDB]:
+        return await self._fetch_one("SELECT * FROM users WHERE id = %s", (user_id,))
+
+    async def create(self, user: UserInDB) -> UserInDB:
+        from psycopg.errors import UniqueViolation
+
+        row = _user_row(user)
+        placeholders = ", ".join(["%s"] * len(USER_COLUMNS))
+        try:
+            async with self.pool.connection() as conn:
+                await conn.execute(
+                    f"INSERT INTO users ({', '.join(USER_COLUMNS)}) VALUES ({placeholders})",
+                    tuple(row.values()),
+                    prepare=True
+                )
+        except UniqueViolation:
+            raise DuplicateUserError("Email already registered")
+        return user
+
+    async def update(self, email: str, fields: Dict[str, Any]) -> Optional[UserInDB]:
+        columns = [column for column in fields if column in USER_COLUMNS]
+        assignments = ", ".join(f"{column} = %s" for column in columns)
+        return await self._fetch_one(
+            f"UPDATE users SET {assignments} WHERE email = %s RETURNING *",
+            tuple(fields[column] for column in columns) + (email,)
+        )
+
+    async def increment(self, email: str, column: str, amount: int) -> Optional[UserInDB]:
+        if column not in INTEGER_COLUMNS:
+            raise ValueError(f"{column} is not a counter column")
+        return await self._fetch_one(
+            f"UPDATE users SET {column} = {column} + %s, updated_at = %s WHERE email = %s RETURNING *",
+            (amount, datetime.now(), email)
+        )
+
+    async def credit_payment(self, email: str, payment_id: str, quantity: int, tx_hash: str) -> Optional[UserInDB]:
+        now = datetime.now()
+        # A single statement is one transaction, the UPDATE only runs if the INSERT claimed the id
+        return await self._fetch_one(
+            "WITH credited AS ("
+            "INSERT INTO credited_payments (payment_id, user_email, credited_at) VALUES (%s, %s, %s) "
+            "ON CONFLICT (payment_id) DO NOTHING RETURNING payment_id) "
+            "UPDATE users SET suggestions_remaining = suggestions_remaining + %s, last_payment_txid = %s, updated_at = %s "
+            "WHERE email = %s AND EXISTS (SELECT 1 FROM credited) RETURNING *",
+            (payment_id, email, now, quantity, tx_hash, now, email)
+        )
+
+
+class SQLiteUserRepository(UserRepository):
+    """
+    SQLite fallback for local development and tests
+
+    One connection serialized by a lock, queries run on a worker thread so
+    they never block the event loop. Use "sqlite://" for an in-memory database.
+    """
+
+    def __init__(self, path: str):
+        self.path = path or ":memory:"
+        self.conn: Optional[sqlite3.Connection] = None
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(_create_table_sql("TEXT"))
+        self.conn.execute(_credited_payments_sql("TEXT"))
+
+    async def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    async def _run(self, query: str, params: tuple) -> Optional[UserInDB]:
+        def execute():
+            row = self.conn.execute(query, params).fetchone()
+            return dict(row) if row else None
+
+        async with self.lock:
+            row = await asyncio.to_thread(execute)
+        return UserInDB(**row) if row else None
+
+    @staticmethod
+    def _param(value: Any) -> Any:
+        return value.isoformat() if isinstance(value, datetime) else value
+
+    async def get_by_email(self, email: str) -> Optional[UserInDB]:
+        return await self._run("SELECT * FROM users WHERE email = ?", (email,))
+
+    async def get_by_id(self, user_id: str) -> Optional[UserInDB]:
+        return await self._run("SELECT * FROM users WHERE id = ?", (user_id,))
+
+    async def create(self, user: UserInDB) -> UserInDB:
+        row = _user_row(user)
+        placeholders = ", ".join(["?"] * len(USER_COLUMNS))
+        try:
+            await self._run(
+                f"INSERT INTO users ({', '.join(USER_COLUMNS)}) VALUES ({placeholders})",
+                tuple(self._param(value) for value in row.values())
+            )
+        except sqlite3.IntegrityError:
+            raise DuplicateUserError("Email already registered")
+        return user
+
+    async def update(self, email: str, fields: Dict[str, Any]) -> Optional[UserInDB]:
+        columns = [column for column in fields if column in USER_COLUMNS]
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        return await self._run(
+            f"UPDATE users SET {assignments} WHERE email = ? RETURNING *",
+            tuple(self._param(fields[column]) for column in columns) + (email,)
+        )
+
+    async def increment(self, email: str, column: str, amount: int) -> Optional[UserInDB]:
+        if column not in INTEGER_COLUMNS:
+            raise ValueError(f"{column} is not a counter column")
+        return await self._run(
+            f"UPDATE users SET {column} = {column} + ?, updated_at = ? WHERE email = ? RETURNING *",
+            (amount, datetime.now().isoformat(), email)
+        )
+
+    async def credit_payment(self, email: str, payment_id: str, quantity: int, tx_hash: str) -> Optional[UserInDB]:
+        now = datetime.now().isoformat()
+
+        def execute():
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                claimed = self.conn.execute(
+                    "INSERT INTO credited_payments (payment_id, user_email, credited_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (payment_id) DO NOTHING",
+                    (payment_id, email, now)
+                ).rowcount
+                row = self.conn.execute(
+                    "UPDATE users SET suggestions_remaining = suggestions_remaining + ?, last_payment_txid = ?, updated_at = ? "
+                    "WHERE email = ? RETURNING *",
+                    (quantity, tx_hash, now, email)
+                ).fetchone() if claimed else None
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            return dict(row) if row else None
+
+        async with self.lock:
+            row = await asyncio.to_thread(execute)
+        return UserInDB(**row) if row else None
+
+
+def create_user_repository(database_url: str = DATABASE_URL) -> UserRepository:
+    """
+    Pick the repository implementation from the DATABASE_URL scheme
+    """
+    if database_url.startswith(("postgres://", "postgresql://")):
+        return PostgresUserRepository(database_url)
+    if database_url.startswith("sqlite://"):
+        return SQLiteUserRepository(database_url[len("sqlite:///"):] if database_url.startswith("sqlite:///") else "")
+    raise ValueError(f"Unsupported DATABASE_URL: {database_url}")
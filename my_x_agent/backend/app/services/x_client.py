@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiohttp
+from dotenv import load_dotenv
+from oauthlib.oauth1 import Client as OAuth1Client
+from yarl import URL
+
+from app.services.x_scheduler import XRequestScheduler
+from app.utils.metrics import upstream
+
+load_dotenv()
+
+X_API_BASE_URL = os.getenv("TWITTER_API_BASE_URL", "https://api.twitter.com")
+X_API_MAX_CONNECTIONS = int(os.getenv("TWITTER_API_MAX_CONNECTIONS", "200"))
+X_API_TIMEOUT_SECONDS = float(os.getenv("TWITTER_API_TIMEOUT_SECONDS", "10"))
+
+
+class XApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"X API returned {status}: {message}")
+        self.status = status
+
+
+class AsyncXClient:
+    """
+    Asyncio-native X API client
+
+    All requests go through one aiohttp session whose connector keeps
+    connections to X alive, so concurrent calls reuse sockets instead of
+    doing a TCP/TLS handshake per request. With a scheduler, every call
+    first takes a slot in its endpoint's rate-limit bucket: app-auth calls
+    share the "app" credential, user-context calls are counted against the
+    access token they are signed with.
+    """
+
+    def __init__(self,
+                 bearer_token: str,
+                 consumer_key: str = "",
+                 consumer_secret: str = "",
+                 access_token: str = "",
+                 access_token_secret: str = "",
+                 base_url: Optional[str] = None,
+                 max_connections: int = X_API_MAX_CONNECTIONS,
+                 timeout: float = X_API_TIMEOUT_SECONDS,
+                 scheduler: Optional[XRequestScheduler] = None):
+        self.bearer_token = bearer_token
+        self.consumer_key = consumer_key
+        self.consumer_secret = consumer_secret
+        self.access_token = access_token
+        self.access_token_secret = access_token_secret
+        self.base_url = (base_url or X_API_BASE_URL).rstrip("/")
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.scheduler = scheduler
+        # Set on per-user clients, see for_user
+        self.user_context = False
+        self._session_owner: Optional["AsyncXClient"] = None
+        # Rate-limit bucket owner of user-context calls, without putting the token in metrics
+        self.user_credential = "user:" + hashlib.sha256(access_token.encode()).hexdigest()[:12]
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Lazily create the shared session, it must be built inside a running loop
+        """
+        if self._session_owner is not None:
+            return self._session_owner._get_session()
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=30,
+                ttl_dns_cache=300
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"User-Agent": "my-x-agent"}
+            )
+        return self.session
+
+    def _sign(self, url: str, params: Dict[str, Any]) -> tuple:
+        """
+        Sign a GET request with OAuth 1.0a user context
+        """
+        oauth_client = OAuth1Client(
+            self.consumer_key, self.consumer_secret,
+            self.access_token, self.access_token_secret
+        )
+        url = str(URL(url).with_query(sorted(params.items())))
+        signed_url, headers, _ = oauth_client.sign(url, "GET")
+        # oauthlib signs with percent-encoded colons, aiohttp would leave them as-is
+        before_query, _, query = signed_url.partition("?")
+        return URL(f"{before_query}?{query.replace(':', '%3A')}", encoded=True), headers
+
+    async def request(self,
+                      route: str,
+                      params: Optional[Dict[str, Any]] = None,
+                      user_auth: bool = False,
+                      endpoint: Optional[str] = None) -> Any:
+        """
+        Send a GET request to X and return the decoded JSON body
+
+        `endpoint` is the route template X rate-limits by, e.g. /2/users/:id/tweets.
+        A 429 goes back through the scheduler once, which waits for the window to reset.
+        """
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        endpoint = endpoint or route
+        user_auth = user_auth or self.user_context
+        credential = self.user_credential if user_auth else "app"
+        session = self._get_session()
+
+        for attempt in range(2 if self.scheduler else 1):
+            if self.scheduler:
+                await self.scheduler.acquire(credential, endpoint)
+            status, headers = 0, None
+            try:
+                url = self.base_url + route
+                if user_auth:
+                    url, request_headers = self._sign(url, params)
+                    query = None
+                else:
+                    request_headers = {"Authorization": f"Bearer {self.bearer_token}"}
+                    query = params
+                with upstream("x_api", endpoint):
+                    async with session.get(url, params=query, headers=request_headers) as response:
+                        status, headers = response.status, response.headers
+                        if status == 429 and attempt == 0 and self.scheduler:
+                            continue
+                        if status >= 400:
+                            raise XApiError(status, await response.text())
+                        return await response.json(content_type=None)
+            finally:
+                if self.scheduler:
+                    self.scheduler.release(credential, endpoint, status, headers)
+
+    def for_user(self, access_token: str, access_token_secret: str) -> "AsyncXClient":
+        """
+        Client that signs every call with a user's access token
+
+        It uses this client's session and scheduler, and closing it is a no-op.
+        """
+        client = AsyncXClient(
+            bearer_token=self.bearer_token,
+            consumer_key=self.consumer_key,
+            consumer_secret=self.consumer_secret,
+            access_token=access_token,
+            access_token_secret=access_token_secret,
+            base_url=self.base_url,
+            max_connections=self.max_connections,
+            timeout=self.timeout,
+            scheduler=self.scheduler
+        )
+        client.user_context = True
+        client._session_owner = self
+        return client
+
+    async def get_user(self, username: str, user_fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        GET /2/users/by/username/:username
+        """
+        params = {"user.fields": ",".join(user_fields)} if user_fields else None
+        return await self.request(f"/2/users/by/username/{username}", params, endpoint="/2/users/by/username/:username")
+
+    async def get_users_tweets(self,
+                               user_id: str,
+                               max_results: int = 10,
+                               tweet_fields: Optional[List[str]] = None,
+                               pagination_token: Optional[str] = None,
+                               since_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        GET /2/users/:id/tweets, `since_id` limits the page to tweets newer than that id
+        """
+        params = {
+            # X only accepts 5-100 results per page
+            "max_results": min(max(max_results, 5), 100),
+            "tweet.fields": ",".join(tweet_fields) if tweet_fields else None,
+            "pagination_token": pagination_token,
+            "since_id": since_id
+        }
+        return await self.request(f"/2/users/{user_id}/tweets", params, endpoint="/2/users/:id/tweets")
+
+    async def iter_users_tweets(self,
+                                user_id: str,
+                                limit: int,
+                                tweet_fields: Optional[List[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield up to `limit` tweet objects from a user's timeline, newest first, following pagination tokens
+
+        The next page is requested while the current one is being consumed,
+        and at most those two pages are held at a time. X serves at most the
+        3200 most recent tweets of a timeline.
+        """
+        remaining = limit
+        next_page = asyncio.ensure_future(self.get_users_tweets(user_id, max_results=remaining, tweet_fields=tweet_fields))
+        try:
+            while next_page is not None:
+                page = await next_page
+                next_page = None
+                tweets = page.get("data", [])[:remaining]
+                remaining -= len(tweets)
+                token = page.get("meta", {}).get("next_token")
+                if token and remaining > 0:
+                    next_page = asyncio.ensure_future(self.get_users_tweets(
+                        user_id, max_results=remaining, tweet_fields=tweet_fields, pagination_token=token
+                    ))
+                for tweet in tweets:
+                    yield tweet
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    async def get_place_trends(self, woeid: str) -> List[Dict[str, Any]]:
+        """
+        GET /1.1/trends/place.json, requires user context auth
+        """
+        return await self.request("/1.1/trends/place.json", {"id": woeid}, user_auth=True)
+
+    async def warm_up(self):
+        """
+        Establish a pooled connection to X so the first real call skips the handshake
+        """
+        session = self._get_session()
+        try:
+            async with session.head(self.base_url) as response:
+                await response.read()
+        except Exception as e:
+            print(f"Error warming up X API connection: {e}")
+
+    async def close(self):
+        """
+        Close the shared session and its pooled connections
+        """
+        if self._session_owner is not None:
+            return
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
@@ -0,0 +1,59 @@
+import os
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from app.models.user import UserInDB
+from app.utils.cache import TTLCache
+
+if TYPE_CHECKING:
+    from app.services.x_client import AsyncXClient
+
+load_dotenv()
+
+X_CLIENT_POOL_SIZE = int(os.getenv("X_CLIENT_POOL_SIZE", "10000"))
+X_CLIENT_IDLE_SECONDS = float(os.getenv("X_CLIENT_IDLE_SECONDS", "900"))
+
+# Cached for users without a connected X account, so they are not looked up on every request
+NO_ACCOUNT = False
+
+
+class XClientPool:
+    """
+    Per-user X clients built from the tokens saved by connect_x_account
+
+    Each client signs its calls with the user's own access token, so they are
+    counted against that user's rate limits instead of the app's. Clients
+    share the app client's connection pool and scheduler and hold no sockets
+    of their own, so dropping one (least recently used past `maxsize`, or
+    idle longer than `idle_ttl`) costs nothing. Its idle rate-limit buckets
+    go with it, the rest are pruned by the scheduler once refilled.
+    """
+
+    def __init__(self, app_client: "AsyncXClient", maxsize: int = X_CLIENT_POOL_SIZE, idle_ttl: float = X_CLIENT_IDLE_SECONDS):
+        self.app_client = app_client
+        self.clients = TTLCache("x_user_client", maxsize=maxsize, ttl=idle_ttl, on_evict=self._evicted)
+
+    def _evicted(self, user_id: str, client: Any):
+        if client is not NO_ACCOUNT and self.app_client.scheduler is not None:
+            self.app_client.scheduler.prune(client.user_credential)
+
+    async def get(self, user_id: str, load_user: Callable[[str], Awaitable[Optional[UserInDB]]]) -> Optional["AsyncXClient"]:
+        """
+        Return the user's client, or None if they have not connected an X account
+        """
+        client = self.clients.get(user_id)
+        if client is None:
+            user = await load_user(user_id)
+            client = NO_ACCOUNT
+            if user is not None and user.x_access_token and user.x_access_token_secret:
+                client = self.app_client.for_user(user.x_access_token, user.x_access_token_secret)
+        # Setting again restarts the idle timer
+        self.clients.set(user_id, client)
+        return client if client is not NO_ACCOUNT else None
+
+    def invalidate(self, user_id: str):
+        self.clients.invalidate(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.clients.stats.to_dict(), "size": len(self.clients), "max_size": self.clients.maxsize}
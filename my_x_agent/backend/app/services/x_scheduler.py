@@ -0,0 +1,333 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.utils.cache import in_background_refresh
+from app.utils.metrics import X_RATE_LIMIT_WAIT
+
+load_dotenv()
+
+# Requests made for a user who is waiting go first, refreshes and prefetches after
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# How long a request may queue for its rate-limit window before giving up
+X_RATE_LIMIT_INTERACTIVE_MAX_WAIT = float(os.getenv("X_RATE_LIMIT_INTERACTIVE_MAX_WAIT_SECONDS", "10"))
+X_RATE_LIMIT_BACKGROUND_MAX_WAIT = float(os.getenv("X_RATE_LIMIT_BACKGROUND_MAX_WAIT_SECONDS", "900"))
+# Used when a 429 comes back without an x-rate-limit-reset header
+X_RATE_LIMIT_DEFAULT_BACKOFF = float(os.getenv("X_RATE_LIMIT_DEFAULT_BACKOFF_SECONDS", "60"))
+# How often idle, fully refilled buckets are dropped
+X_RATE_LIMIT_PRUNE_INTERVAL = float(os.getenv("X_RATE_LIMIT_PRUNE_INTERVAL_SECONDS", "60"))
+
+# Counters summed over the per-user buckets of an endpoint in stats()
+USER_TOTALS = ("buckets", "inflight", "queue_depth", "requests", "queued", "rejected", "throttled")
+
+# Reset time of a window X has not reported on yet
+UNKNOWN_RESET = float("inf")
+
+_priority: ContextVar[int] = ContextVar("x_request_priority", default=INTERACTIVE)
+
+
+def current_priority() -> int:
+    """
+    Priority of X calls made from the current task
+
+    Background cache refreshes are BACKGROUND without having to say so.
+    """
+    return BACKGROUND if in_background_refresh.get() else _priority.get()
+
+
+@contextmanager
+def request_priority(priority: int):
+    """
+    Run the X calls made inside the block at `priority`
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class XRateLimitError(Exception):
+    def __init__(self, endpoint: str, wait: float):
+        super().__init__(f"X rate limit for {endpoint} resets in {wait:.0f}s")
+        self.endpoint = endpoint
+        self.wait = wait
+
+
+class RateLimitBucket:
+    """
+    Token bucket for one (credential, endpoint) pair, sized from X's rate-limit headers
+
+    Until X has answered once the bucket is unbounded. After that `remaining`
+    is what X reported minus the requests still in flight. When the window
+    resets the bucket refills to `limit`, and the next window's reset time
+    is unknown until X answers again.
+    """
+
+    __slots__ = ("limit", "remaining", "reset_at", "inflight", "queue", "wakeup",
+                 "requests", "queued", "rejected", "throttled", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.inflight = 0
+        self.queue: List[Tuple[int, int, asyncio.Future]] = []
+        self.wakeup: Optional[asyncio.TimerHandle] = None
+        self.requests = 0
+        self.queued = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _refill(self, now: float):
+        if self.remaining is not None and now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = UNKNOWN_RESET
+
+    def has_token(self, now: float) -> bool:
+        self._refill(now)
+        return self.remaining is None or self.remaining > 0
+
+    def take(self):
+        self.inflight += 1
+        self.requests += 1
+        if self.remaining is not None:
+            self.remaining -= 1
+
+    def depth(self) -> int:
+        return sum(1 for _, _, waiter in self.queue if not waiter.done())
+
+    def idle(self, now: float) -> bool:
+        """
+        Nothing queued or in flight and the whole window available, a new bucket would behave the same
+        """
+        if self.queue or self.inflight or self.wakeup is not None:
+            return False
+        return self.has_token(now) and self.remaining == self.limit
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "resets_in": max(0.0, self.reset_at - time.time()) if self.reset_at != UNKNOWN_RESET else None,
+            "inflight": self.inflight,
+            "queue_depth": self.depth(),
+            "requests": self.requests,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "wait_avg_ms": self.wait_total / self.queued * 1000 if self.queued else 0.0,
+            "wait_max_ms": self.wait_max * 1000,
+        }
+
+
+class XRequestScheduler:
+    """
+    Admits X API calls per (credential, endpoint) rate-limit bucket
+
+    A call that finds its bucket empty queues until the window resets
+    instead of failing, interactive calls ahead of background ones. Calls
+    that would wait longer than their priority's max wait fail right away
+    with XRateLimitError, which callers already treat like any other X error.
+
+    Buckets are created on first use, one per credential and endpoint, and
+    dropped again once idle with their window refilled, checked at most
+    every `prune_interval` seconds, so users who stopped calling X do not
+    keep theirs.
+    """
+
+    def __init__(self,
+                 interactive_max_wait: float = X_RATE_LIMIT_INTERACTIVE_MAX_WAIT,
+                 background_max_wait: float = X_RATE_LIMIT_BACKGROUND_MAX_WAIT,
+                 default_backoff: float = X_RATE_LIMIT_DEFAULT_BACKOFF,
+                 prune_interval: float = X_RATE_LIMIT_PRUNE_INTERVAL):
+        self.max_wait = {INTERACTIVE: interactive_max_wait, BACKGROUND: background_max_wait}
+        self.default_backoff = default_backoff
+        self.prune_interval = prune_interval
+        self.buckets: Dict[Tuple[str, str], RateLimitBucket] = {}
+        self.pruned = 0
+        self._pruned_at = time.monotonic()
+        self._order = itertools.count()
+
+    def _bucket(self, credential: str, endpoint: str) -> RateLimitBucket:
+        bucket = self.buckets.get((credential, endpoint))
+        if bucket is None:
+            bucket = self.buckets[(credential, endpoint)] = RateLimitBucket()
+        return bucket
+
+    async def acquire(self, credential: str, endpoint: str, priority: Optional[int] = None):
+        """
+        Wait for a request slot in the bucket, raise XRateLimitError if the wait would be too long
+        """
+        priority = current_priority() if priority is None else priority
+        if time.monotonic() - self._pruned_at >= self.prune_interval:
+            self.prune()
+        bucket = self._bucket(credential, endpoint)
+        now = time.time()
+        if not bucket.depth() and bucket.has_token(now):
+            bucket.take()
+            return
+
+        # With the reset unknown, responses in flight will report it
+        wait = max(0.0, bucket.reset_at - now) if bucket.reset_at != UNKNOWN_RESET else 0.0
+        max_wait = self.max_wait[priority]
+        if wait > max_wait:
+            bucket.rejected += 1
+            raise XRateLimitError(endpoint, wait)
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(bucket.queue, (priority, next(self._order), waiter))
+        bucket.queued += 1
+        self._schedule_wakeup(bucket)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, max_wait)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the caller gave up, hand the slot on
+                self._refund(bucket)
+            if isinstance(e, asyncio.TimeoutError):
+                bucket.rejected += 1
+                raise XRateLimitError(endpoint, max(0.0, bucket.reset_at - time.time())) from None
+            raise
+        finally:
+            waited = time.monotonic() - started
+            bucket.wait_total += waited
+            bucket.wait_max = max(bucket.wait_max, waited)
+            X_RATE_LIMIT_WAIT.labels(endpoint, PRIORITY_NAMES[priority]).observe(waited)
+
+    def _refund(self, bucket: RateLimitBucket):
+        bucket.inflight = max(0, bucket.inflight - 1)
+        if bucket.remaining is not None:
+            bucket.remaining += 1
+        self._drain(bucket)
+
+    def release(self, credential: str, endpoint: str, status: int = 0, headers: Optional[Mapping[str, str]] = None):
+        """
+        Return a slot after the response (or failure) and update the bucket from X's headers
+        """
+        bucket = self._bucket(credential, endpoint)
+        bucket.inflight = max(0, bucket.inflight - 1)
+        headers = headers or {}
+        limit = headers.get("x-rate-limit-limit")
+        remaining = headers.get("x-rate-limit-remaining")
+        reset = headers.get("x-rate-limit-reset")
+        if limit is not None and remaining is not None and reset is not None:
+            bucket.limit = int(limit)
+            bucket.reset_at = float(reset)
+            # X has not counted the requests that are still in flight
+            bucket.remaining = max(0, int(remaining) - bucket.inflight)
+        if status == 429:
+            bucket.throttled += 1
+            bucket.remaining = 0
+            if reset is None:
+                bucket.reset_at = time.time() + self.default_backoff
+            if bucket.limit is None:
+                bucket.limit = 1
+        elif bucket.remaining == 0 and bucket.reset_at == UNKNOWN_RESET and not bucket.inflight:
+            # Window used up and nothing left in flight to report when it resets
+            bucket.reset_at = time.time() + self.default_backoff
+        self._drain(bucket)
+
+    def _drain(self, bucket: RateLimitBucket):
+        now = time.time()
+        while bucket.queue and bucket.has_token(now):
+            _, _, waiter = heapq.heappop(bucket.queue)
+            if waiter.done():
+                continue
+            bucket.take()
+            waiter.set_result(None)
+        while bucket.queue and bucket.queue[0][2].done():
+            heapq.heappop(bucket.queue)
+        if bucket.queue:
+            self._schedule_wakeup(bucket)
+
+    def _schedule_wakeup(self, bucket: RateLimitBucket):
+        if bucket.wakeup is not None:
+            bucket.wakeup.cancel()
+            bucket.wakeup = None
+        if bucket.has_token(time.time()):
+            delay = 0.0
+        elif bucket.reset_at == UNKNOWN_RESET:
+            # The next response's headers drain the queue
+            return
+        else:
+            # Small margin so the window has really reset on X's side
+            delay = max(0.0, bucket.reset_at - time.time()) + 0.5
+        bucket.wakeup = asyncio.get_running_loop().call_later(delay, self._wake, bucket)
+
+    def _wake(self, bucket: RateLimitBucket):
+        bucket.wakeup = None
+        self._drain(bucket)
+
+    def prune(self, credential: Optional[str] = None) -> int:
+        """
+        Drop the idle, fully refilled buckets, only `credential`'s if given, returns how many
+        """
+        now = time.time()
+        idle = [
+            key for key, bucket in self.buckets.items()
+            if (credential is None or key[0] == credential) and bucket.idle(now)
+        ]
+        for key in idle:
+            del self.buckets[key]
+        self.pruned += len(idle)
+        if credential is None:
+            self._pruned_at = time.monotonic()
+        return len(idle)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Queue depth, wait times and budget of the app's buckets per endpoint
+
+        Per-user buckets are keyed by a digest of the user's access token,
+        so they are only reported as totals per endpoint.
+        """
+        buckets: Dict[str, Dict[str, Any]] = {}
+        users: Dict[str, Dict[str, Any]] = {}
+        for (credential, endpoint), bucket in self.buckets.items():
+            if credential == "app":
+                buckets[endpoint] = bucket.stats()
+                continue
+            totals = users.setdefault(endpoint, dict.fromkeys(USER_TOTALS, 0))
+            totals["buckets"] += 1
+            totals["inflight"] += bucket.inflight
+            totals["queue_depth"] += bucket.depth()
+            for name in ("requests", "queued", "rejected", "throttled"):
+                totals[name] += getattr(bucket, name)
+        return {
+            "queue_depth": sum(bucket.depth() for bucket in self.buckets.values()),
+            "pruned": self.pruned,
+            "buckets": buckets,
+            "user_buckets": users,
+        }
+
+    def queue_depths(self) -> Dict[str, int]:
+        """
+        Calls waiting per endpoint, summed over credentials so the series stay bounded
+        """
+        depths: Dict[str, int] = {}
+        for (_, endpoint), bucket in self.buckets.items():
+            depths[endpoint] = depths.get(endpoint, 0) + bucket.depth()
+        return depths
+
+    def close(self):
+        for bucket in self.buckets.values():
+            if bucket.wakeup is not None:
+                bucket.wakeup.cancel()
+            for _, _, waiter in bucket.queue:
+                if not waiter.done():
+                    waiter.cancel()
+            bucket.queue.clear()
@@ -1,30 +1,106 @@
+import asyncio
 import os
-from typing import List, Optional
+import re
+from collections import Counter
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Dict, Iterable, List, Optional, Tuple
 from dotenv import load_dotenv
 
+from app.models.tweet import StyleProfile
+from app.utils.llm import LLMClient
+from app.utils.text_analyzer import TextAnalyzer
+
 load_dotenv()
 
+DEFAULT_LEXICONS = {
+    "positive": ["good", "great", "excellent", "amazing", "love", "happy", "excited"],
+    "negative": ["bad", "terrible", "awful", "hate", "sad", "angry", "disappointed"],
+    "tech": ["ai", "tech", "technology", "code", "programming", "software", "data"],
+    "crypto": ["crypto", "bitcoin", "ethereum", "blockchain", "web3", "nft"],
+    "sensitive": [
+        "controversial", "scandal", "fired", "lawsuit", "politics",
+        "religion", "offensive", "attack", "hate", "angry"
+    ],
+    "emoji": ['😀', '👍', '🔥', '❤️', '😂', '🚀', '💯'],
+}
+
+# A hashtag needs at least one letter, "#1" or "#2024" is not one
+HASHTAG_PATTERN = re.compile(r"(?<!\w)#(\w*[^\W\d_]\w*)")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has", "have", "i",
+    "in", "is", "it", "its", "just", "me", "my", "of", "on", "or", "so", "that", "the", "this",
+    "to", "was", "we", "what", "will", "with", "you", "your", "rt",
+}
+# Running word totals kept per style profile, the long tail is dropped on each merge
+STYLE_VOCABULARY_LIMIT = 500
+
 class AIService:
     """
     Service for AI-powered text generation and analysis
-    In a production environment, this would integrate with DeepSeek or GPT-4o
+    
+    Analysis is lexicon based. Generation fills templates, and when an
+    LLMClient is configured (DeepSeek, GPT-4o or any OpenAI-compatible API)
+    each template is rewritten by the model, falling back to the template if
+    the model call fails.
     """
     
-    def __init__(self):
+    def __init__(self, lexicons: Optional[Dict[str, List[str]]] = None, llm: Optional[LLMClient] = None):
         self.api_key = os.getenv("AI_API_KEY", "")
         self.model = os.getenv("AI_MODEL", "gpt-4o")
+        self.analyzer = TextAnalyzer({**DEFAULT_LEXICONS, **(lexicons or {})})
+        self.llm = llm
+    
+    async def close(self):
+        if self.llm is not None:
+            await self.llm.close()
+    
+    async def _rewrite(self, option: dict, prompt: str) -> dict:
+        """
+        Replace a template's text with the model's answer to `prompt`
+        """
+        if self.llm is None:
+            return option
+        try:
+            completion = await self.llm.complete(prompt, max_tokens=80, temperature=0.8)
+        except Exception as e:
+            print(f"Error generating text with {self.llm.model}, using template: {e}")
+            return option
+        text = completion.text.strip().strip('"')
+        if not text:
+            return option
+        return {**option, "text": text, "prompt_tokens": completion.prompt_tokens, "completion_tokens": completion.completion_tokens}
+    
+    def analyze(self, tweet_text: str) -> dict:
+        """
+        Run sentiment, topic, engagement and risk analysis in a single pass
+        
+        The text is tokenized once and all lexicons are matched in one scan,
+        the individual analyzers below share the same helpers.
+        """
+        words = tweet_text.split()
+        matches = self.analyzer.match(tweet_text)
+        engagement_score, engagement_reason = self._estimate_engagement(tweet_text, words, matches)
+        risk_level, risk_reason = self._assess_risk(tweet_text, words, matches)
+        return {
+            "sentiment": self._sentiment(matches),
+            "topics": self._topics(words, matches),
+            "engagement_estimate": engagement_score,
+            "engagement_reason": engagement_reason,
+            "risk_level": risk_level,
+            "risk_reason": risk_reason
+        }
     
     def analyze_tweet_sentiment(self, tweet_text: str) -> str:
         """
         Analyze the sentiment of a tweet
         Returns: "positive", "negative", or "neutral"
         """
-        positive_words = ["good", "great", "excellent", "amazing", "love", "happy", "excited"]
-        negative_words = ["bad", "terrible", "awful", "hate", "sad", "angry", "disappointed"]
-        
-        tweet_lower = tweet_text.lower()
-        positive_count = sum(1 for word in positive_words if word in tweet_lower)
-        negative_count = sum(1 for word in negative_words if word in tweet_lower)
+        return self._sentiment(self.analyzer.match(tweet_text))
+    
+    def _sentiment(self, matches: Dict[str, List[str]]) -> str:
+        positive_count = len(matches["positive"])
+        negative_count = len(matches["negative"])
         
         if positive_count > negative_count:
             return "positive"
@@ -37,18 +113,17 @@ class AIService:
         """
         Extract topics from a tweet
         """
-        hashtags = [word.strip('#') for word in tweet_text.split() if word.startswith('#')]
+        return self._topics(tweet_text.split(), self.analyzer.match(tweet_text))
+    
+    def _topics(self, words: List[str], matches: Dict[str, List[str]]) -> List[str]:
+        hashtags = [word.strip('#') for word in words if word.startswith('#')]
         
         if not hashtags:
-            tech_keywords = ["ai", "tech", "technology", "code", "programming", "software", "data"]
-            crypto_keywords = ["crypto", "bitcoin", "ethereum", "blockchain", "web3", "nft"]
-            
-            tweet_lower = tweet_text.lower()
             topics = []
             
-            if any(keyword in tweet_lower for keyword in tech_keywords):
+            if matches["tech"]:
                 topics.append("Technology")
-            if any(keyword in tweet_lower for keyword in crypto_keywords):
+            if matches["crypto"]:
                 topics.append("Crypto")
             
             if not topics:
@@ -63,7 +138,9 @@ class AIService:
         Estimate the engagement potential of a tweet
         Returns: (engagement_score, reason)
         """
-        
+        return self._estimate_engagement(tweet_text, tweet_text.split(), self.analyzer.match(tweet_text))
+    
+    def _estimate_engagement(self, tweet_text: str, words: List[str], matches: Dict[str, List[str]]) -> tuple:
         score = 0.5  # Default score
         reasons = []
         
@@ -71,7 +148,7 @@ class AIService:
             score += 0.1
             reasons.append("Optimal length")
         
-        hashtags = [word for word in tweet_text.split() if word.startswith('#')]
+        hashtags = [word for word in words if word.startswith('#')]
         if 1 <= len(hashtags) <= 3:
             score += 0.1
             reasons.append("Good hashtag usage")
@@ -87,8 +164,7 @@ class AIService:
             score += 0.05
             reasons.append("Contains a link")
         
-        emojis = ['😀', '👍', '🔥', '❤️', '😂', '🚀', '💯']
-        if any(emoji in tweet_text for emoji in emojis):
+        if matches["emoji"]:
             score += 0.05
             reasons.append("Contains emojis")
         
@@ -103,17 +179,13 @@ class AIService:
         Assess the risk level of a tweet
         Returns: (risk_level, reason)
         """
-        
+        return self._assess_risk(tweet_text, tweet_text.split(), self.analyzer.match(tweet_text))
+    
+    def _assess_risk(self, tweet_text: str, words: List[str], matches: Dict[str, List[str]]) -> tuple:
         risk_level = "low"
         reasons = []
         
-        sensitive_words = [
-            "controversial", "scandal", "fired", "lawsuit", "politics", 
-            "religion", "offensive", "attack", "hate", "angry"
-        ]
-        
-        tweet_lower = tweet_text.lower()
-        found_sensitive = [word for word in sensitive_words if word in tweet_lower]
+        found_sensitive = matches["sensitive"]
         
         if found_sensitive:
             if len(found_sensitive) > 2:
@@ -123,7 +195,6 @@ class AIService:
                 risk_level = "medium"
                 reasons.append(f"Contains sensitive topics: {', '.join(found_sensitive)}")
         
-        words = tweet_text.split()
         caps_words = [word for word in words if word.isupper() and len(word) > 2]
         if len(caps_words) > 2:
             risk_level = max(risk_level, "medium")
@@ -137,27 +208,134 @@ class AIService:
         
         return (risk_level, reason)
     
-    def generate_tweet_suggestions(self, 
-                                  user_tweets: List[str], 
-                                  trending_topics: Optional[List[str]] = None, 
-                                  count: int = 3) -> List[dict]:
+    def update_style_profile(self,
+                             profile: Optional[StyleProfile],
+                             username: str,
+                             tweet_texts: List[str],
+                             latest_tweet_id: Optional[str] = None) -> StyleProfile:
+        """
+        Fold tweets into a user's style profile, starting a new one if `profile` is None
+        
+        Only the running totals are updated, so a refresh costs as much as the
+        tweets posted since the last one.
+        """
+        profile = profile.model_copy(deep=True) if profile else StyleProfile(username=username)
+        hashtag_counts = Counter(profile.hashtag_counts)
+        topic_counts = Counter(profile.topic_counts)
+        word_counts = Counter(profile.word_counts)
+        
+        for text in tweet_texts:
+            words = text.split()
+            matches = self.analyzer.match(text)
+            profile.total_length += len(text)
+            hashtag_counts.update(HASHTAG_PATTERN.findall(text))
+            if matches["tech"]:
+                topic_counts["Technology"] += 1
+            if matches["crypto"]:
+                topic_counts["Crypto"] += 1
+            word_counts.update(
+                word for word in (w.strip('.,!?:;"()').lower() for w in words)
+                if word.isalpha() and len(word) > 2 and word not in STOPWORDS
+            )
+        
+        profile.tweet_count += len(tweet_texts)
+        if latest_tweet_id is not None:
+            profile.latest_tweet_id = latest_tweet_id
+        profile.updated_at = datetime.now()
+        profile.hashtag_counts = dict(hashtag_counts)
+        profile.topic_counts = dict(topic_counts)
+        profile.word_counts = dict(word_counts.most_common(STYLE_VOCABULARY_LIMIT))
+        
+        if profile.tweet_count:
+            profile.average_length = round(profile.total_length / profile.tweet_count)
+            profile.hashtags_per_tweet = round(sum(hashtag_counts.values()) / profile.tweet_count, 2)
+        profile.top_hashtags = [tag for tag, _ in hashtag_counts.most_common(5)]
+        # Hashtag topics first, they are the user's own words for them
+        profile.top_topics = list(dict.fromkeys(
+            profile.top_hashtags[:3] + [topic for topic, _ in topic_counts.most_common(3)]
+        ))
+        profile.vocabulary = [word for word, _ in word_counts.most_common(20)]
+        return profile
+    
+    @staticmethod
+    async def _as_ready(jobs: Iterable[Awaitable[dict]]) -> AsyncIterator[Tuple[int, dict]]:
+        """
+        Yield (position, result) as each job finishes, cancelling the rest if the consumer stops early
+        """
+        tasks = [asyncio.ensure_future(job) for job in jobs]
+        positions = {task: index for index, task in enumerate(tasks)}
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=positions.get):
+                    yield positions[task], task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def generate_tweet_suggestions(self, 
+                                        style_profile: Optional[StyleProfile] = None, 
+                                        trending_topics: Optional[List[str]] = None, 
+                                        count: int = 3) -> List[dict]:
+        """
+        Generate tweet suggestions based on the user's style profile and trending topics
+        """
+        options = self._suggestion_templates(style_profile, trending_topics, count)
+        return list(await asyncio.gather(*(
+            self._rewrite(option, self._suggestion_prompt(option, style_profile)) for option in options
+        )))
+    
+    def stream_tweet_suggestions(self,
+                                 style_profile: Optional[StyleProfile] = None,
+                                 trending_topics: Optional[List[str]] = None,
+                                 count: int = 3) -> AsyncIterator[Tuple[int, dict]]:
         """
-        Generate tweet suggestions based on user's previous tweets and trending topics
+        Like generate_tweet_suggestions, but yield (position, suggestion) as each one is ready
         """
+        options = self._suggestion_templates(style_profile, trending_topics, count)
+        return self._as_ready(self._rewrite(option, self._suggestion_prompt(option, style_profile)) for option in options)
+    
+    def _suggestion_prompt(self, option: dict, style_profile: Optional[StyleProfile]) -> str:
+        prompt = f"Write one tweet about {option['topics'][0]}. Reply with the tweet text only."
+        if style_profile and style_profile.tweet_count:
+            prompt += (
+                f" Match the author's style: about {style_profile.average_length} characters,"
+                f" {style_profile.hashtags_per_tweet:g} hashtags per tweet"
+                f" (favourites: {', '.join('#' + tag for tag in style_profile.top_hashtags) or 'none'}),"
+                f" typical words: {', '.join(style_profile.vocabulary[:10])}."
+            )
+        return prompt + f" Draft to improve on: {option['text']}"
+    
+    def _suggestion_templates(self,
+                              style_profile: Optional[StyleProfile],
+                              trending_topics: Optional[List[str]],
+                              count: int) -> List[dict]:
         
         suggestions = []
-        topics = trending_topics or ["AI", "Technology", "Innovation"]
+        topics = trending_topics or (style_profile.top_topics if style_profile else None) or ["AI", "Technology", "Innovation"]
+        
+        # Follow the user's hashtag habit: their own tags, as many as they usually use
+        own_tags = []
+        if style_profile and style_profile.top_hashtags:
+            own_tags = style_profile.top_hashtags[:max(1, round(style_profile.hashtags_per_tweet))]
         
         for i in range(count):
             topic = topics[i % len(topics)]
             confidence = 0.9 - (i * 0.1)
             
             if i == 0:
-                text = f"Just explored the latest advancements in {topic}. The potential for innovation is more exciting than ever! #{topic} #Tech"
+                text = f"Just explored the latest advancements in {topic}. The potential for innovation is more exciting than ever!"
+                default_tag = "Tech"
             elif i == 1:
-                text = f"Interesting developments in {topic} today. What are your thoughts on how this will shape the future? #{topic} #Future"
+                text = f"Interesting developments in {topic} today. What are your thoughts on how this will shape the future?"
+                default_tag = "Future"
             else:
-                text = f"Working on a new project related to {topic}. Can't wait to share more details soon! #{topic} #Innovation"
+                text = f"Working on a new project related to {topic}. Can't wait to share more details soon!"
+                default_tag = "Innovation"
+            
+            tags = [topic] + [tag for tag in own_tags if tag.lower() != topic.lower()] if own_tags else [topic, default_tag]
+            text = f"{text} {' '.join('#' + tag.replace(' ', '') for tag in tags)}"
             
             suggestions.append({
                 "text": text,
@@ -167,7 +345,7 @@ class AIService:
         
         return suggestions
     
-    def generate_reply_options(self, tweet_text: str, count: int = 3, is_mention: bool = False, trending_score: float = 0.0) -> List[dict]:
+    async def generate_reply_options(self, tweet_text: str, count: int = 3, is_mention: bool = False, trending_score: float = 0.0) -> List[dict]:
         """
         Generate reply options for a given tweet
         
@@ -177,9 +355,29 @@ class AIService:
         - is_mention: Whether this tweet is mentioning the user's account
         - trending_score: If not a mention, the trending score of the tweet (0.0-1.0)
         """
+        options = self._reply_templates(tweet_text, count, is_mention, trending_score)
+        return list(await asyncio.gather(*(
+            self._rewrite(option, self._reply_prompt(tweet_text, option)) for option in options
+        )))
+    
+    def stream_reply_options(self, tweet_text: str, count: int = 3, is_mention: bool = False, trending_score: float = 0.0) -> AsyncIterator[Tuple[int, dict]]:
+        """
+        Like generate_reply_options, but yield (position, option) as each one is ready
+        """
+        options = self._reply_templates(tweet_text, count, is_mention, trending_score)
+        return self._as_ready(self._rewrite(option, self._reply_prompt(tweet_text, option)) for option in options)
+    
+    def _reply_prompt(self, tweet_text: str, option: dict) -> str:
+        return (
+            f"Write a short {option['stance']} reply to this tweet: {tweet_text!r}. "
+            f"Reply with the reply text only, in the language of this draft: {option['text']}"
+        )
+    
+    def _reply_templates(self, tweet_text: str, count: int, is_mention: bool, trending_score: float) -> List[dict]:
         
-        sentiment = self.analyze_tweet_sentiment(tweet_text)
-        topics = self.extract_topics(tweet_text)
+        matches = self.analyzer.match(tweet_text)
+        sentiment = self._sentiment(matches)
+        topics = self._topics(tweet_text.split(), matches)
         
         supportive_replies = [
             f"Great point about {topics[0] if topics else 'this'}! I completely agree.",
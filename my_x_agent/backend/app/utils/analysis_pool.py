@@ -0,0 +1,95 @@
+import asyncio
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from app.utils.ai_service import AIService
+
+load_dotenv()
+
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", str(os.cpu_count() or 1)))
+ANALYSIS_CHUNK_SIZE = int(os.getenv("ANALYSIS_CHUNK_SIZE", "256"))
+# Analysis costs about 0.1us per character, so this keeps an inline batch to a few ms on the event loop
+ANALYSIS_INLINE_MAX_CHARS = int(os.getenv("ANALYSIS_INLINE_MAX_CHARS", "50000"))
+
+_worker_ai_service: Optional[AIService] = None
+
+
+def _init_worker(lexicons: Dict[str, List[str]]):
+    global _worker_ai_service
+    _worker_ai_service = AIService(lexicons=lexicons)
+
+
+def _analyze_chunk(texts: List[str]) -> List[dict]:
+    return [_worker_ai_service.analyze(text) for text in texts]
+
+
+class AnalysisPool:
+    """
+    Spreads bulk tweet analysis over a process pool
+
+    Batches of up to `inline_max_chars` characters in total are analyzed
+    inline, as their cost grows with the text and not the number of tweets.
+    Larger batches are cut into chunks that run on all cores while results
+    are yielded in input order as soon as the next chunk is done, with a
+    bounded number of chunks in flight.
+    """
+
+    def __init__(self,
+                 ai_service: AIService,
+                 max_workers: int = ANALYSIS_WORKERS,
+                 chunk_size: int = ANALYSIS_CHUNK_SIZE,
+                 inline_max_chars: int = ANALYSIS_INLINE_MAX_CHARS):
+        self.ai_service = ai_service
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.inline_max_chars = inline_max_chars
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                # spawn keeps the event loop and its threads out of the workers
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.ai_service.analyzer.lexicons,)
+            )
+        return self.executor
+
+    async def analyze_stream(self, texts: List[str]) -> AsyncIterator[dict]:
+        """
+        Yield one analysis dict per text, in order
+        """
+        if sum(len(text) for text in texts) <= self.inline_max_chars:
+            for text in texts:
+                yield self.ai_service.analyze(text)
+            return
+
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        chunks = (texts[start:start + self.chunk_size] for start in range(0, len(texts), self.chunk_size))
+        in_flight: deque = deque()
+        try:
+            for chunk in chunks:
+                in_flight.append(loop.run_in_executor(executor, _analyze_chunk, chunk))
+                if len(in_flight) < self.max_workers * 2:
+                    continue
+                for result in await in_flight.popleft():
+                    yield result
+            while in_flight:
+                for result in await in_flight.popleft():
+                    yield result
+        finally:
+            # The client went away, drop the chunks that have not started yet
+            for future in in_flight:
+                future.cancel()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
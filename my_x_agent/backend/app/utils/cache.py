@@ -0,0 +1,192 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+# True inside a stale-while-revalidate refresh, which no caller is waiting on
+in_background_refresh: ContextVar[bool] = ContextVar("in_background_refresh", default=False)
+
+
+class CacheStats:
+    __slots__ = ("hits", "stale_hits", "misses", "coalesced", "evictions", "refresh_errors")
+
+    def __init__(self):
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.refresh_errors = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+        result = {name: getattr(self, name) for name in self.__slots__}
+        result["hit_ratio"] = (self.hits + self.stale_hits) / lookups if lookups else 0.0
+        return result
+
+
+class _Entry:
+    __slots__ = ("value", "stored_at")
+
+    def __init__(self, value: Any, stored_at: float):
+        self.value = value
+        self.stored_at = stored_at
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with a default TTL and optional per-entry expiry
+
+    `expires_at` is a wall-clock timestamp, which lets callers expire an
+    entry exactly when the thing it caches (e.g. a JWT) stops being valid.
+    `on_evict(key, value)` is called for every entry dropped by the size
+    limit, by expiry or by `invalidate`.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: Optional[float] = None,
+                 on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evicted(self, key: Hashable, value: Any):
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._entries.get(key)
+        if item is None:
+            self.stats.misses += 1
+            return None
+        value, expires_at = item
+        if expires_at is not None and time.time() >= expires_at:
+            del self._entries[key]
+            self.stats.misses += 1
+            self._evicted(key, value)
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        if self.ttl is not None:
+            ttl_expiry = time.time() + self.ttl
+            expires_at = ttl_expiry if expires_at is None else min(expires_at, ttl_expiry)
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            evicted_key, (evicted, _) = self._entries.popitem(last=False)
+            self.stats.evictions += 1
+            self._evicted(evicted_key, evicted)
+
+    def invalidate(self, key: Hashable):
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self._evicted(key, item[0])
+
+    def clear(self):
+        self._entries.clear()
+
+
+class AsyncTTLCache:
+    """
+    Bounded LRU cache for coroutine results
+
+    - Entries younger than `ttl` are served directly.
+    - Entries between `ttl` and `ttl + stale_ttl` are served immediately while
+      a single background task reloads them (stale-while-revalidate).
+    - Concurrent misses for the same key share one in-flight load, so N callers
+      cause exactly one upstream call (single-flight).
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0, stale_ttl: float = 0.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._refreshing: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached value for `key`, calling `loader` at most once per miss
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.stored_at
+            if age < self.ttl:
+                self.stats.hits += 1
+                self._entries.move_to_end(key)
+                return entry.value
+            if age < self.ttl + self.stale_ttl:
+                self.stats.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._inflight:
+                    self._start_load(key, loader, background=True)
+                return entry.value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats.coalesced += 1
+        else:
+            self.stats.misses += 1
+            task = self._start_load(key, loader)
+        # Shielded so a cancelled caller does not abort the load for the others
+        return await asyncio.shield(task)
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """
+        Return a cached value regardless of age without touching the stats
+        """
+        entry = self._entries.get(key)
+        return entry.value if entry is not None else None
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = _Entry(value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _start_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], background: bool = False) -> asyncio.Task:
+        task = asyncio.ensure_future(self._load(key, loader, background))
+        self._inflight[key] = task
+        if background:
+            self._refreshing.add(task)
+            task.add_done_callback(self._refreshing.discard)
+        return task
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], background: bool) -> Any:
+        # Each load runs in its own task, so this does not leak into the caller
+        in_background_refresh.set(background)
+        try:
+            value = await loader()
+        except Exception as e:
+            if not background:
+                raise
+            # Keep serving the stale entry, the next lookup will retry
+            self.stats.refresh_errors += 1
+            print(f"Error refreshing {self.name} cache entry {key!r}: {e}")
+            return self.peek(key)
+        finally:
+            self._inflight.pop(key, None)
+        self.set(key, value)
+        return value
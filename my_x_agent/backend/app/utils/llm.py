@@ -0,0 +1,307 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from app.utils.cache import TTLCache
+from app.utils.metrics import upstream
+
+if TYPE_CHECKING:
+    import aiohttp
+
+load_dotenv()
+
+AI_API_BASE_URL = os.getenv("AI_API_BASE_URL", "")
+AI_API_KEY = os.getenv("AI_API_KEY", "")
+AI_MODEL = os.getenv("AI_MODEL", "gpt-4o")
+# Send micro-batches as one /v1/completions call with a list of prompts (vLLM, self-hosted servers)
+AI_BATCH_PROMPTS = os.getenv("AI_BATCH_PROMPTS", "false").lower() == "true"
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_BATCH_WINDOW_MS = float(os.getenv("LLM_BATCH_WINDOW_MS", "5"))
+LLM_MAX_BATCH_SIZE = int(os.getenv("LLM_MAX_BATCH_SIZE", "16"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "10000"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+
+
+class Completion(NamedTuple):
+    text: str
+    prompt_tokens: int
+    completion_tokens: int
+    cached: bool = False
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMProvider(ABC):
+    """
+    Backend that turns a batch of prompts into completions, one per prompt, in order
+    """
+
+    # Most prompts one provider call accepts, None for no limit
+    max_batch_size: Optional[int] = None
+
+    @abstractmethod
+    async def complete_batch(self, model: str, prompts: List[str], params: Dict[str, Any]) -> List[Completion]:
+        pass
+
+    async def close(self):
+        pass
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    Provider for OpenAI-style HTTP APIs (OpenAI, DeepSeek, vLLM, the local stub)
+
+    With `batch_prompts` a whole batch goes out as one /v1/completions request
+    carrying a list of prompts. Otherwise each prompt is its own
+    /v1/chat/completions request, sent concurrently over the pooled session.
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 api_key: str = "",
+                 batch_prompts: bool = AI_BATCH_PROMPTS,
+                 timeout: float = LLM_TIMEOUT_SECONDS,
+                 max_connections: int = LLM_MAX_CONCURRENCY * 2):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.batch_prompts = batch_prompts
+        self.max_batch_size = None if batch_prompts else 1
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.session: Optional["aiohttp.ClientSession"] = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self.session is None or self.session.closed:
+            import aiohttp
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=30),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else None
+            )
+        return self.session
+
+    async def _post(self, route: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        async with self._get_session().post(f"{self.base_url}{route}", json=payload) as response:
+            if response.status >= 400:
+                raise LLMError(f"LLM API returned {response.status}: {await response.text()}")
+            return await response.json(content_type=None)
+
+    async def _chat(self, model: str, prompt: str, params: Dict[str, Any]) -> Completion:
+        body = await self._post("/v1/chat/completions", {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            **params
+        })
+        usage = body.get("usage", {})
+        return Completion(
+            body["choices"][0]["message"]["content"],
+            usage.get("prompt_tokens", 0),
+            usage.get("completion_tokens", 0)
+        )
+
+    async def complete_batch(self, model: str, prompts: List[str], params: Dict[str, Any]) -> List[Completion]:
+        if not self.batch_prompts:
+            return list(await asyncio.gather(*(self._chat(model, prompt, params) for prompt in prompts)))
+
+        body = await self._post("/v1/completions", {"model": model, "prompt": prompts, **params})
+        choices = sorted(body["choices"], key=lambda choice: choice["index"])
+        # Batched responses only report totals, split them by prompt and output length
+        usage = body.get("usage", {})
+        prompt_chars = sum(len(prompt) for prompt in prompts) or 1
+        output_chars = sum(len(choice["text"]) for choice in choices) or 1
+        return [
+            Completion(
+                choice["text"],
+                round(usage.get("prompt_tokens", 0) * len(prompt) / prompt_chars),
+                round(usage.get("completion_tokens", 0) * len(choice["text"]) / output_chars)
+            )
+            for prompt, choice in zip(prompts, choices)
+        ]
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class LLMClient:
+    """
+    Front door to an LLMProvider shared by all requests of a worker
+
+    - Exact-match cache keyed on (model, prompt, params), identical prompts
+      already in flight share one call.
+    - Prompts with the same params that arrive within `batch_window` seconds
+      of each other are sent as one batch (up to `max_batch_size`).
+    - At most `max_concurrency` provider calls are in flight at once.
+    - Token usage is returned on every Completion and totalled in `usage`.
+      A cache hit, or a caller sharing another's in-flight prompt, spent
+      nothing and gets 0 tokens with `cached` set.
+    - A prompt every caller has given up on is dropped before it is sent, and
+      a batch whose callers have all gone away is cancelled mid-request.
+    """
+
+    def __init__(self,
+                 provider: LLMProvider,
+                 model: str = AI_MODEL,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 batch_window: float = LLM_BATCH_WINDOW_MS / 1000,
+                 max_batch_size: int = LLM_MAX_BATCH_SIZE,
+                 cache_size: int = LLM_CACHE_SIZE,
+                 cache_ttl: float = LLM_CACHE_TTL):
+        self.provider = provider
+        self.model = model
+        self.batch_window = batch_window
+        # A provider that takes one prompt per call gets no batching, only the limiter
+        self.max_batch_size = min(max_batch_size, provider.max_batch_size or max_batch_size)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.cache = TTLCache("llm_response", maxsize=cache_size, ttl=cache_ttl)
+        self.usage = {
+            "requests": 0, "batches": 0, "prompt_tokens": 0, "completion_tokens": 0, "errors": 0, "abandoned": 0
+        }
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        # params key -> prompts waiting for the current batch window to close
+        self._pending: Dict[tuple, List[Tuple[str, tuple]]] = {}
+        self._timers: Dict[tuple, asyncio.TimerHandle] = {}
+        self._batches: set = set()
+        self._waiters: Dict[tuple, int] = {}
+        # running batch -> keys some caller is still waiting for
+        self._live: Dict[asyncio.Task, set] = {}
+        self._batch_of: Dict[tuple, asyncio.Task] = {}
+
+    async def complete(self, prompt: str, **params) -> Completion:
+        """
+        Complete one prompt, params are passed through to the provider (max_tokens, temperature, ...)
+        """
+        params_key = tuple(sorted(params.items()))
+        key = (self.model, prompt, params_key)
+        self.usage["requests"] += 1
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached._replace(prompt_tokens=0, completion_tokens=0, cached=True)
+
+        future = self._inflight.get(key)
+        shared = future is not None
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[key] = future
+            self._enqueue(params_key, prompt, key)
+        elif key in self._batch_of:
+            # An earlier caller may have given up on it, its batch must not be cancelled under us
+            self._live[self._batch_of[key]].add(key)
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # Shielded so one caller going away does not fail the others waiting on it
+            completion = await asyncio.shield(future)
+            if shared:
+                return completion._replace(prompt_tokens=0, completion_tokens=0, cached=True)
+            return completion
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                if not future.done():
+                    self._abandon(params_key, key)
+
+    def _abandon(self, params_key: tuple, key: tuple):
+        """
+        Nobody waits for `key` any more, stop spending tokens on it
+        """
+        self.usage["abandoned"] += 1
+        pending = self._pending.get(params_key, [])
+        if any(queued == key for _, queued in pending):
+            pending[:] = [(prompt, queued) for prompt, queued in pending if queued != key]
+            self._inflight.pop(key).cancel()
+            return
+        task = self._batch_of.get(key)
+        if task is not None:
+            live = self._live[task]
+            live.discard(key)
+            if not live:
+                task.cancel()
+
+    def _enqueue(self, params_key: tuple, prompt: str, key: tuple):
+        pending = self._pending.setdefault(params_key, [])
+        pending.append((prompt, key))
+        if len(pending) >= self.max_batch_size:
+            self._flush(params_key)
+        elif params_key not in self._timers:
+            self._timers[params_key] = asyncio.get_running_loop().call_later(
+                self.batch_window, self._flush, params_key
+            )
+
+    def _flush(self, params_key: tuple):
+        timer = self._timers.pop(params_key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(params_key, [])
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(dict(params_key), batch))
+            self._batches.add(task)
+            self._live[task] = {key for _, key in batch}
+            for _, key in batch:
+                self._batch_of[key] = task
+            task.add_done_callback(lambda done: self._forget_batch(done, batch))
+
+    def _forget_batch(self, task: asyncio.Task, batch: List[Tuple[str, tuple]]):
+        self._batches.discard(task)
+        self._live.pop(task, None)
+        for _, key in batch:
+            self._batch_of.pop(key, None)
+
+    async def _run_batch(self, params: Dict[str, Any], batch: List[Tuple[str, tuple]]):
+        try:
+            async with self.semaphore:
+                with upstream("llm", "complete_batch"):
+                    completions = await self.provider.complete_batch(self.model, [prompt for prompt, _ in batch], params)
+            if len(completions) != len(batch):
+                raise LLMError(f"Provider returned {len(completions)} completions for {len(batch)} prompts")
+        except asyncio.CancelledError:
+            for _, key in batch:
+                self._inflight.pop(key).cancel()
+            raise
+        except Exception as e:
+            self.usage["errors"] += 1
+            for _, key in batch:
+                future = self._inflight.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.usage["batches"] += 1
+        for (_, key), completion in zip(batch, completions):
+            self.usage["prompt_tokens"] += completion.prompt_tokens
+            self.usage["completion_tokens"] += completion.completion_tokens
+            self.cache.set(key, completion)
+            future = self._inflight.pop(key)
+            if not future.done():
+                future.set_result(completion)
+
+    def stats(self) -> dict:
+        return {"model": self.model, **self.usage, "cache": self.cache.stats.to_dict()}
+
+    async def close(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        for batch in self._pending.values():
+            for _, key in batch:
+                self._inflight.pop(key).set_exception(LLMError("LLM client closed"))
+        self._pending.clear()
+        for task in list(self._batches):
+            task.cancel()
+        await asyncio.gather(*self._batches, return_exceptions=True)
+        await self.provider.close()
+
+
+def create_llm_client() -> Optional[LLMClient]:
+    """
+    Build the LLM client from AI_API_BASE_URL, None keeps AIService on its templates
+    """
+    if not AI_API_BASE_URL:
+        return None
+    return LLMClient(OpenAICompatibleProvider(AI_API_BASE_URL, AI_API_KEY))
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from app.utils.metrics import EVENT_LOOP_BLOCKED
+
+load_dotenv()
+
+LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG_ENABLED", "false").lower() == "true"
+LOOP_WATCHDOG_THRESHOLD_SECONDS = float(os.getenv("LOOP_WATCHDOG_THRESHOLD_SECONDS", "0.1"))
+
+
+def _request_route(frame) -> str:
+    """
+    Route template of the HTTP request whose call stack holds `frame`
+
+    Requests not matched to a route yet are "unmatched", like in the HTTP
+    metrics, so raw paths never become label values, and "unknown" is used
+    outside requests.
+    """
+    in_request = False
+    while frame is not None:
+        scope = frame.f_locals.get("scope")
+        if isinstance(scope, dict) and scope.get("type") == "http":
+            route = scope.get("route")
+            if route is not None and getattr(route, "path", None):
+                return route.path
+            in_request = True
+        frame = frame.f_back
+    return "unmatched" if in_request else "unknown"
+
+
+class LoopWatchdog:
+    """
+    Reports callbacks that hold the event loop longer than `threshold` seconds
+
+    A task on the loop bumps a heartbeat several times per threshold and a
+    daemon thread checks it. When the heartbeat goes stale the loop is stuck
+    in one callback, so the thread snapshots the loop thread's stack while it
+    is still blocked and prints it with the route of the request being
+    served. Each stall is reported once and counted in
+    event_loop_blocked_total. Off unless LOOP_WATCHDOG_ENABLED=true, as the
+    stack capture is meant for staging and load tests.
+    """
+
+    def __init__(self, threshold: float = LOOP_WATCHDOG_THRESHOLD_SECONDS):
+        self.threshold = threshold
+        self.interval = threshold / 4
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    async def _beat(self):
+        while True:
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.interval):
+            heartbeat = self._heartbeat
+            if time.monotonic() - heartbeat < self.threshold or heartbeat == reported:
+                continue
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            route = _request_route(frame)
+            EVENT_LOOP_BLOCKED.labels(route).inc()
+            stack = "".join(traceback.format_stack(frame))
+            print(f"Event loop blocked for more than {self.threshold * 1000:.0f}ms on {route}:\n{stack}")
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.ensure_future(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._thread.join()
+        self._task = None
+        self._thread = None
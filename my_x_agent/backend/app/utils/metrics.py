@@ -0,0 +1,178 @@
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from dotenv import load_dotenv
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+load_dotenv()
+
+METRICS_LOOP_LAG_INTERVAL = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))
+
+# Upstream calls and routes span 1ms cache hits to multi-second LLM calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to fully answer an HTTP request, streams included",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being handled", ["method"]
+)
+UPSTREAM_DURATION = Histogram(
+    "upstream_request_duration_seconds", "Time spent in calls to X, the LLM API and the BNB RPC node",
+    ["service", "operation", "outcome"], buckets=LATENCY_BUCKETS
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "How late the event loop ran a timer, i.e. how long callbacks held it",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+EVENT_LOOP_LAG_LAST = Gauge(
+    "event_loop_lag_last_seconds", "Event loop lag measured by the most recent probe"
+)
+X_RATE_LIMIT_WAIT = Histogram(
+    "x_rate_limit_wait_seconds", "Time X calls queued for their rate-limit window, per endpoint and priority",
+    ["endpoint", "priority"], buckets=LATENCY_BUCKETS + (60.0, 300.0, 900.0)
+)
+EVENT_LOOP_BLOCKED = Counter(
+    "event_loop_blocked", "Callbacks caught holding the event loop past the watchdog threshold", ["route"]
+)
+
+
+@contextmanager
+def upstream(service: str, operation: str):
+    """
+    Time the block as one `service` call, labelled ok or error by whether it raised
+    """
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        UPSTREAM_DURATION.labels(service, operation, outcome).observe(time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """
+    Records in-flight requests and a latency histogram per route template
+
+    The route is read from the scope after routing, so /user/{username} is
+    one series however many usernames are requested. Unrouted paths (404s)
+    are grouped under "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(method, template, str(status)).observe(time.perf_counter() - start)
+            in_flight.dec()
+
+
+class CacheCollector:
+    """
+    Exports hit/miss counters and hit ratios of the in-memory caches at scrape time
+    """
+
+    def __init__(self, caches: Callable[[], Iterable[Any]]):
+        self.caches = caches
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Lookups served from the cache, stale hits included", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Lookups that had to load the value", labels=["cache"])
+        evictions = CounterMetricFamily("cache_evictions", "Entries dropped to stay under the size limit", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Hits over lookups since start", labels=["cache"])
+        size = GaugeMetricFamily("cache_entries", "Entries currently held", labels=["cache"])
+        for cache in self.caches():
+            stats = cache.stats.to_dict()
+            hits.add_metric([cache.name], stats["hits"] + stats["stale_hits"])
+            misses.add_metric([cache.name], stats["misses"])
+            evictions.add_metric([cache.name], stats["evictions"])
+            ratio.add_metric([cache.name], stats["hit_ratio"])
+            size.add_metric([cache.name], len(cache))
+        return [hits, misses, evictions, ratio, size]
+
+
+class XSchedulerCollector:
+    """
+    Exports the X rate-limit queue depth per endpoint at scrape time
+    """
+
+    def __init__(self, queue_depths: Callable[[], Dict[str, int]]):
+        self.queue_depths = queue_depths
+
+    def collect(self):
+        depth = GaugeMetricFamily("x_rate_limit_queue_depth", "X calls waiting for their rate-limit window", labels=["endpoint"])
+        for endpoint, queued in self.queue_depths().items():
+            depth.add_metric([endpoint], queued)
+        return [depth]
+
+
+class LoopLagMonitor:
+    """
+    Background probe that sleeps `interval` and records how late it woke up
+    """
+
+    def __init__(self, interval: float = METRICS_LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            EVENT_LOOP_LAG.observe(lag)
+            EVENT_LOOP_LAG_LAST.set(lag)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+def register_collector(collector):
+    REGISTRY.register(collector)
+    return collector
+
+
+def unregister_collector(collector):
+    REGISTRY.unregister(collector)
+
+
+def render_metrics() -> tuple:
+    """
+    Prometheus text exposition of every metric of this process, with its content type
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
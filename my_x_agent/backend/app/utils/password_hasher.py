@@ -0,0 +1,67 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "64"))
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated thread pool instead of the event loop
+
+    bcrypt releases the GIL, so a few threads keep the cores busy while the
+    loop keeps serving other routes. At most `max_workers + queue_limit`
+    operations may be pending; beyond that callers get PasswordHasherBusy
+    rather than piling up behind a login storm.
+    """
+
+    def __init__(self,
+                 rounds: int = BCRYPT_ROUNDS,
+                 max_workers: int = PASSWORD_HASH_WORKERS,
+                 queue_limit: int = PASSWORD_HASH_QUEUE_LIMIT):
+        # Hashes below the configured cost are reported as needing an update
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds
+        )
+        self.max_pending = max_workers + queue_limit
+        self.pending = 0
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            raise PasswordHasherBusy("Too many password operations in progress")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, password, hashed_password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password, returning a replacement hash if the stored one uses an outdated cost
+        """
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
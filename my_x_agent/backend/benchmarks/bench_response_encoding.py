@@ -0,0 +1,134 @@
+"""
+Response bytes and latency of the bulk endpoints per encoding, in process
+
+    python -m benchmarks.bench_response_encoding [--tweets 100] [--requests 300]
+
+Mounts the tweets, trending and payment history payloads three times: with
+FastAPI's stock JSONResponse (json.dumps, today's output), with
+NegotiatedResponse as JSON (orjson) and with NegotiatedResponse asked for
+application/msgpack, then requests each through httpx's ASGI transport and
+reports body size and median/p95 latency. Every variant goes through the
+same response_model validation, so the difference is the encoding.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import httpx
+from fastapi import APIRouter, FastAPI
+from fastapi.responses import JSONResponse
+
+from app.models.tweet import Tweet, TrendingTopic, UserProfile
+from app.utils.encoding import MSGPACK_MEDIA_TYPE, NegotiatedResponse, NegotiatedRoute
+
+
+def payloads(tweet_count: int) -> Dict[str, list]:
+    author = UserProfile(
+        id="2244994945",
+        username="builder",
+        display_name="Builder",
+        profile_image_url="https://pbs.twimg.com/profile_images/1/avatar_normal.jpg",
+        description="Building data tools and writing about AI, crypto and shipping software.",
+        followers_count=120_000,
+        following_count=800,
+    )
+    start = datetime(2024, 5, 1, 12, 0)
+    tweets = [
+        Tweet(
+            id=str(1_800_000_000_000_000_000 + i),
+            text=f"Shipping the new data pipeline today, benchmarks look great #{i % 50} #AI",
+            created_at=start - timedelta(minutes=i),
+            likes_count=i * 3,
+            retweets_count=i,
+            replies_count=i % 7,
+            author=author,
+        )
+        for i in range(tweet_count)
+    ]
+    trending = [
+        TrendingTopic(name=f"#Topic{i}", tweet_volume=10_000 + i, location="Worldwide")
+        for i in range(50)
+    ]
+    history = [
+        {
+            "id": f"tx_{1714564800 + i}_{i:08x}",
+            "user_id": "u_5f2c9a",
+            "amount": 0.015 * (i % 5 + 1),
+            "item_type": "tweet_suggestion",
+            "status": "completed",
+            "created_at": (start - timedelta(hours=i)).isoformat(),
+            "updated_at": (start - timedelta(hours=i)).isoformat(),
+            "payment_address": "0x4f1a8b2c9d3e7f6a5b4c3d2e1f0a9b8c7d6e5f4a",
+            "tx_hash": f"0x{i:064x}",
+        }
+        for i in range(100)
+    ]
+    return {"tweets": tweets, "trending": trending, "history": history}
+
+
+def create_app(data: Dict[str, list]) -> FastAPI:
+    app = FastAPI()
+    for prefix, response_class in [("/stock", JSONResponse), ("/negotiated", NegotiatedResponse)]:
+        router = APIRouter(prefix=prefix, route_class=NegotiatedRoute)
+
+        @router.get("/tweets", response_model=List[Tweet], response_class=response_class)
+        async def tweets():
+            return data["tweets"]
+
+        @router.get("/trending", response_model=List[TrendingTopic], response_class=response_class)
+        async def trending():
+            return data["trending"]
+
+        @router.get("/history", response_class=response_class)
+        async def history() -> List[Dict]:
+            return data["history"]
+
+        app.include_router(router)
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, accept: str, requests: int) -> dict:
+    headers = {"Accept": accept}
+    size = len((await client.get(path, headers=headers)).content)
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        timings.append(time.perf_counter() - start)
+        response.raise_for_status()
+    timings.sort()
+    return {
+        "bytes": size,
+        "p50_ms": statistics.median(timings) * 1000,
+        "p95_ms": timings[int(len(timings) * 0.95) - 1] * 1000,
+    }
+
+
+async def main(args):
+    app = create_app(payloads(args.tweets))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{args.requests} requests per row, {args.tweets} tweets, 50 trends, 100 payments\n")
+        print(f"{'endpoint':<10}{'encoding':<20}{'bytes':>9}{'p50 ms':>9}{'p95 ms':>9}{'vs stock':>10}")
+        for endpoint in ["tweets", "trending", "history"]:
+            stock = None
+            for label, prefix, accept in [
+                ("stock json", "/stock", "application/json"),
+                ("orjson", "/negotiated", "application/json"),
+                ("msgpack", "/negotiated", MSGPACK_MEDIA_TYPE),
+            ]:
+                result = await measure(client, f"{prefix}/{endpoint}", accept, args.requests)
+                stock = stock or result
+                speedup = stock["p50_ms"] / result["p50_ms"]
+                print(f"{endpoint:<10}{label:<20}{result['bytes']:>9}{result['p50_ms']:>9.2f}"
+                      f"{result['p95_ms']:>9.2f}{speedup:>9.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tweets", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=300)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,165 @@
+"""
+Compare AIService.analyze (one compiled pass) against the previous analyzers,
+which each lowercased, split and scanned the text with one `in` test per term
+
+    python -m benchmarks.bench_text_analyzer
+"""
+import random
+import string
+import time
+from typing import Dict, List
+
+from app.utils.ai_service import DEFAULT_LEXICONS, AIService
+
+LEXICON_SIZES = [0, 100, 1000, 5000]
+TEXT_LENGTHS = [280, 2000, 20000]
+
+
+class LegacyAnalyzer:
+    """
+    The four AIService analyzers as they were before the compiled engine
+    """
+
+    def __init__(self, lexicons: Dict[str, List[str]]):
+        self.lexicons = lexicons
+
+    def analyze(self, tweet_text: str) -> dict:
+        engagement_score, engagement_reason = self.estimate_engagement(tweet_text)
+        risk_level, risk_reason = self.assess_risk(tweet_text)
+        return {
+            "sentiment": self.analyze_tweet_sentiment(tweet_text),
+            "topics": self.extract_topics(tweet_text),
+            "engagement_estimate": engagement_score,
+            "engagement_reason": engagement_reason,
+            "risk_level": risk_level,
+            "risk_reason": risk_reason
+        }
+
+    def analyze_tweet_sentiment(self, tweet_text: str) -> str:
+        tweet_lower = tweet_text.lower()
+        positive_count = sum(1 for word in self.lexicons["positive"] if word in tweet_lower)
+        negative_count = sum(1 for word in self.lexicons["negative"] if word in tweet_lower)
+        if positive_count > negative_count:
+            return "positive"
+        elif negative_count > positive_count:
+            return "negative"
+        return "neutral"
+
+    def extract_topics(self, tweet_text: str) -> List[str]:
+        hashtags = [word.strip('#') for word in tweet_text.split() if word.startswith('#')]
+        if hashtags:
+            return hashtags
+        tweet_lower = tweet_text.lower()
+        topics = []
+        if any(keyword in tweet_lower for keyword in self.lexicons["tech"]):
+            topics.append("Technology")
+        if any(keyword in tweet_lower for keyword in self.lexicons["crypto"]):
+            topics.append("Crypto")
+        return topics or ["General"]
+
+    def estimate_engagement(self, tweet_text: str) -> tuple:
+        score = 0.5
+        reasons = []
+        if 80 <= len(tweet_text) <= 200:
+            score += 0.1
+            reasons.append("Optimal length")
+        hashtags = [word for word in tweet_text.split() if word.startswith('#')]
+        if 1 <= len(hashtags) <= 3:
+            score += 0.1
+            reasons.append("Good hashtag usage")
+        elif len(hashtags) > 3:
+            score -= 0.05
+            reasons.append("Too many hashtags")
+        if '?' in tweet_text:
+            score += 0.05
+            reasons.append("Contains a question")
+        if 'http' in tweet_text:
+            score += 0.05
+            reasons.append("Contains a link")
+        if any(emoji in tweet_text for emoji in self.lexicons["emoji"]):
+            score += 0.05
+            reasons.append("Contains emojis")
+        score = min(score, 0.95)
+        reason = "Based on " + ", ".join(reasons) if reasons else "Average engagement expected"
+        return (score, reason)
+
+    def assess_risk(self, tweet_text: str) -> tuple:
+        risk_level = "low"
+        reasons = []
+        tweet_lower = tweet_text.lower()
+        found_sensitive = [word for word in self.lexicons["sensitive"] if word in tweet_lower]
+        if found_sensitive:
+            if len(found_sensitive) > 2:
+                risk_level = "high"
+                reasons.append(f"Contains multiple sensitive topics: {', '.join(found_sensitive)}")
+            else:
+                risk_level = "medium"
+                reasons.append(f"Contains sensitive topics: {', '.join(found_sensitive)}")
+        words = tweet_text.split()
+        caps_words = [word for word in words if word.isupper() and len(word) > 2]
+        if len(caps_words) > 2:
+            risk_level = max(risk_level, "medium")
+            reasons.append("Contains excessive capitalization")
+        if tweet_text.count('!') > 3 or tweet_text.count('?') > 3:
+            risk_level = max(risk_level, "medium")
+            reasons.append("Contains excessive punctuation")
+        reason = ", ".join(reasons) if reasons else "No risk factors detected"
+        return (risk_level, reason)
+
+
+def synthetic_terms(count: int, rng: random.Random) -> List[str]:
+    return ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(count)]
+
+
+def synthetic_text(length: int, vocabulary: List[str], rng: random.Random) -> str:
+    """
+    Zipf-distributed words from a fixed pool, with a sprinkle of lexicon terms
+    """
+    pool = ["".join(rng.choices(string.ascii_letters, k=rng.randint(2, 9))) for _ in range(3000)]
+    weights = [1 / rank for rank in range(1, len(pool) + 1)]
+    words = []
+    size = 0
+    while size < length:
+        if rng.random() < 0.05:
+            word = rng.choice(vocabulary)
+        else:
+            word = rng.choices(pool, weights)[0]
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length]
+
+
+def timed(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'extra terms':>11} {'text chars':>10} {'legacy us':>10} {'compiled us':>12} {'speedup':>8}")
+    for extra in LEXICON_SIZES:
+        lexicons = {name: list(terms) for name, terms in DEFAULT_LEXICONS.items()}
+        for index, term in enumerate(synthetic_terms(extra, rng)):
+            lexicons[["positive", "negative", "tech", "crypto", "sensitive"][index % 5]].append(term)
+
+        compile_start = time.perf_counter()
+        ai_service = AIService(lexicons=lexicons)
+        compile_ms = (time.perf_counter() - compile_start) * 1000
+        legacy = LegacyAnalyzer(lexicons)
+
+        vocabulary = [term for terms in lexicons.values() for term in terms]
+        for length in TEXT_LENGTHS:
+            text = synthetic_text(length, vocabulary, rng)
+            assert ai_service.analyze(text) == legacy.analyze(text), "compiled analyzer diverged from the legacy scan"
+
+            repeat = max(3, 200000 // (length + extra * 10))
+            legacy_us = timed(lambda: legacy.analyze(text), repeat) * 1e6
+            compiled_us = timed(lambda: ai_service.analyze(text), repeat) * 1e6
+            print(f"{extra:>11} {length:>10} {legacy_us:>10.1f} {compiled_us:>12.1f} {legacy_us / compiled_us:>7.1f}x")
+        print(f"{'':>11} compiled {len(vocabulary)} terms in {compile_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Memory and serialization cost of a timeline as List[Tweet] versus TweetBatch
+
+    python -m benchmarks.bench_timeline_compact [--tweets 1000] [--authors 1] [--repeat 20]
+
+"pydantic list" is what /user/{username}/tweets holds and serializes today,
+"compact batch" is the TweetBatch kept in the timeline cache and rendered
+with compact=true. Memory is measured with tracemalloc while building the
+container from the same raw X API tweet objects.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+
+from app.models.tweet import Tweet, UserProfile
+from app.models.tweet_batch import TweetBatch
+
+
+def raw_tweets(count: int, authors: int) -> List[dict]:
+    return [
+        {
+            "id": str(1_800_000_000_000_000_000 + i),
+            "text": f"Shipping the new data pipeline today, benchmarks look great #{i % 50} #AI",
+            "created_at": "2024-05-01T12:00:00.000Z",
+            "public_metrics": {"like_count": i * 3, "retweet_count": i, "reply_count": i % 7},
+            "author_id": str(i % authors),
+        }
+        for i in range(count)
+    ]
+
+
+def author_table(authors: int) -> dict:
+    return {
+        str(i): UserProfile(
+            id=str(i),
+            username=f"builder{i}",
+            display_name=f"Builder Number {i}",
+            profile_image_url=f"https://pbs.twimg.com/profile_images/{i}/avatar_normal.jpg",
+            description="Building data tools and writing about AI, crypto and the craft of shipping software.",
+            followers_count=120_000 + i,
+            following_count=800 + i,
+        )
+        for i in range(authors)
+    }
+
+
+def build_pydantic(raw: List[dict], authors: dict) -> List[Tweet]:
+    # Each tweet gets its own author object, as when authors arrive per tweet in an API response
+    return [
+        Tweet(
+            id=t["id"],
+            text=t["text"],
+            created_at=t["created_at"],
+            likes_count=t["public_metrics"]["like_count"],
+            retweets_count=t["public_metrics"]["retweet_count"],
+            replies_count=t["public_metrics"]["reply_count"],
+            author=authors[t["author_id"]].copy(),
+        )
+        for t in raw
+    ]
+
+
+def build_batch(raw: List[dict], authors: dict) -> TweetBatch:
+    batch = TweetBatch()
+    for t in raw:
+        metrics = t["public_metrics"]
+        batch.append(
+            t["id"], t["text"], t["created_at"],
+            metrics["like_count"], metrics["retweet_count"], metrics["reply_count"], authors[t["author_id"]]
+        )
+    return batch
+
+
+def measure_memory(build, *args) -> int:
+    tracemalloc.start()
+    container = build(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del container
+    return size
+
+
+def best_time(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tweets", type=int, default=1000)
+    parser.add_argument("--authors", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    raw = raw_tweets(args.tweets, args.authors)
+    authors = author_table(args.authors)
+    tweets = build_pydantic(raw, authors)
+    batch = build_batch(raw, authors)
+
+    # Same path FastAPI takes for a response_model list, and the compact route's JSONResponse
+    full_json = lambda: json.dumps(jsonable_encoder(tweets)).encode()
+    compact_json = lambda: json.dumps(batch.to_compact()).encode()
+
+    rows = [
+        ("pydantic list", measure_memory(build_pydantic, raw, authors), len(full_json()), best_time(full_json, args.repeat)),
+        ("compact batch", measure_memory(build_batch, raw, authors), len(compact_json()), best_time(compact_json, args.repeat)),
+    ]
+    print(f"{args.tweets} tweets, {args.authors} author(s)\n")
+    print(f"{'container':<16}{'memory KB':>12}{'JSON KB':>10}{'serialize ms':>15}")
+    for name, memory, size, seconds in rows:
+        print(f"{name:<16}{memory / 1024:>12.0f}{size / 1024:>10.0f}{seconds * 1000:>15.2f}")
+    (_, mem_a, size_a, time_a), (_, mem_b, size_b, time_b) = rows
+    print(f"\ncompact saves {1 - mem_b / mem_a:.0%} memory, {1 - size_b / size_a:.0%} bytes, "
+          f"serializes {time_a / time_b:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Stand-in BNB Chain JSON-RPC node serving fixture blocks and transactions
+
+    python -m benchmarks.fake_bnb_rpc [--port 8545] [--fixtures chain.json] [--block-time 3]
+
+Point BNB_RPC_URL at http://127.0.0.1:8545/ to run the payment confirmation
+worker against it. Fixture file format:
+
+    {
+        "head": 120,
+        "transactions": [
+            {"hash": "0xabc", "to": "0x0000...", "value": 30000000000000000, "block": 100, "status": 1,
+             "input": "0x<payment memo>"}
+        ]
+    }
+
+A transaction without "block" is known but not mined yet. With --block-time
+the head advances by one block every that many seconds. Transactions can be
+added while running with POST /fixtures/transactions (same object format),
+and every JSON-RPC request, single or batched, is counted in GET /fixtures/stats.
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+
+class FakeChain:
+    def __init__(self, head: int = 0, block_time: float = 0.0):
+        self.base_head = head
+        self.block_time = block_time
+        self.started = time.monotonic()
+        self.transactions: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"requests": 0, "calls": 0}
+
+    @classmethod
+    def from_fixtures(cls, fixtures: Dict[str, Any], block_time: float = 0.0) -> "FakeChain":
+        chain = cls(fixtures.get("head", 0), block_time)
+        for transaction in fixtures.get("transactions", []):
+            chain.add(transaction)
+        return chain
+
+    @property
+    def head(self) -> int:
+        if self.block_time <= 0:
+            return self.base_head
+        return self.base_head + int((time.monotonic() - self.started) / self.block_time)
+
+    def add(self, transaction: Dict[str, Any]):
+        self.transactions[transaction["hash"].lower()] = transaction
+
+    def _transaction(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        transaction = self.transactions.get(tx_hash.lower())
+        if transaction is None:
+            return None
+        block = transaction.get("block")
+        return {
+            "hash": transaction["hash"],
+            "from": transaction.get("from", "0x" + "11" * 20),
+            "to": transaction.get("to"),
+            "value": hex(int(transaction.get("value", 0))),
+            "input": transaction.get("input", "0x"),
+            "blockNumber": hex(block) if block is not None and block <= self.head else None,
+        }
+
+    def _receipt(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        transaction = self.transactions.get(tx_hash.lower())
+        if transaction is None or transaction.get("block") is None or transaction["block"] > self.head:
+            return None
+        return {
+            "transactionHash": transaction["hash"],
+            "blockNumber": hex(transaction["block"]),
+            "status": hex(transaction.get("status", 1)),
+            "to": transaction.get("to"),
+        }
+
+    def _block(self, number: str) -> Optional[Dict[str, Any]]:
+        block = self.head if number == "latest" else int(number, 16)
+        if block > self.head:
+            return None
+        return {
+            "number": hex(block),
+            "hash": "0x" + format(block, "064x"),
+            "timestamp": hex(int(time.time()) - (self.head - block) * 3),
+            "transactions": [t["hash"] for t in self.transactions.values() if t.get("block") == block],
+        }
+
+    def call(self, method: str, params: list) -> Any:
+        if method == "eth_blockNumber":
+            return hex(self.head)
+        if method == "eth_chainId":
+            return hex(56)
+        if method == "net_version":
+            return "56"
+        if method == "eth_getTransactionReceipt":
+            return self._receipt(params[0])
+        if method == "eth_getTransactionByHash":
+            return self._transaction(params[0])
+        if method == "eth_getBlockByNumber":
+            return self._block(params[0])
+        raise KeyError(method)
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        self.stats["calls"] += 1
+        reply = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            reply["result"] = self.call(request["method"], request.get("params", []))
+        except KeyError:
+            reply["error"] = {"code": -32601, "message": f"Method not found: {request.get('method')}"}
+        except Exception as e:
+            reply["error"] = {"code": -32602, "message": str(e)}
+        return reply
+
+
+def create_app(chain: FakeChain) -> web.Application:
+    async def rpc(request: web.Request) -> web.Response:
+        chain.stats["requests"] += 1
+        body = await request.json()
+        if isinstance(body, list):
+            return web.json_response([chain.handle(call) for call in body])
+        return web.json_response(chain.handle(body))
+
+    async def add_transaction(request: web.Request) -> web.Response:
+        chain.add(await request.json())
+        return web.json_response({"ok": True})
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response({**chain.stats, "head": chain.head})
+
+    app = web.Application()
+    app.router.add_post("/", rpc)
+    app.router.add_post("/fixtures/transactions", add_transaction)
+    app.router.add_get("/fixtures/stats", stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8545)
+    parser.add_argument("--fixtures", help="JSON file with head and transactions")
+    parser.add_argument("--block-time", type=float, default=0.0, help="Seconds per new block, 0 keeps the head fixed")
+    args = parser.parse_args()
+
+    fixtures = {}
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            fixtures = json.load(f)
+    web.run_app(create_app(FakeChain.from_fixtures(fixtures, args.block_time)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
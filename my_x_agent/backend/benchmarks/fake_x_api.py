@@ -0,0 +1,193 @@
+"""
+Stand-in X API with configurable latency, errors and rate limits
+
+    python -m benchmarks.fake_x_api [--port 8700] [--latency-ms 80] [--jitter-ms 40]
+                                    [--error-rate 0.01] [--rate-limit 900] [--window 900]
+
+Point TWITTER_API_BASE_URL at http://127.0.0.1:8700 (with any
+TWITTER_BEARER_TOKEN) to run TwitterService against it. Serves the calls
+AsyncXClient makes:
+
+    GET  /2/users/by/username/:username
+    GET  /2/users/:id/tweets          max_results, pagination_token, since_id
+    GET  /1.1/trends/place.json       id
+    HEAD /                            connection warm-up
+
+Every user has a deterministic timeline of --timeline-size tweets. Each
+response carries x-rate-limit-* headers for its (credential, endpoint)
+bucket, which allows --rate-limit requests per --window seconds. Over the
+limit the answer is 429. Bearer calls share one credential, and OAuth calls
+are counted per access token, as on X. --error-rate of the calls fail with
+503. GET /stats reports the requests, errors and 429s per endpoint.
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, Tuple
+
+from aiohttp import web
+
+TOPICS = ["AI", "Python", "Crypto", "Blockchain", "MachineLearning", "Startups", "OpenSource", "Web3"]
+
+
+class FakeX:
+    def __init__(self,
+                 latency_ms: float = 80.0,
+                 jitter_ms: float = 40.0,
+                 error_rate: float = 0.0,
+                 rate_limit: int = 900,
+                 window: float = 900.0,
+                 timeline_size: int = 3200,
+                 seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.window = window
+        self.timeline_size = timeline_size
+        self.random = random.Random(seed)
+        # (credential, endpoint) -> [window start, requests in window]
+        self.buckets: Dict[Tuple[str, str], list] = {}
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"requests": 0, "errors": 0, "rate_limited": 0})
+
+    @staticmethod
+    def credential(request: web.Request) -> str:
+        authorization = request.headers.get("Authorization", "")
+        if authorization.startswith("OAuth"):
+            for part in authorization[len("OAuth"):].split(","):
+                name, _, value = part.strip().partition("=")
+                if name == "oauth_token":
+                    return "user:" + value.strip('"')
+        return "app"
+
+    def _rate_limit(self, credential: str, endpoint: str) -> Tuple[bool, Dict[str, str]]:
+        now = time.time()
+        bucket = self.buckets.get((credential, endpoint))
+        if bucket is None or now >= bucket[0] + self.window:
+            bucket = self.buckets[(credential, endpoint)] = [now, 0]
+        allowed = bucket[1] < self.rate_limit
+        if allowed:
+            bucket[1] += 1
+        headers = {
+            "x-rate-limit-limit": str(self.rate_limit),
+            "x-rate-limit-remaining": str(self.rate_limit - bucket[1]),
+            "x-rate-limit-reset": str(int(bucket[0] + self.window) + 1),
+        }
+        return allowed, headers
+
+    async def respond(self, request: web.Request, endpoint: str, body) -> web.Response:
+        stats = self.stats[endpoint]
+        stats["requests"] += 1
+        allowed, headers = self._rate_limit(self.credential(request), endpoint)
+        delay = max(0.0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        if not allowed:
+            stats["rate_limited"] += 1
+            return web.json_response({"title": "Too Many Requests", "status": 429}, status=429, headers=headers)
+        if self.random.random() < self.error_rate:
+            stats["errors"] += 1
+            return web.json_response({"title": "Service Unavailable", "status": 503}, status=503, headers=headers)
+        return web.json_response(body() if callable(body) else body, headers=headers)
+
+    @staticmethod
+    def user_id(username: str) -> str:
+        return str(int(hashlib.sha1(username.lower().encode()).hexdigest()[:12], 16))
+
+    def user(self, username: str) -> Dict[str, Any]:
+        seed = int(self.user_id(username))
+        return {
+            "id": self.user_id(username),
+            "username": username,
+            "name": username.capitalize(),
+            "description": f"Writing about {TOPICS[seed % len(TOPICS)]} and {TOPICS[seed // 7 % len(TOPICS)]}.",
+            "profile_image_url": f"https://pbs.twimg.com/profile_images/{seed}/avatar_normal.jpg",
+            "public_metrics": {"followers_count": seed % 100000, "following_count": seed % 1000},
+        }
+
+    def tweet(self, user_id: str, index: int) -> Dict[str, Any]:
+        # Index 0 is the newest tweet, ids decrease with age like snowflakes
+        tweet_id = int(user_id) * 10000 + (self.timeline_size - index)
+        topic = TOPICS[(tweet_id // 3) % len(TOPICS)]
+        return {
+            "id": str(tweet_id),
+            "text": f"Notes from today's work on {topic.lower()} tooling, thread below #{topic} ({index})",
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(1714564800 - index * 3600)),
+            "public_metrics": {"like_count": tweet_id % 500, "retweet_count": tweet_id % 50, "reply_count": tweet_id % 20},
+        }
+
+    def timeline_page(self, user_id: str, query) -> Dict[str, Any]:
+        max_results = min(max(int(query.get("max_results", 10)), 5), 100)
+        start = int(query.get("pagination_token", 0))
+        since_id = int(query["since_id"]) if query.get("since_id") else None
+        tweets = []
+        index = start
+        while index < self.timeline_size and len(tweets) < max_results:
+            tweet = self.tweet(user_id, index)
+            if since_id is not None and int(tweet["id"]) <= since_id:
+                break
+            tweets.append(tweet)
+            index += 1
+        page: Dict[str, Any] = {"meta": {"result_count": len(tweets)}}
+        if tweets:
+            page["data"] = tweets
+            page["meta"]["newest_id"] = tweets[0]["id"]
+            page["meta"]["oldest_id"] = tweets[-1]["id"]
+            if index < self.timeline_size and (since_id is None or int(self.tweet(user_id, index)["id"]) > since_id):
+                page["meta"]["next_token"] = str(index)
+        return page
+
+    def trends(self, woeid: str) -> list:
+        return [{
+            "trends": [
+                {"name": f"#{topic}", "tweet_volume": 10000 + 1000 * position, "url": f"https://x.com/search?q=%23{topic}"}
+                for position, topic in enumerate(TOPICS)
+            ],
+            "locations": [{"name": "Worldwide" if woeid == "1" else woeid, "woeid": int(woeid)}],
+        }]
+
+
+def create_app(fake: FakeX) -> web.Application:
+    async def user(request: web.Request) -> web.Response:
+        return await fake.respond(request, "/2/users/by/username/:username", {"data": fake.user(request.match_info["username"])})
+
+    async def tweets(request: web.Request) -> web.Response:
+        return await fake.respond(request, "/2/users/:id/tweets", lambda: fake.timeline_page(request.match_info["id"], request.query))
+
+    async def trends(request: web.Request) -> web.Response:
+        return await fake.respond(request, "/1.1/trends/place.json", fake.trends(request.query.get("id", "1")))
+
+    async def warm_up(request: web.Request) -> web.Response:
+        return web.Response()
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(fake.stats)
+
+    app = web.Application()
+    app.router.add_get("/2/users/by/username/{username}", user)
+    app.router.add_get("/2/users/{id}/tweets", tweets)
+    app.router.add_get("/1.1/trends/place.json", trends)
+    app.router.add_route("HEAD", "/", warm_up)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=40.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 503")
+    parser.add_argument("--rate-limit", type=int, default=900, help="requests per window per credential and endpoint")
+    parser.add_argument("--window", type=float, default=900.0, help="rate-limit window in seconds")
+    parser.add_argument("--timeline-size", type=int, default=3200)
+    args = parser.parse_args()
+    fake = FakeX(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit, args.window, args.timeline_size)
+    web.run_app(create_app(fake), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
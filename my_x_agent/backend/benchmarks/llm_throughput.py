@@ -0,0 +1,67 @@
+"""
+LLM client throughput against the local stub server, no network needed
+
+    python -m benchmarks.llm_throughput [--prompts 256] [--latency-ms 200] [--concurrency 8]
+
+Runs the same burst of prompts through LLMClient with one request per
+prompt, with prompt-list micro-batching, and again with a warm response
+cache, and reports wall time, prompts per second and provider requests.
+"""
+import argparse
+import asyncio
+import time
+
+from aiohttp import web
+
+from app.utils.llm import LLMClient, OpenAICompatibleProvider
+from benchmarks.stub_llm_server import create_app
+
+
+async def run(url: str, prompts, batch_prompts: bool, concurrency: int, warm: bool = False) -> dict:
+    client = LLMClient(
+        OpenAICompatibleProvider(url, batch_prompts=batch_prompts),
+        model="stub",
+        max_concurrency=concurrency,
+        max_batch_size=32
+    )
+    try:
+        if warm:
+            await asyncio.gather(*(client.complete(prompt, max_tokens=32) for prompt in prompts))
+        before = dict(client.usage)
+        start = time.perf_counter()
+        await asyncio.gather(*(client.complete(prompt, max_tokens=32) for prompt in prompts))
+        elapsed = time.perf_counter() - start
+        measured = {name: client.usage[name] - before[name] for name in before}
+        return {"seconds": elapsed, "prompts_per_second": len(prompts) / elapsed, **measured}
+    finally:
+        await client.close()
+
+
+async def main(args):
+    runner = web.AppRunner(create_app(args.latency_ms))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}"
+    prompts = [f"Write a tweet about topic {i}" for i in range(args.prompts)]
+
+    print(f"{args.prompts} prompts, {args.latency_ms:.0f}ms stub latency, {args.concurrency} concurrent provider calls\n")
+    print(f"{'mode':<28}{'seconds':>10}{'prompts/s':>12}{'calls':>10}{'tokens':>10}")
+    for label, batch_prompts, warm in [
+        ("one request per prompt", False, False),
+        ("micro-batched prompt lists", True, False),
+        ("warm response cache", True, True),
+    ]:
+        result = await run(url, prompts, batch_prompts, args.concurrency, warm)
+        tokens = result["prompt_tokens"] + result["completion_tokens"]
+        print(f"{label:<28}{result['seconds']:>10.2f}{result['prompts_per_second']:>12.0f}{result['batches']:>10}{tokens:>10}")
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prompts", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,193 @@
+"""
+Load driver for the API: a weighted mix of twitter, auth and payment calls at fixed concurrency
+
+    python -m benchmarks.load_driver [--concurrency 32] [--duration 20] [--users 20]
+    python -m benchmarks.load_driver --url http://127.0.0.1:8000 ...
+
+Without --url the app runs in this process (an in-memory SQLite database
+whatever DATABASE_URL says, httpx's ASGI transport) against an in-process
+fake X API (benchmarks.fake_x_api), whose latency, error rate and rate
+limit are set with the --x-* options. With
+--url the driver targets a running server, which should have
+TWITTER_API_BASE_URL pointed at a `python -m benchmarks.fake_x_api`.
+
+Each worker loops until --duration elapses, picking routes by weight. The
+report gives requests, non-2xx responses, throughput and p50/p95/p99
+latency per route template.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import time
+import uuid
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import httpx
+from aiohttp import web
+
+from benchmarks.fake_x_api import FakeX, create_app as create_fake_x_app
+
+PASSWORD = "correct horse battery staple"
+X_USERNAMES = [f"creator{i}" for i in range(200)]
+TWEET_TEXT = "Shipping a faster analyzer today, what should we benchmark next? #AI #Python"
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Session:
+    """
+    One signed-in API user
+    """
+
+    def __init__(self, email: str, access_token: str):
+        self.email = email
+        self.headers = {"Authorization": f"Bearer {access_token}"}
+
+
+async def sign_up(client: httpx.AsyncClient) -> Session:
+    email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+    response = await client.post("/api/auth/register", json={"email": email, "username": email.split("@")[0], "password": PASSWORD})
+    response.raise_for_status()
+    response = await client.post("/api/auth/token", data={"username": email, "password": PASSWORD})
+    response.raise_for_status()
+    return Session(email, response.json()["access_token"])
+
+
+Call = Callable[[httpx.AsyncClient, Session, random.Random], Awaitable[httpx.Response]]
+
+# (route template, weight, call)
+SCENARIO: List[Tuple[str, int, Call]] = [
+    ("GET /api/twitter/user/{username}", 15,
+     lambda c, s, r: c.get(f"/api/twitter/user/{r.choice(X_USERNAMES)}")),
+    ("GET /api/twitter/user/{username}/tweets", 20,
+     lambda c, s, r: c.get(f"/api/twitter/user/{r.choice(X_USERNAMES)}/tweets", params={"count": 20})),
+    ("GET /api/twitter/user/{username}/tweets?compact", 5,
+     lambda c, s, r: c.get(f"/api/twitter/user/{r.choice(X_USERNAMES)}/tweets", params={"count": 100, "compact": "true"})),
+    ("GET /api/twitter/trending", 10,
+     lambda c, s, r: c.get("/api/twitter/trending")),
+    ("POST /api/twitter/suggest", 10,
+     lambda c, s, r: c.post("/api/twitter/suggest", params={"username": r.choice(X_USERNAMES), "count": 3}, headers=s.headers)),
+    ("POST /api/twitter/analyze", 10,
+     lambda c, s, r: c.post("/api/twitter/analyze", json={"tweet_text": TWEET_TEXT})),
+    ("POST /api/twitter/reply-options", 5,
+     lambda c, s, r: c.post("/api/twitter/reply-options", params={"tweet_id": "1", "tweet_text": TWEET_TEXT, "count": 3})),
+    ("GET /api/auth/me", 10,
+     lambda c, s, r: c.get("/api/auth/me", headers=s.headers)),
+    ("POST /api/auth/token", 1,
+     lambda c, s, r: c.post("/api/auth/token", data={"username": s.email, "password": PASSWORD})),
+    ("POST /api/payment/request", 4,
+     lambda c, s, r: c.post("/api/payment/request", json={"item_type": "tweet_suggestion", "quantity": 1}, headers=s.headers)),
+    ("GET /api/payment/history", 10,
+     lambda c, s, r: c.get("/api/payment/history", params={"limit": 20}, headers=s.headers)),
+]
+
+
+async def worker(client: httpx.AsyncClient, sessions: List[Session], deadline: float, seed: int,
+                 latencies: Dict[str, List[float]], failures: Dict[str, int]):
+    rng = random.Random(seed)
+    routes = [route for route, _, _ in SCENARIO]
+    weights = [weight for _, weight, _ in SCENARIO]
+    calls = {route: call for route, _, call in SCENARIO}
+    while time.perf_counter() < deadline:
+        route = rng.choices(routes, weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await calls[route](client, rng.choice(sessions), rng)
+            ok = response.status_code < 300
+        except httpx.HTTPError:
+            ok = False
+        latencies[route].append((time.perf_counter() - start) * 1000)
+        if not ok:
+            failures[route] += 1
+
+
+async def drive(client: httpx.AsyncClient, args) -> None:
+    sessions = [await sign_up(client) for _ in range(args.users)]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    failures: Dict[str, int] = defaultdict(int)
+
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(
+        worker(client, sessions, deadline, args.seed + index, latencies, failures)
+        for index in range(args.concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(samples) for samples in latencies.values())
+    print(f"{total} requests in {elapsed:.1f}s, {total / elapsed:.0f} req/s at concurrency {args.concurrency}\n")
+    print(f"{'route':<50}{'reqs':>7}{'non-2xx':>9}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route, _, _ in SCENARIO:
+        samples = latencies.get(route)
+        if not samples:
+            continue
+        print(f"{route:<50}{len(samples):>7}{failures[route]:>9}{len(samples) / elapsed:>8.1f}"
+              f"{percentile(samples, 0.50):>9.1f}{percentile(samples, 0.95):>9.1f}{percentile(samples, 0.99):>9.1f}")
+    everything = [sample for samples in latencies.values() for sample in samples]
+    if everything:
+        print(f"{'all':<50}{total:>7}{sum(failures.values()):>9}{total / elapsed:>8.1f}"
+              f"{percentile(everything, 0.50):>9.1f}{percentile(everything, 0.95):>9.1f}{percentile(everything, 0.99):>9.1f}")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_in_process(args):
+    fake = FakeX(args.x_latency_ms, args.x_jitter_ms, args.x_error_rate, args.x_rate_limit, args.x_window)
+    runner = web.AppRunner(create_fake_x_app(fake))
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    # Read when the app modules are imported, so set them first
+    os.environ["TWITTER_API_BASE_URL"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("TWITTER_BEARER_TOKEN", "load-test")
+    # The driver registers throwaway users and payments, keep them out of any real database
+    if os.environ.get("DATABASE_URL", "sqlite://") != "sqlite://":
+        print(f"Ignoring DATABASE_URL={os.environ['DATABASE_URL']}, the in-process app uses an in-memory database")
+    os.environ["DATABASE_URL"] = "sqlite://"
+    from app.main import app
+
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=60) as client:
+                await drive(client, args)
+    finally:
+        await runner.cleanup()
+    print(f"\nfake X API calls: {dict(fake.stats)}")
+
+
+async def run_remote(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        await drive(client, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running API, default runs the app in process")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--users", type=int, default=20, help="API accounts to sign up and spread calls over")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--x-latency-ms", type=float, default=80.0)
+    parser.add_argument("--x-jitter-ms", type=float, default=40.0)
+    parser.add_argument("--x-error-rate", type=float, default=0.0)
+    parser.add_argument("--x-rate-limit", type=int, default=900)
+    parser.add_argument("--x-window", type=float, default=900.0)
+    args = parser.parse_args()
+    asyncio.run(run_remote(args) if args.url else run_in_process(args))
+
+
+if __name__ == "__main__":
+    main()
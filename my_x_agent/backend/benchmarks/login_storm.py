@@ -0,0 +1,84 @@
+"""
+Login storm load test: fire concurrent logins and measure how responsive
+another route stays meanwhile
+
+    python -m benchmarks.login_storm [--logins 32] [--inline-hashing]
+
+--inline-hashing runs bcrypt on the event loop, as before the hashing pool,
+to show the difference.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("TWITTER_BEARER_TOKEN", "")
+
+import httpx
+
+from app.main import app
+
+EMAIL = "storm@example.com"
+PASSWORD = "correct horse battery staple"
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, samples: list):
+    """
+    Hit /healthz every 5ms, recording how late each response is, loop stalls included
+    """
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        await client.get("/healthz")
+        samples.append((time.perf_counter() - start) * 1000 - 5)
+
+
+async def login(client: httpx.AsyncClient) -> int:
+    response = await client.post("/api/auth/token", data={"username": EMAIL, "password": PASSWORD})
+    return response.status_code
+
+
+async def main(logins: int, inline_hashing: bool):
+    async with app.router.lifespan_context(app):
+        hasher = app.state.services.auth_service.hasher
+        if inline_hashing:
+            async def run_inline(func, *args):
+                return func(*args)
+            hasher._run = run_inline
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.post("/api/auth/register", json={"email": EMAIL, "password": PASSWORD, "username": "storm"})
+
+            samples = []
+            stop = asyncio.Event()
+            probe_task = asyncio.create_task(probe(client, stop, samples))
+            await asyncio.sleep(0.1)
+
+            start = time.perf_counter()
+            statuses = await asyncio.gather(*(login(client) for _ in range(logins)))
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await probe_task
+
+    print(f"hashing: {'inline on the event loop' if inline_hashing else 'thread pool'}")
+    print(f"logins: {logins} in {elapsed:.2f}s ({logins / elapsed:.1f}/s), statuses {sorted(set(statuses))}")
+    print(
+        f"/healthz during storm: n={len(samples)} "
+        f"p50={statistics.median(samples):.1f}ms p99={percentile(samples, 0.99):.1f}ms max={max(samples):.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--inline-hashing", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.inline_hashing))
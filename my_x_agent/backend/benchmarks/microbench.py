@@ -0,0 +1,264 @@
+"""
+Micro-benchmarks of the analysis, generation, auth and model hot paths, with JSON baselines
+
+    python -m benchmarks.microbench run [--filter auth] [--rounds 3] [--output results.json]
+    python -m benchmarks.microbench save [--baseline benchmarks/baselines/microbench.json]
+    python -m benchmarks.microbench compare [--baseline ...] [--threshold 0.25]
+
+Each case is run in batches of at least MIN_BATCH_SECONDS, and a round's
+time is the fastest of REPEATS batches in nanoseconds per call. Taking the
+fastest keeps scheduler noise and slow stretches on shared machines out of
+a round, and the case's time is the median over `rounds` passes through the
+suite. `save` writes the results as the baseline. `compare` runs the suite
+again, prints the change per case and exits 1 if a case is more than
+`threshold` slower than its baseline in every round, and by more than
+`noise_floor` nanoseconds, so one slow round or a few nanoseconds on a
+sub-microsecond case do not fail it. Baselines only compare within one
+machine and Python build, so regenerate them with `save` after changing
+either.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Union
+
+from app.models.tweet import Tweet, UserProfile
+from app.models.user import SubscriptionTier, User
+from app.services.auth_service import AuthService
+from app.services.user_repository import SQLiteUserRepository
+from app.utils.ai_service import DEFAULT_LEXICONS, AIService
+from benchmarks.bench_text_analyzer import synthetic_text
+
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "microbench.json"
+MIN_BATCH_SECONDS = 0.05
+REPEATS = 5
+# Slowdowns this small are timer and cache noise whatever their percentage
+NOISE_FLOOR_NS = 100
+
+Case = Tuple[str, Callable[[], Union[Any, Awaitable[Any]]]]
+
+
+async def measure(func: Callable[[], Union[Any, Awaitable[Any]]]) -> float:
+    """
+    Fastest of REPEATS batches, in nanoseconds per call
+    """
+    # Cases may be plain functions or return a coroutine, tell which from a first call
+    first = func()
+    is_async = inspect.isawaitable(first)
+    if is_async:
+        await first
+
+    async def batch(calls: int) -> float:
+        start = time.perf_counter_ns()
+        if is_async:
+            for _ in range(calls):
+                await func()
+        else:
+            for _ in range(calls):
+                func()
+        return time.perf_counter_ns() - start
+
+    calls = 1
+    while (elapsed := await batch(calls)) < MIN_BATCH_SECONDS * 1e9:
+        calls *= 2 if elapsed < MIN_BATCH_SECONDS * 1e8 else 10
+        calls = min(calls, 10_000_000)
+    return min([elapsed] + [await batch(calls) for _ in range(REPEATS - 1)]) / calls
+
+
+def analysis_cases(ai_service: AIService) -> List[Case]:
+    rng = random.Random(42)
+    vocabulary = [term for terms in DEFAULT_LEXICONS.values() for term in terms]
+    cases = []
+    for length in (280, 2000, 20000):
+        text = synthetic_text(length, vocabulary, rng)
+        cases.append((f"ai.analyze[{length}]", lambda text=text: ai_service.analyze(text)))
+    return cases
+
+
+def generation_cases(ai_service: AIService) -> List[Case]:
+    rng = random.Random(7)
+    vocabulary = [term for terms in DEFAULT_LEXICONS.values() for term in terms]
+    tweets = [synthetic_text(200, vocabulary, rng) + " #AI #Python" for _ in range(50)]
+    style_profile = ai_service.update_style_profile(None, "bench", tweets, "1")
+    trending = ["#AI", "#MachineLearning", "#Python", "#Blockchain", "#Crypto"]
+    tweet_text = "Just shipped a faster analyzer for our tweet pipeline, what should we benchmark next? #AI"
+
+    cases = []
+    for count in (1, 5, 10):
+        cases.append((
+            f"ai.generate_tweet_suggestions[{count}]",
+            lambda count=count: ai_service.generate_tweet_suggestions(style_profile, trending, count)
+        ))
+    for count in (1, 3, 5):
+        cases.append((
+            f"ai.generate_reply_options[{count}]",
+            lambda count=count: ai_service.generate_reply_options(tweet_text, count)
+        ))
+    cases.append((
+        "ai.update_style_profile[50]",
+        lambda: ai_service.update_style_profile(None, "bench", tweets, "1")
+    ))
+    return cases
+
+
+async def auth_cases(auth_service: AuthService) -> List[Case]:
+    user = await auth_service.create_user("bench@example.com", "bench", "correct horse battery staple")
+    data = {"sub": user.email, "user_id": user.id}
+    token = auth_service.create_access_token(data)
+
+    async def current_user_cold():
+        auth_service.token_cache.clear()
+        auth_service.user_cache.clear()
+        return await auth_service.get_current_user(token)
+
+    async def current_user_cached():
+        return await auth_service.get_current_user(token)
+
+    return [
+        ("auth.create_access_token", lambda: auth_service.create_access_token(data)),
+        ("auth.get_current_user[cached]", current_user_cached),
+        ("auth.get_current_user[cold]", current_user_cold),
+    ]
+
+
+def model_cases() -> List[Case]:
+    author = {
+        "id": "2244994945",
+        "username": "builder",
+        "display_name": "Builder",
+        "profile_image_url": "https://pbs.twimg.com/profile_images/1/avatar_normal.jpg",
+        "description": "Building data tools and writing about AI.",
+        "followers_count": 120000,
+        "following_count": 800,
+    }
+    tweet = {
+        "id": "1800000000000000000",
+        "text": "Shipping the new data pipeline today, benchmarks look great #AI",
+        "created_at": "2024-05-01T12:00:00Z",
+        "likes_count": 42,
+        "retweets_count": 7,
+        "replies_count": 3,
+    }
+    profile = UserProfile(**author)
+    user = {
+        "id": "user_5f2c9a0b1d2e3f40",
+        "email": "bench@example.com",
+        "username": "bench",
+        "created_at": datetime(2024, 5, 1, 12, 0),
+        "updated_at": datetime(2024, 5, 1, 12, 0),
+        "subscription_tier": SubscriptionTier.FREE,
+        "suggestions_remaining": 5,
+        "x_username": "builder",
+    }
+    built = Tweet(**tweet, author=profile)
+    return [
+        ("model.Tweet[from dict]", lambda: Tweet(**tweet, author=author)),
+        ("model.Tweet[with UserProfile]", lambda: Tweet(**tweet, author=profile)),
+        ("model.Tweet[json]", lambda: built.json()),
+        ("model.User", lambda: User(**user)),
+    ]
+
+
+async def run_suite(name_filter: str = "", rounds: int = 3) -> Dict[str, Any]:
+    ai_service = AIService()
+    # A fresh in-memory user store, never the configured database
+    auth_service = AuthService(repository=SQLiteUserRepository(""))
+    await auth_service.start()
+    try:
+        cases = (
+            analysis_cases(ai_service)
+            + generation_cases(ai_service)
+            + await auth_cases(auth_service)
+            + model_cases()
+        )
+        cases = [(name, func) for name, func in cases if name_filter in name]
+        by_round: Dict[str, List[float]] = {name: [] for name, _ in cases}
+        for _ in range(rounds):
+            for name, func in cases:
+                by_round[name].append(await measure(func))
+        results = {
+            name: {"ns_per_op": round(statistics.median(times), 1), "rounds": [round(elapsed, 1) for elapsed in times]}
+            for name, times in by_round.items()
+        }
+        for name, result in results.items():
+            print(f"{name:<40}{result['ns_per_op'] / 1000:>12.2f} us")
+    finally:
+        await auth_service.close()
+        await ai_service.close()
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "system": platform.system(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float,
+            noise_floor: float = NOISE_FLOOR_NS) -> List[str]:
+    """
+    Print the median change per case and return the names of the cases slower in every round
+    """
+    base_meta, meta = baseline["meta"], current["meta"]
+    for key in ("python", "implementation", "machine", "system"):
+        if base_meta.get(key) != meta.get(key):
+            print(f"warning: baseline {key} is {base_meta.get(key)}, this run is {meta.get(key)}")
+
+    regressions = []
+    print(f"\n{'case':<40}{'baseline us':>12}{'current us':>12}{'change':>9}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<40}{'-':>12}{result['ns_per_op'] / 1000:>12.2f}{'new':>9}")
+            continue
+        change = result["ns_per_op"] / base["ns_per_op"] - 1
+        limit = max(base["ns_per_op"] * (1 + threshold), base["ns_per_op"] + noise_floor)
+        flag = ""
+        if all(elapsed > limit for elapsed in result.get("rounds", [result["ns_per_op"]])):
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<40}{base['ns_per_op'] / 1000:>12.2f}{result['ns_per_op'] / 1000:>12.2f}{change:>+9.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "save", "compare"])
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--rounds", type=int, default=3, help="passes through the suite, the median counts")
+    parser.add_argument("--output", type=Path, help="also write this run's results here")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--noise-floor", type=float, default=NOISE_FLOOR_NS, help="ignored slowdown in ns per call")
+    args = parser.parse_args()
+
+    current = asyncio.run(run_suite(args.filter, args.rounds))
+    if args.output:
+        args.output.write_text(json.dumps(current, indent=2) + "\n")
+
+    if args.command == "save":
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(current, indent=2) + "\n")
+        print(f"\nbaseline written to {args.baseline}")
+    elif args.command == "compare":
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(baseline, current, args.threshold, args.noise_floor)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) more than {args.threshold:.0%} slower than the baseline in every round: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\nno case more than {args.threshold:.0%} slower than the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Import-time profile and startup budget of the API process
+
+    python -m benchmarks.startup_profile profile [--top 25]
+    python -m benchmarks.startup_profile check [--budget 1.5] [--runs 5]
+
+Both commands start fresh interpreters, since imports are cached per
+process. `profile` runs `python -X importtime -c "import app.main"` and
+lists the modules with the largest cumulative and self import times.
+`check` times importing app.main plus building the ServiceRegistry, which
+is what a worker does before it can serve. It exits 1 when the median over
+--runs exceeds --budget seconds, or when a heavy package that should only
+load on first use (LAZY_MODULES) was imported at startup. Lifespan
+warm-ups are left out as they wait on the network.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_BUDGET_SECONDS = 1.5
+
+# Loaded by the payment confirmer, Postgres and X client code paths on first use, never by `import app.main`
+LAZY_MODULES = ("aiohttp", "oauthlib", "psycopg", "psycopg_pool")
+
+STARTUP_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+loaded_by_import = [name for name in {LAZY_MODULES!r} if name in sys.modules]
+from app.services.registry import ServiceRegistry
+ServiceRegistry()
+built = time.perf_counter()
+print(json.dumps({{
+    "import_seconds": imported - start,
+    "registry_seconds": built - imported,
+    "loaded_by_import": loaded_by_import,
+}}))
+"""
+
+
+def child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite://")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")]))
+    return env
+
+
+def import_times() -> List[Tuple[str, int, int]]:
+    """
+    (module, self us, cumulative us) for every module `import app.main` loads
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, env=child_env(), capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def profile(top: int):
+    rows = import_times()
+    total = sum(self_us for _, self_us, _ in rows)
+    print(f"{len(rows)} modules, {total / 1e6:.3f}s of imports for app.main\n")
+    for title, key in (("cumulative", 2), ("self", 1)):
+        print(f"{'module':<60}{title + ' ms':>15}")
+        for row in sorted(rows, key=lambda row: row[key], reverse=True)[:top]:
+            print(f"{row[0]:<60}{row[key] / 1000:>15.1f}")
+        print()
+
+    # Top-level packages tell which dependency to make lazy
+    packages: Dict[str, int] = {}
+    for module, self_us, _ in rows:
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    print(f"{'package':<60}{'total ms':>15}")
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"{package:<60}{self_us / 1000:>15.1f}")
+
+
+def measure_startup() -> Dict:
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        cwd=BACKEND_DIR, env=child_env(), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def check(budget: float, runs: int) -> List[str]:
+    """
+    Return the reasons startup is over budget, empty when within it
+    """
+    samples = [measure_startup() for _ in range(runs)]
+    totals = [sample["import_seconds"] + sample["registry_seconds"] for sample in samples]
+    median = statistics.median(totals)
+    print(f"import app.main     {statistics.median(sample['import_seconds'] for sample in samples):.3f}s")
+    print(f"ServiceRegistry()   {statistics.median(sample['registry_seconds'] for sample in samples):.3f}s")
+    print(f"startup             {median:.3f}s median of {runs}, budget {budget:.3f}s")
+
+    failures = []
+    if median > budget:
+        failures.append(f"startup took {median:.3f}s, over the {budget:.3f}s budget")
+    eager = sorted({name for sample in samples for name in sample["loaded_by_import"]})
+    if eager:
+        failures.append(f"import app.main loaded {', '.join(eager)}, which should load on first use")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["profile", "check"])
+    parser.add_argument("--top", type=int, default=25, help="rows per table")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SECONDS, help="seconds")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "profile":
+        profile(args.top)
+        return
+    failures = check(args.budget, args.runs)
+    if failures:
+        print("\n" + "\n".join(failures))
+        sys.exit(1)
+    print("\nstartup within budget")
+
+
+if __name__ == "__main__":
+    main()
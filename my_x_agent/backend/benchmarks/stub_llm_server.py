@@ -0,0 +1,92 @@
+"""
+Local stand-in for an OpenAI-compatible LLM API with configurable latency
+
+    python -m benchmarks.stub_llm_server [--port 8600] [--latency-ms 300] [--per-token-ms 5]
+
+Serves /v1/chat/completions and /v1/completions (prompt may be a list, as
+with vLLM). A response takes latency-ms plus per-token-ms for each generated
+token, and a batched request costs one latency for the whole batch, like a
+GPU server decoding the prompts together. Point AI_API_BASE_URL at it.
+GET /stats reports how many HTTP requests and prompts were served.
+"""
+import argparse
+import asyncio
+import hashlib
+from typing import Any, Dict
+
+from aiohttp import web
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text.split()))
+
+
+def generate(prompt: str, max_tokens: int) -> str:
+    # Deterministic per prompt, so exact-match caching is observable
+    digest = hashlib.sha1(prompt.encode()).hexdigest()[:8]
+    words = ["Stub", "reply", digest] + ["lorem"] * 20
+    return " ".join(words[:max(3, min(max_tokens, len(words)))])
+
+
+def create_app(latency_ms: float = 300.0, per_token_ms: float = 0.0) -> web.Application:
+    stats = {"requests": 0, "prompts": 0}
+
+    async def respond(prompts, max_tokens: int):
+        texts = [generate(prompt, max_tokens) for prompt in prompts]
+        longest = max(count_tokens(text) for text in texts)
+        await asyncio.sleep((latency_ms + per_token_ms * longest) / 1000)
+        usage = {
+            "prompt_tokens": sum(count_tokens(prompt) for prompt in prompts),
+            "completion_tokens": sum(count_tokens(text) for text in texts),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        return texts, usage
+
+    async def chat(request: web.Request) -> web.Response:
+        body: Dict[str, Any] = await request.json()
+        prompt = body["messages"][-1]["content"]
+        stats["requests"] += 1
+        stats["prompts"] += 1
+        texts, usage = await respond([prompt], body.get("max_tokens", 64))
+        return web.json_response({
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": texts[0]}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    async def completions(request: web.Request) -> web.Response:
+        body: Dict[str, Any] = await request.json()
+        prompts = body["prompt"] if isinstance(body["prompt"], list) else [body["prompt"]]
+        stats["requests"] += 1
+        stats["prompts"] += len(prompts)
+        texts, usage = await respond(prompts, body.get("max_tokens", 64))
+        return web.json_response({
+            "object": "text_completion",
+            "model": body.get("model"),
+            "choices": [{"index": index, "text": text, "finish_reason": "stop"} for index, text in enumerate(texts)],
+            "usage": usage,
+        })
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", chat)
+    app.router.add_post("/v1/completions", completions)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--per-token-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency_ms, args.per_token_ms), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
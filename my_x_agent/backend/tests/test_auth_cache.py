@@ -0,0 +1,68 @@
+import asyncio
+import time
+import unittest
+from datetime import timedelta
+
+from jose import jwt
+
+from app.services.auth_service import ALGORITHM, SECRET_KEY, AuthService
+from app.services.user_repository import SQLiteUserRepository
+
+
+class AuthCacheTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Verified-token and user-snapshot caches behind get_current_user
+    """
+
+    async def asyncSetUp(self):
+        self.auth_service = AuthService(repository=SQLiteUserRepository(""))
+        await self.auth_service.start()
+        self.user = await self.auth_service.create_user("alice@example.com", "alice", "correct horse battery staple")
+
+    async def asyncTearDown(self):
+        await self.auth_service.close()
+
+    def token(self, **expires) -> str:
+        return self.auth_service.create_access_token(
+            {"sub": self.user.email, "user_id": self.user.id}, timedelta(**expires)
+        )
+
+    async def test_cached_token_expires_with_the_jwt(self):
+        token = self.token(seconds=1)
+        exp = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])["exp"]
+
+        self.assertEqual((await self.auth_service.get_current_user(token)).email, self.user.email)
+        self.assertEqual(self.auth_service.token_cache._entries[token][1], exp)
+
+        await asyncio.sleep(max(0.0, exp - time.time()) + 0.05)
+        self.assertIsNone(self.auth_service.token_cache.get(token))
+        # jose still accepts the token until the end of its exp second
+        await asyncio.sleep(1)
+        self.assertIsNone(await self.auth_service.get_current_user(token))
+        self.assertEqual(len(self.auth_service.token_cache), 0)
+
+    async def test_repeat_lookup_is_served_from_the_caches(self):
+        token = self.token(minutes=5)
+        await self.auth_service.get_current_user(token)
+        hits = self.auth_service.token_cache.stats.hits, self.auth_service.user_cache.stats.hits
+
+        await self.auth_service.get_current_user(token)
+        self.assertEqual(
+            (self.auth_service.token_cache.stats.hits, self.auth_service.user_cache.stats.hits),
+            (hits[0] + 1, hits[1] + 1)
+        )
+
+    async def test_invalid_token_is_not_cached(self):
+        self.assertIsNone(await self.auth_service.get_current_user("not-a-jwt"))
+        self.assertEqual(len(self.auth_service.token_cache), 0)
+
+    async def test_update_refreshes_the_user_snapshot(self):
+        token = self.token(minutes=5)
+        self.assertEqual((await self.auth_service.get_current_user(token)).suggestions_remaining, 5)
+
+        await self.auth_service.update_suggestions_remaining(self.user.email, 42)
+        self.assertEqual((await self.auth_service.get_current_user(token)).suggestions_remaining, 42)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import asyncio
+import time
+import unittest
+
+from app.utils.cache import AsyncTTLCache, TTLCache, in_background_refresh
+
+
+class AsyncTTLCacheTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Single-flight loads and stale-while-revalidate
+    """
+
+    async def asyncSetUp(self):
+        self.cache = AsyncTTLCache("test", maxsize=10, ttl=60, stale_ttl=60)
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+        self.fail = False
+
+    async def load(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return (self.calls, in_background_refresh.get())
+
+    def age(self, key, seconds: float):
+        self.cache._entries[key].stored_at -= seconds
+
+    async def test_concurrent_misses_share_one_load(self):
+        self.release.clear()
+        waiters = [asyncio.ensure_future(self.cache.get_or_load("k", self.load)) for _ in range(10)]
+        await asyncio.sleep(0)
+        self.release.set()
+
+        self.assertEqual(await asyncio.gather(*waiters), [(1, False)] * 10)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.stats.misses, 1)
+        self.assertEqual(self.cache.stats.coalesced, 9)
+
+    async def test_cancelled_caller_does_not_abort_the_load(self):
+        self.release.clear()
+        gone = asyncio.ensure_future(self.cache.get_or_load("k", self.load))
+        staying = asyncio.ensure_future(self.cache.get_or_load("k", self.load))
+        await asyncio.sleep(0)
+        gone.cancel()
+        self.release.set()
+
+        self.assertEqual(await staying, (1, False))
+        self.assertEqual(self.cache.peek("k"), (1, False))
+
+    async def test_fresh_entry_is_served_without_loading(self):
+        await self.cache.get_or_load("k", self.load)
+        self.assertEqual(await self.cache.get_or_load("k", self.load), (1, False))
+        self.assertEqual(self.calls, 1)
+
+    async def test_stale_entry_is_served_during_one_refresh(self):
+        await self.cache.get_or_load("k", self.load)
+        self.age("k", 90)
+        self.release.clear()
+
+        # Served straight away while the refresh is held back
+        results = await asyncio.wait_for(
+            asyncio.gather(*(self.cache.get_or_load("k", self.load) for _ in range(3))), timeout=1
+        )
+        self.assertEqual(results, [(1, False)] * 3)
+        self.assertEqual(self.cache.stats.stale_hits, 3)
+
+        self.release.set()
+        await asyncio.gather(*self.cache._refreshing)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(await self.cache.get_or_load("k", self.load), (2, True))
+
+    async def test_failed_refresh_keeps_the_stale_entry(self):
+        await self.cache.get_or_load("k", self.load)
+        self.age("k", 90)
+        self.fail = True
+
+        self.assertEqual(await self.cache.get_or_load("k", self.load), (1, False))
+        await asyncio.gather(*self.cache._refreshing)
+        self.assertEqual(self.cache.stats.refresh_errors, 1)
+        self.assertEqual(self.cache.peek("k"), (1, False))
+
+    async def test_entry_past_the_stale_window_is_loaded_again(self):
+        await self.cache.get_or_load("k", self.load)
+        self.age("k", 150)
+
+        self.assertEqual(await self.cache.get_or_load("k", self.load), (2, False))
+        self.assertEqual(self.cache.stats.misses, 2)
+
+
+class TTLCacheTest(unittest.TestCase):
+    """
+    LRU bound and per-entry expiry
+    """
+
+    def test_least_recently_used_entry_is_evicted(self):
+        evicted = []
+        cache = TTLCache("test", maxsize=2, on_evict=lambda key, value: evicted.append(key))
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        self.assertEqual(evicted, ["b"])
+
+    def test_entry_expires_at_its_own_deadline(self):
+        evicted = []
+        cache = TTLCache("test", ttl=60, on_evict=lambda key, value: evicted.append(key))
+        cache.set("soon", 1, expires_at=time.time() - 0.001)
+        cache.set("later", 2, expires_at=time.time() + 3600)
+
+        self.assertIsNone(cache.get("soon"))
+        self.assertEqual(cache.get("later"), 2)
+        self.assertLessEqual(cache._entries["later"][1], time.time() + 60)
+        self.assertEqual(evicted, ["soon"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import asyncio
+import unittest
+from typing import Any, Dict, List
+
+from app.utils.llm import Completion, LLMClient, LLMProvider
+
+
+class FakeProvider(LLMProvider):
+    """
+    Echoes each prompt, records the batches it was sent and can be held back
+    """
+
+    def __init__(self):
+        self.batches: List[List[str]] = []
+        self.release = asyncio.Event()
+        self.release.set()
+        self.cancelled = 0
+
+    async def complete_batch(self, model: str, prompts: List[str], params: Dict[str, Any]) -> List[Completion]:
+        self.batches.append(prompts)
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return [Completion(prompt.upper(), len(prompt), 2) for prompt in prompts]
+
+
+class LLMClientTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Batching, sharing and caching in front of the provider
+    """
+
+    async def asyncSetUp(self):
+        self.provider = FakeProvider()
+        self.client = LLMClient(self.provider, model="test", batch_window=0.05, max_batch_size=3)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_full_batch_is_sent_without_waiting_for_the_window(self):
+        self.client.batch_window = 60
+        completions = await asyncio.wait_for(
+            asyncio.gather(*(self.client.complete(f"p{i}") for i in range(3))), timeout=1
+        )
+        self.assertEqual([c.text for c in completions], ["P0", "P1", "P2"])
+        self.assertEqual(self.provider.batches, [["p0", "p1", "p2"]])
+
+    async def test_partial_batch_is_sent_when_the_window_closes(self):
+        tasks = [asyncio.ensure_future(self.client.complete(f"p{i}")) for i in range(2)]
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.provider.batches, [])
+
+        completions = await asyncio.gather(*tasks)
+        self.assertEqual([c.text for c in completions], ["P0", "P1"])
+        self.assertEqual(self.provider.batches, [["p0", "p1"]])
+
+    async def test_different_params_are_batched_apart(self):
+        await asyncio.gather(self.client.complete("a", temperature=0.1), self.client.complete("b", temperature=0.9))
+        self.assertEqual(sorted(self.provider.batches), [["a"], ["b"]])
+
+    async def test_cached_and_shared_completions_report_no_tokens(self):
+        first, shared = await asyncio.gather(self.client.complete("hello"), self.client.complete("hello"))
+        cached = await self.client.complete("hello")
+
+        self.assertEqual((first.prompt_tokens, first.completion_tokens, first.cached), (5, 2, False))
+        for completion in (shared, cached):
+            self.assertEqual(completion.text, "HELLO")
+            self.assertEqual((completion.prompt_tokens, completion.completion_tokens, completion.cached), (0, 0, True))
+        self.assertEqual(self.provider.batches, [["hello"]])
+        self.assertEqual(self.client.usage["prompt_tokens"], 5)
+
+    async def test_cancelled_waiter_does_not_cancel_the_batch(self):
+        self.provider.release.clear()
+        gone = asyncio.ensure_future(self.client.complete("a"))
+        staying = asyncio.ensure_future(self.client.complete("b"))
+        shared = asyncio.ensure_future(self.client.complete("a"))
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.provider.batches, [["a", "b"]])
+
+        gone.cancel()
+        await asyncio.sleep(0)
+        self.provider.release.set()
+
+        self.assertEqual((await staying).text, "B")
+        self.assertEqual((await shared).text, "A")
+        self.assertTrue(gone.cancelled())
+        self.assertEqual(self.provider.cancelled, 0)
+
+    async def test_batch_everyone_left_is_cancelled(self):
+        self.provider.release.clear()
+        tasks = [asyncio.ensure_future(self.client.complete(prompt)) for prompt in ("a", "b")]
+        await asyncio.sleep(0.1)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        self.assertEqual(self.provider.cancelled, 1)
+        self.assertEqual(self.client.usage["abandoned"], 2)
+
+    async def test_prompt_abandoned_before_the_window_closes_is_not_sent(self):
+        gone = asyncio.ensure_future(self.client.complete("a"))
+        staying = asyncio.ensure_future(self.client.complete("b"))
+        await asyncio.sleep(0)
+        gone.cancel()
+
+        self.assertEqual((await staying).text, "B")
+        self.assertEqual(self.provider.batches, [["b"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
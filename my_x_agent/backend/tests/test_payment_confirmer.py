@@ -0,0 +1,244 @@
+import asyncio
+import unittest
+
+from aiohttp.test_utils import TestServer
+
+from app.models.user import UserInDB
+from app.services.auth_service import AuthService
+from app.services.payment_confirmer import PaymentConfirmer
+from app.services.payment_repository import SQLitePaymentRepository
+from app.services.payment_service import PaymentService
+from app.services.user_repository import SQLiteUserRepository
+from benchmarks.fake_bnb_rpc import FakeChain, create_app
+
+HEAD = 200
+PRICE_WEI = 3 * 10 ** 16  # 0.03 BNB, two suggestions
+
+
+def tx_hash(byte: str) -> str:
+    return "0x" + byte * 32
+
+
+class PaymentConfirmerTest(unittest.IsolatedAsyncioTestCase):
+    """
+    PaymentConfirmer against the stand-in JSON-RPC node, on in-memory ledgers
+    """
+
+    async def asyncSetUp(self):
+        self.chain = FakeChain(head=HEAD)
+        self.server = TestServer(create_app(self.chain))
+        await self.server.start_server()
+        self.auth_service = AuthService(repository=SQLiteUserRepository(""))
+        self.payment_service = PaymentService(ledger=SQLitePaymentRepository(""))
+        await self.auth_service.start()
+        await self.payment_service.start()
+        self.confirmer = self.make_confirmer()
+
+    async def asyncTearDown(self):
+        await self.confirmer.stop()
+        await self.auth_service.close()
+        await self.payment_service.close()
+        await self.server.close()
+
+    def make_confirmer(self, **kwargs) -> PaymentConfirmer:
+        return PaymentConfirmer(
+            self.payment_service, self.auth_service, rpc_url=str(self.server.make_url("/")), **kwargs
+        )
+
+    async def create_user(self, name: str) -> UserInDB:
+        return await self.auth_service.users.create(
+            UserInDB(email=f"{name}@example.com", username=name, hashed_password="-")
+        )
+
+    async def submit(self, user: UserInDB, hash_: str, on_chain: bool = True, **transaction) -> dict:
+        """
+        Create a payment, put a transaction paying it on the fake chain and submit its hash
+        """
+        payment = await self.payment_service.generate_payment_request(user.id, 0.03, "tweet_suggestion")
+        if on_chain:
+            self.chain.add({
+                "hash": hash_,
+                "to": self.payment_service.contract_address,
+                "value": PRICE_WEI,
+                "block": HEAD - 20,
+                "input": payment["memo"],
+                **transaction,
+            })
+        result = await self.payment_service.verify_payment(payment["id"], hash_, user.id)
+        self.assertEqual(result["status"], "submitted")
+        return payment
+
+    async def status(self, payment: dict) -> str:
+        return (await self.payment_service.get_payment_status(payment["id"]))["status"]
+
+    async def suggestions(self, user: UserInDB) -> int:
+        return (await self.auth_service.users.get_by_id(user.id)).suggestions_remaining
+
+    async def test_confirmed_payment_is_credited_once(self):
+        user = await self.create_user("alice")
+        payment = await self.submit(user, tx_hash("a1"))
+
+        await self.confirmer.confirm_all()
+        await self.confirmer.confirm_all()
+
+        self.assertEqual(await self.status(payment), "completed")
+        self.assertEqual(await self.suggestions(user), 5 + 2)
+        self.assertEqual(self.confirmer.stats["completed"], 1)
+
+    async def test_reverted_transaction_fails(self):
+        user = await self.create_user("alice")
+        payment = await self.submit(user, tx_hash("a2"), status=0)
+
+        await self.confirmer.confirm_all()
+
+        self.assertEqual(await self.status(payment), "failed")
+        self.assertEqual(await self.suggestions(user), 5)
+
+    async def test_underpaid_or_misaddressed_transaction_fails(self):
+        user = await self.create_user("alice")
+        underpaid = await self.submit(user, tx_hash("a3"), value=PRICE_WEI - 1)
+        elsewhere = await self.submit(user, tx_hash("a4"), to="0x" + "99" * 20)
+
+        await self.confirmer.confirm_all()
+
+        self.assertEqual(await self.status(underpaid), "failed")
+        self.assertEqual(await self.status(elsewhere), "failed")
+
+    async def test_waits_until_deep_enough(self):
+        user = await self.create_user("alice")
+        payment = await self.submit(user, tx_hash("a5"), block=HEAD - 5)
+
+        await self.confirmer.confirm_all()
+        self.assertEqual(await self.status(payment), "submitted")
+
+        self.chain.base_head += 10
+        await self.confirmer.confirm_all()
+        self.assertEqual(await self.status(payment), "completed")
+
+    async def test_unknown_transaction_times_out(self):
+        user = await self.create_user("alice")
+        payment = await self.submit(user, tx_hash("a6"), block=None)
+        unknown = await self.submit(user, tx_hash("a7"), on_chain=False)
+
+        await self.confirmer.confirm_all()
+        self.assertEqual(await self.status(payment), "submitted")
+        self.assertEqual(await self.status(unknown), "submitted")
+
+        await asyncio.sleep(0.01)
+        await self.make_confirmer(timeout=0).confirm_all()
+        self.assertEqual(await self.status(payment), "failed")
+        self.assertEqual(await self.status(unknown), "failed")
+
+    async def test_failed_payment_can_be_resubmitted(self):
+        user = await self.create_user("alice")
+        payment = await self.submit(user, tx_hash("b1"), on_chain=False)
+        await asyncio.sleep(0.01)
+        await self.make_confirmer(timeout=0).confirm_all()
+        self.assertEqual(await self.status(payment), "failed")
+
+        self.chain.add({
+            "hash": tx_hash("b2"), "to": self.payment_service.contract_address, "value": PRICE_WEI,
+            "block": HEAD - 20, "input": payment["memo"],
+        })
+        result = await self.payment_service.verify_payment(payment["id"], tx_hash("b2"), user.id)
+        self.assertEqual(result["status"], "submitted")
+        await self.confirmer.confirm_all()
+
+        self.assertEqual(await self.status(payment), "completed")
+        self.assertEqual(await self.suggestions(user), 5 + 2)
+
+    async def test_shared_tx_hash_pays_only_the_memo_owner(self):
+        victim = await self.create_user("victim")
+        thief = await self.create_user("thief")
+        paid = await self.submit(victim, tx_hash("c1"))
+        claimed = await self.submit(thief, tx_hash("c1"), on_chain=False)
+
+        await self.confirmer.confirm_all()
+
+        self.assertEqual(await self.status(paid), "completed")
+        self.assertEqual(await self.status(claimed), "failed")
+        self.assertEqual(await self.suggestions(thief), 5)
+
+    async def test_input_with_two_memos_pays_neither(self):
+        user = await self.create_user("alice")
+        other = await self.create_user("bob")
+        first = await self.payment_service.generate_payment_request(user.id, 0.03, "tweet_suggestion")
+        second = await self.payment_service.generate_payment_request(user.id, 0.03, "tweet_suggestion")
+        self.chain.add({
+            "hash": tx_hash("c2"), "to": self.payment_service.contract_address, "value": PRICE_WEI,
+            "block": HEAD - 20, "input": first["memo"] + second["memo"][2:],
+        })
+        for payment in (first, second):
+            await self.payment_service.verify_payment(payment["id"], tx_hash("c2"), user.id)
+        valid = await self.submit(other, tx_hash("c3"))
+
+        await self.confirmer.confirm_all()
+
+        self.assertEqual(await self.status(first), "failed")
+        self.assertEqual(await self.status(second), "failed")
+        self.assertEqual(await self.status(valid), "completed")
+
+    async def test_already_paid_tx_hash_fails_only_its_row(self):
+        user = await self.create_user("alice")
+        earlier = await self.submit(user, tx_hash("c4"))
+        await self.confirmer.confirm_all()
+        self.assertEqual(await self.status(earlier), "completed")
+
+        # A second request whose memo the same transaction also carries
+        again = await self.payment_service.generate_payment_request(user.id, 0.03, "tweet_suggestion")
+        self.chain.transactions[tx_hash("c4")]["input"] = again["memo"]
+        await self.payment_service.verify_payment(again["id"], tx_hash("c4"), user.id)
+        valid = await self.submit(user, tx_hash("c5"))
+
+        await self.confirmer.confirm_all()
+
+        self.assertEqual(await self.status(again), "failed")
+        self.assertEqual(await self.status(valid), "completed")
+        self.assertEqual(await self.suggestions(user), 5 + 2 + 2)
+
+    async def test_failed_credit_is_retried(self):
+        user = await self.create_user("alice")
+        payment = await self.submit(user, tx_hash("d1"))
+        credit_payment = self.auth_service.credit_payment
+        calls = []
+
+        async def flaky(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise RuntimeError("user store down")
+            return await credit_payment(*args)
+
+        self.auth_service.credit_payment = flaky
+        await self.confirmer.confirm_batch()
+        self.assertEqual(await self.status(payment), "confirmed")
+        self.assertEqual(await self.suggestions(user), 5)
+
+        await self.confirmer.confirm_all()
+        self.assertEqual(await self.status(payment), "completed")
+        self.assertEqual(await self.suggestions(user), 5 + 2)
+
+    async def test_credit_is_not_repeated_when_completing_fails(self):
+        user = await self.create_user("alice")
+        payment = await self.submit(user, tx_hash("d2"))
+        ledger = self.payment_service.ledger
+        transition = ledger.transition
+        failures = []
+
+        async def flaky(tx_ids, from_status, fields):
+            if fields.get("status") == "completed" and not failures:
+                failures.append(tx_ids)
+                raise RuntimeError("ledger down")
+            return await transition(tx_ids, from_status, fields)
+
+        ledger.transition = flaky
+        await self.confirmer.confirm_batch()
+        self.assertEqual(await self.status(payment), "confirmed")
+        self.assertEqual(await self.suggestions(user), 5 + 2)
+
+        await self.confirmer.confirm_all()
+        self.assertEqual(await self.status(payment), "completed")
+        self.assertEqual(await self.suggestions(user), 5 + 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,19 @@
+import unittest
+
+from benchmarks.startup_profile import DEFAULT_BUDGET_SECONDS, check
+
+
+class StartupBudgetTest(unittest.TestCase):
+    """
+    Importing app.main and building the services stays within the startup budget
+
+    Each run is a fresh interpreter, imports are cached per process.
+    """
+
+    def test_startup_within_budget(self):
+        failures = check(DEFAULT_BUDGET_SECONDS, runs=3)
+        self.assertEqual(failures, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
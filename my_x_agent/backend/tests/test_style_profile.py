@@ -0,0 +1,44 @@
+import unittest
+
+from app.utils.ai_service import AIService
+
+TWEETS = [
+    "Shipping a new #AI model today, the blockchain demo comes next #Web3",
+    "Reading about #AI agents and crypto wallets",
+    "Coffee first, then code",
+    "Our #AI roadmap is public now",
+]
+
+
+class StyleProfileTest(unittest.TestCase):
+    """
+    Style profiles folded up from running totals
+    """
+
+    def setUp(self):
+        self.ai_service = AIService()
+
+    def test_hashtags_and_topics_are_counted(self):
+        profile = self.ai_service.update_style_profile(None, "alice", TWEETS, latest_tweet_id="4")
+
+        self.assertEqual(profile.tweet_count, 4)
+        self.assertEqual(profile.hashtag_counts, {"AI": 3, "Web3": 1})
+        self.assertEqual(profile.top_hashtags, ["AI", "Web3"])
+        self.assertEqual(profile.hashtags_per_tweet, 1.0)
+        self.assertEqual(profile.average_length, round(sum(map(len, TWEETS)) / 4))
+        self.assertEqual(profile.latest_tweet_id, "4")
+
+    def test_incremental_update_matches_a_full_rebuild(self):
+        earlier = self.ai_service.update_style_profile(None, "alice", TWEETS[:2], latest_tweet_id="2")
+        updated = self.ai_service.update_style_profile(earlier, "alice", TWEETS[2:], latest_tweet_id="4")
+        rebuilt = self.ai_service.update_style_profile(None, "alice", TWEETS, latest_tweet_id="4")
+
+        self.assertEqual(
+            updated.model_dump(exclude={"updated_at"}), rebuilt.model_dump(exclude={"updated_at"})
+        )
+        # The cached profile being refreshed is left untouched
+        self.assertEqual((earlier.tweet_count, earlier.hashtag_counts), (2, {"AI": 2, "Web3": 1}))
+
+
+if __name__ == "__main__":
+    unittest.main()
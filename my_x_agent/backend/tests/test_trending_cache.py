@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+
+from app.models.tweet import TrendingTopic
+from app.services.trending_cache import TrendingTopicsCache
+
+
+class TrendingTopicsCacheTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Which locations the background refresh keeps fetching
+    """
+
+    async def asyncSetUp(self):
+        self.fetched = []
+        self.cache = TrendingTopicsCache(self.fetch, refresh_interval=3600, max_locations=3, location_ttl=60)
+        self.cache.start()
+        await asyncio.sleep(0)
+
+    async def asyncTearDown(self):
+        await self.cache.stop()
+
+    async def fetch(self, location_id: str):
+        self.fetched.append(location_id)
+        return [TrendingTopic(name=f"#{location_id}", tweet_volume=1)]
+
+    async def test_requested_location_is_fetched(self):
+        self.assertIsNone(self.cache.get("23424977"))
+        await asyncio.sleep(0)
+        self.assertEqual(self.cache.get("23424977")[0].name, "#23424977")
+
+    async def test_invalid_ids_are_not_tracked(self):
+        for location_id in ("abc", "-1", "0", "1e9", "²", "9" * 13, ""):
+            self.assertIsNone(self.cache.get(location_id))
+        self.assertEqual(self.cache.get("01")[0].name, "#1")
+        self.assertEqual(self.cache.locations, ["1"])
+
+    async def test_unrequested_locations_expire(self):
+        for location_id in ("2", "3"):
+            self.cache.get(location_id)
+        self.assertIsNone(self.cache.get("4"))
+        self.assertEqual(self.cache.locations, ["1", "2", "3"])
+
+        self.cache.requested_at["2"] -= 61
+        self.cache.get("4")
+        self.assertEqual(self.cache.locations, ["1", "3", "4"])
+
+        self.cache.requested_at = {}
+        await self.cache.refresh_all()
+        self.assertEqual(self.cache.locations, ["1"])
+        self.assertEqual(set(self.cache.snapshots), {"1"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+from typing import Optional
+
+from app.models.user import UserInDB
+from app.services.x_client import AsyncXClient
+from app.services.x_client_pool import XClientPool
+from app.services.x_scheduler import XRequestScheduler
+
+ENDPOINT = "/2/users/by/username/:username"
+
+
+class XClientPoolTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Per-user clients and the rate-limit buckets that go with them
+    """
+
+    async def asyncSetUp(self):
+        self.scheduler = XRequestScheduler()
+        self.app_client = AsyncXClient(
+            bearer_token="bearer", consumer_key="key", consumer_secret="secret", scheduler=self.scheduler
+        )
+        self.pool = XClientPool(self.app_client, maxsize=2, idle_ttl=60)
+        self.loads = 0
+        self.users = {
+            f"user_{i}": UserInDB(
+                id=f"user_{i}", email=f"user{i}@example.com", username=f"user{i}", hashed_password="-",
+                x_access_token=f"token-{i}", x_access_token_secret="secret"
+            )
+            for i in range(3)
+        }
+        self.users["no_x"] = UserInDB(id="no_x", email="no_x@example.com", username="no_x", hashed_password="-")
+
+    async def asyncTearDown(self):
+        self.scheduler.close()
+        await self.app_client.close()
+
+    async def load_user(self, user_id: str) -> Optional[UserInDB]:
+        self.loads += 1
+        return self.users.get(user_id)
+
+    async def call(self, user_id: str) -> AsyncXClient:
+        """
+        Make one scheduled call with the user's client, which leaves an idle bucket behind
+        """
+        client = await self.pool.get(user_id, self.load_user)
+        await self.scheduler.acquire(client.user_credential, ENDPOINT)
+        self.scheduler.release(client.user_credential, ENDPOINT, 200)
+        return client
+
+    def credentials(self) -> set:
+        return {credential for credential, _ in self.scheduler.buckets}
+
+    async def test_client_is_reused_and_signs_as_the_user(self):
+        first = await self.call("user_0")
+        second = await self.pool.get("user_0", self.load_user)
+
+        self.assertIs(first, second)
+        self.assertEqual(self.loads, 1)
+        self.assertNotEqual(first.user_credential, self.app_client.user_credential)
+        self.assertIs(first.scheduler, self.scheduler)
+
+    async def test_user_without_x_account_is_remembered(self):
+        self.assertIsNone(await self.pool.get("no_x", self.load_user))
+        self.assertIsNone(await self.pool.get("no_x", self.load_user))
+        self.assertEqual(self.loads, 1)
+
+    async def test_least_recently_used_client_takes_its_buckets(self):
+        first = await self.call("user_0")
+        second = await self.call("user_1")
+        await self.pool.get("user_0", self.load_user)
+        third = await self.call("user_2")
+
+        self.assertEqual(self.credentials(), {first.user_credential, third.user_credential})
+        self.assertNotIn(second.user_credential, self.credentials())
+        self.assertEqual(self.scheduler.pruned, 1)
+
+    async def test_idle_client_takes_its_buckets(self):
+        self.pool = XClientPool(self.app_client, maxsize=10, idle_ttl=0.05)
+        client = await self.call("user_0")
+        await asyncio.sleep(0.06)
+
+        self.assertIsNot(await self.pool.get("user_0", self.load_user), client)
+        self.assertEqual(self.credentials(), set())
+
+    async def test_busy_bucket_outlives_its_client(self):
+        client = await self.pool.get("user_0", self.load_user)
+        await self.scheduler.acquire(client.user_credential, ENDPOINT)
+
+        self.pool.invalidate("user_0")
+        self.assertEqual(self.credentials(), {client.user_credential})
+
+        self.scheduler.release(client.user_credential, ENDPOINT, 200)
+        self.assertEqual(self.scheduler.prune(), 1)
+        self.assertEqual(self.credentials(), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import asyncio
+import time
+import unittest
+
+from app.services.x_scheduler import BACKGROUND, INTERACTIVE, XRateLimitError, XRequestScheduler
+
+ENDPOINT = "/2/users/:id/tweets"
+
+
+class XRequestSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Rate-limit buckets filled from X's headers, queueing and pruning
+    """
+
+    def setUp(self):
+        self.scheduler = XRequestScheduler(interactive_max_wait=5, background_max_wait=5, default_backoff=0.1)
+
+    def tearDown(self):
+        self.scheduler.close()
+
+    async def exhaust(self, reset_in: float, limit: int = 2, credential: str = "app"):
+        """
+        One call whose response reports the window used up until `reset_in` seconds from now
+        """
+        await self.scheduler.acquire(credential, ENDPOINT)
+        self.scheduler.release(credential, ENDPOINT, 200, {
+            "x-rate-limit-limit": str(limit),
+            "x-rate-limit-remaining": "0",
+            "x-rate-limit-reset": str(time.time() + reset_in),
+        })
+
+    async def test_unknown_bucket_admits_right_away(self):
+        for _ in range(5):
+            await asyncio.wait_for(self.scheduler.acquire("app", ENDPOINT), timeout=0.1)
+        self.assertEqual(self.scheduler.buckets[("app", ENDPOINT)].inflight, 5)
+
+    async def test_empty_bucket_waits_for_the_reset_and_refills(self):
+        await self.exhaust(reset_in=0.3)
+        started = time.monotonic()
+        await self.scheduler.acquire("app", ENDPOINT)
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+        bucket = self.scheduler.buckets[("app", ENDPOINT)]
+        self.assertEqual((bucket.limit, bucket.remaining, bucket.queued), (2, 1, 1))
+
+    async def test_wait_past_the_max_is_rejected_at_once(self):
+        await self.exhaust(reset_in=60)
+        with self.assertRaises(XRateLimitError) as raised:
+            await asyncio.wait_for(self.scheduler.acquire("app", ENDPOINT), timeout=0.1)
+        self.assertGreater(raised.exception.wait, 5)
+        self.assertEqual(self.scheduler.buckets[("app", ENDPOINT)].rejected, 1)
+
+    async def test_interactive_calls_go_before_background_ones(self):
+        await self.exhaust(reset_in=0.1, limit=1)
+        order = []
+
+        async def call(name: str, priority: int):
+            await self.scheduler.acquire("app", ENDPOINT, priority)
+            order.append(name)
+            self.scheduler.release("app", ENDPOINT, 200)
+
+        background = asyncio.ensure_future(call("background", BACKGROUND))
+        await asyncio.sleep(0)
+        await asyncio.gather(call("interactive", INTERACTIVE), background)
+        self.assertEqual(order, ["interactive", "background"])
+
+    async def test_429_without_reset_backs_off(self):
+        await self.scheduler.acquire("app", ENDPOINT)
+        self.scheduler.release("app", ENDPOINT, 429)
+        bucket = self.scheduler.buckets[("app", ENDPOINT)]
+        self.assertEqual((bucket.remaining, bucket.throttled), (0, 1))
+
+        started = time.monotonic()
+        await self.scheduler.acquire("app", ENDPOINT)
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+
+    async def test_buckets_of_other_credentials_are_independent(self):
+        await self.exhaust(reset_in=60, credential="user:a")
+        await asyncio.wait_for(self.scheduler.acquire("user:b", ENDPOINT), timeout=0.1)
+
+    async def test_idle_refilled_buckets_are_pruned(self):
+        await self.exhaust(reset_in=0.05, credential="user:a")
+        await self.exhaust(reset_in=60, credential="user:b")
+        await self.scheduler.acquire("user:c", ENDPOINT)
+        await self.scheduler.acquire("user:d", ENDPOINT)
+        self.scheduler.release("user:d", ENDPOINT, 200)
+        await asyncio.sleep(0.06)
+
+        # a refilled, b still waiting on its reset, c in flight, d never limited
+        self.assertEqual(self.scheduler.prune(), 2)
+        self.assertEqual(set(self.scheduler.buckets), {("user:b", ENDPOINT), ("user:c", ENDPOINT)})
+
+    async def test_prune_of_one_credential_leaves_the_others(self):
+        for credential in ("user:a", "user:b"):
+            await self.scheduler.acquire(credential, ENDPOINT)
+            self.scheduler.release(credential, ENDPOINT, 200)
+
+        self.assertEqual(self.scheduler.prune("user:a"), 1)
+        self.assertEqual(set(self.scheduler.buckets), {("user:b", ENDPOINT)})
+
+    async def test_stats_only_total_user_buckets(self):
+        await self.scheduler.acquire("app", ENDPOINT)
+        await self.scheduler.acquire("user:a", ENDPOINT)
+        await self.scheduler.acquire("user:b", ENDPOINT)
+
+        stats = self.scheduler.stats()
+        self.assertEqual(set(stats["buckets"]), {ENDPOINT})
+        self.assertEqual(stats["user_buckets"][ENDPOINT]["buckets"], 2)
+        self.assertEqual(stats["user_buckets"][ENDPOINT]["inflight"], 2)
+        self.assertNotIn("user:a", str(stats))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,7 +10,7 @@ export interface PaymentRequest {
   id: string;
   amount: number;
   itemType: string;
-  status: 'pending' | 'completed' | 'failed';
+  status: 'pending' | 'submitted' | 'completed' | 'failed';
   createdAt: string;
   paymentAddress: string;
 }